@@ -0,0 +1,107 @@
+import string
+
+# Cards a role sees: all of them, the ones its user added, or the ones from its user's source
+ROW_SCOPES = ['all', 'owner', 'source']
+
+# PINs a role may read and change among the cards it sees: all, those of its user's cards, or none
+PIN_ACCESS = ['all', 'owner', 'none']
+
+# Columns of the roles table
+ROLE_COLUMNS = ['name', 'row_scope', 'pin_access', 'see_costs', 'can_add', 'can_edit', 'can_delete', 'administer']
+
+# Built-in roles, created with the database. Administering covers users,
+# pricing rules and the whole-inventory maintenance tools
+DEFAULT_ROLES = [
+    ('admin', 'all', 'all', 1, 1, 1, 1, 1),
+    ('buyer', 'owner', 'owner', 1, 1, 1, 0, 0),
+    ('seller', 'source', 'all', 0, 0, 1, 0, 0),
+    ('accountant', 'all', 'none', 1, 0, 1, 0, 0),
+]
+
+# Columns of the users table
+USER_COLUMNS = ['name', 'role', 'source']
+
+# What was paid for the cards, and everything derived from it, hidden from roles without see_costs
+COST_COLUMNS = ['purchase_price', 'expected_percent', 'profit', 'realized_profit', 'discount_percent']
+
+# Message returned when the session's role does not allow a change
+PERMISSION_DENIED = "Your role does not allow this"
+
+# Source scope predicate; the same expression as the source sort key, so its index serves it
+SOURCE_KEY = "IFNULL(source, '') COLLATE NOCASE"
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class Access:
+    """Permissions of a session's user, resolved once when the session starts
+
+    The SQL fragments the queries need are derived here once too, so the
+    row filter and column masks run inside SQLite and add no Python work
+    per listed row. Without a user everything is allowed, as before users
+    existed.
+    """
+
+    def __init__(self, user=None, source=None, role=None):
+        role = dict(zip(ROLE_COLUMNS, DEFAULT_ROLES[0])) if role is None else role
+        self.user = user
+        self.source = source or ""
+        self.role = role['name']
+        self.row_scope = role['row_scope']
+        self.pin_access = role['pin_access']
+        self.see_costs = bool(role['see_costs'])
+        self.can_add = bool(role['can_add'])
+        self.can_edit = bool(role['can_edit'])
+        self.can_delete = bool(role['can_delete'])
+        self.administer = bool(role['administer'])
+
+    def masked_columns(self):
+        """Columns every query returns as NULL for this session"""
+        masked = set() if self.see_costs else set(COST_COLUMNS)
+        if self.pin_access == 'none':
+            masked.add('pin')
+        return masked
+
+    def row_filter(self):
+        """(SQL condition, parameters) selecting the cards this session sees, or ("", [])"""
+        if self.row_scope == 'owner':
+            return "owner = ?", [self.user]
+        if self.row_scope == 'source':
+            return f"{SOURCE_KEY} = ?", [self.source]
+        return "", []
+
+    def pin_projection(self):
+        """(SQL expression, parameters) returning the PIN where this session may read it, else NULL"""
+        if self.pin_access == 'owner':
+            return "CASE WHEN owner = ? THEN pin END", [self.user]
+        if self.pin_access == 'none':
+            return "NULL", []
+        return "pin", []
+
+    def allows(self, card):
+        """Whether a card dictionary is within this session's rows, like row_filter"""
+        if self.row_scope == 'owner':
+            return card.get('owner') == self.user
+        if self.row_scope == 'source':
+            return (card.get('source') or "").translate(ASCII_LOWER) == self.source.translate(ASCII_LOWER)
+        return True
+
+    def pin_visible(self, card):
+        if self.pin_access == 'owner':
+            return card.get('owner') == self.user
+        return self.pin_access == 'all'
+
+    def mask(self, values):
+        """A card's column values with what this session may not read set to None, like the SQL projections"""
+        masked = self.masked_columns()
+        if 'pin' in values and not self.pin_visible(values):
+            masked.add('pin')
+        return {column: None if column in masked else value for column, value in values.items()}
+
+    def may_change(self, card, columns):
+        """Whether this session may write the given columns of a card it sees"""
+        if not self.can_edit or self.masked_columns().intersection(columns):
+            return False
+        if 'owner' in columns and not self.administer:
+            return False
+        return 'pin' not in columns or self.pin_visible(card)
@@ -0,0 +1,117 @@
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from database import aging_bucket_labels
+
+# Unsold cards expiring within this many days are flagged, as are expired ones
+EXPIRY_WARNING_DAYS = 30
+
+# Unsold cards held longer than this many days are flagged
+PENDING_ALERT_DAYS = 60
+
+# The first check waits for the window to come up, later ones repeat
+FIRST_CHECK_MS = 15000
+CHECK_INTERVAL_MS = 30 * 60 * 1000
+
+
+def check_aging(storage, today=None, report=False,
+                expiry_days=EXPIRY_WARNING_DAYS, pending_days=PENDING_ALERT_DAYS):
+    """Find the unsold cards close to expiry or pending too long, plus the age buckets for a report
+
+    Each alert is a range read of a partial index over the unsold cards, so
+    the periodic check stays cheap however many cards were sold before.
+    today is a UTC 'YYYY-MM-DD' date, the current one by default.
+    """
+    today = date.fromisoformat(today) if today else datetime.now(timezone.utc).date()
+    result = {
+        'today': today.isoformat(),
+        'expiry_days': expiry_days,
+        'pending_days': pending_days,
+        'expiring': storage.get_expiring_cards((today + timedelta(days=expiry_days)).isoformat()),
+        'aging': storage.get_aging_cards((today - timedelta(days=pending_days)).isoformat()),
+    }
+    if report:
+        result['buckets'] = storage.get_aging_buckets(today.isoformat())
+    return result
+
+
+def flagged_cards(result):
+    """Card numbers listed by the alerts of a check_aging result"""
+    return {card[0] for card in result['expiring'][1]} | {card[0] for card in result['aging'][1]}
+
+
+def format_aging_alert(result):
+    """One-line summary of the alerts of a check_aging result, or an empty string"""
+    parts = []
+    if result['expiring'][0]:
+        parts.append(f"{result['expiring'][0]} card(s) expire within {result['expiry_days']} days")
+    if result['aging'][0]:
+        parts.append(f"{result['aging'][0]} card(s) pending over {result['pending_days']} days")
+    return ", ".join(parts)
+
+
+def format_aging_report(result, limit=50):
+    """Format a check_aging result with buckets for display"""
+    lines = [f"Unsold cards by days held, as of {result['today']}:", ""]
+    for label, (count, denomination, purchase, expected) in zip(aging_bucket_labels(), result['buckets']):
+        line = f"  {label:<18} {count:>6} cards   ${denomination:,.2f} face value"
+        # Costs are None for roles that may not see them
+        if purchase is not None:
+            line += f", ${purchase:,.2f} paid, ${expected - purchase:,.2f} expected profit"
+        lines.append(line)
+
+    count, cards = result['expiring']
+    if count:
+        lines.append(f"\n{count} cards expire within {result['expiry_days']} days:")
+        for card_number, brand, denomination, expiry_date in cards[:limit]:
+            expired = " (expired)" if expiry_date < result['today'] else ""
+            lines.append(f"  {expiry_date}{expired}  {card_number}  {brand or ''} ${denomination or 0:,.2f}")
+        if count > min(len(cards), limit):
+            lines.append(f"  ... and {count - min(len(cards), limit)} more")
+
+    count, cards = result['aging']
+    if count:
+        lines.append(f"\n{count} cards pending over {result['pending_days']} days:")
+        for card_number, brand, denomination, purchase_date in cards[:limit]:
+            lines.append(f"  bought {purchase_date}  {card_number}  {brand or ''} ${denomination or 0:,.2f}")
+        if count > min(len(cards), limit):
+            lines.append(f"  ... and {count - min(len(cards), limit)} more")
+    return "\n".join(lines)
+
+
+class AgingMonitor(QObject):
+    """Runs check_aging on a background thread"""
+
+    # Result dictionary, or {'error': message}, and whether it was requested
+    # from the menu; emitted from the worker thread, delivered on the GUI thread
+    finished = pyqtSignal(object, bool)
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interactive=False):
+        """Start a check unless one is already running; interactive checks include the age buckets"""
+        if self.is_running():
+            return False
+        self.thread = threading.Thread(target=self.run, args=(interactive,), name="aging-check", daemon=True)
+        self.thread.start()
+        return True
+
+    def run(self, interactive):
+        try:
+            result = check_aging(self.storage, report=interactive)
+        except Exception as e:
+            result = {'error': str(e)}
+        self.finished.emit(result, interactive)
+
+    def wait(self, timeout=None):
+        """Block until the running check has finished"""
+        if self.thread is not None:
+            self.thread.join(timeout)
@@ -0,0 +1,365 @@
+import sys
+from PyQt6.QtCore import Qt, QAbstractItemModel, QAbstractTableModel, QModelIndex
+
+from database import CARD_LIST_COLUMNS, DERIVED_FIELDS, PAGE_SIZE, SORT_KEYS, sort_value
+from theme import SOLD_BACKGROUND, SOLD_FOREGROUND, PENDING_FOREGROUND
+
+# (header, field in CARD_LIST_COLUMNS, kind) for each displayed column
+COLUMNS = [
+    ("Card Number", 'card_number', 'text'),
+    ("Brand", 'brand', 'text'),
+    ("PIN", 'has_pin', 'pin'),
+    ("Denomination", 'denomination', 'money'),
+    ("Purchase Price", 'purchase_price', 'money'),
+    ("Discount", 'discount_percent', 'percent'),
+    ("Expected Price", 'expected_price', 'money'),
+    ("Profit", 'profit', 'money'),
+    ("Source", 'source', 'text'),
+    ("Purchase Date", 'purchase_date', 'text'),
+    ("Days Held", 'days_held', 'days'),
+    ("Expiry Date", 'expiry_date', 'text'),
+    ("Pending", 'pending', 'text'),
+    ("Sold Date", 'sold_date', 'text'),
+    ("Payment Received", 'payment_received', 'money'),
+    ("Realized Profit", 'realized_profit', 'money'),
+    ("Payment Mode", 'payment_mode', 'text'),
+    ("Image", 'card_image_path', 'image'),
+    ("Actions", None, 'action'),
+]
+
+IMAGE_COLUMN = 17
+ACTIONS_COLUMN = 18
+
+# Raw image path of a row, used by the thumbnail delegate
+ImagePathRole = Qt.ItemDataRole.UserRole + 1
+
+FIELD_INDEX = {field: i for i, field in enumerate(CARD_LIST_COLUMNS)}
+READ_ONLY_KINDS = ('pin', 'image', 'action')
+# Computed by the database from the other columns
+READ_ONLY_FIELDS = set(DERIVED_FIELDS)
+
+
+class CardTableModel(QAbstractTableModel):
+    """Table model over the raw card rows returned by the database
+    
+    Rows loaded from a storage arrive a page at a time as the view scrolls.
+    Sorting uses typed keys from database.sort_value: one indexed query
+    while pages are still missing, an in-memory sort once all rows are here.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.row_by_card = {}
+        # card_number -> {field: value before the first table edit}
+        self.original_values = {}
+        self.storage = None
+        self.page_size = PAGE_SIZE
+        # Cursor of the next page to fetch, None once every row is loaded
+        self.next_page = None
+        # Kept across reloads; column -1 lists the newest cards first
+        self.sort_column = -1
+        self.sort_order = Qt.SortOrder.DescendingOrder
+        # Storage data version the rows were loaded at, None if unknown
+        self.data_version = None
+        # (row count, next page cursor) of the first page while the rows still start with it
+        self.first_page = None
+        # The rows came from the warm-start cache and wait for a fresh first page
+        self.warm = False
+        # Fields the session's role may not change from the table
+        self.locked_fields = set()
+
+    def load(self, storage, page_size=PAGE_SIZE):
+        """Replace all rows with the first page from a storage, in the current sort order"""
+        data_version = storage.get_data_version()
+        rows, next_page = storage.get_cards_page(self.sort_field(), self.descending(), None, page_size)
+        self.set_rows(storage, rows, next_page, page_size, data_version)
+
+    def set_rows(self, storage, rows, next_page, page_size, data_version):
+        """Replace all rows with a first page fetched in the current sort order"""
+        self.beginResetModel()
+        self.storage = storage
+        self.page_size = page_size
+        self.next_page = next_page
+        self.rows = [list(row) for row in rows]
+        self.reindex()
+        self.original_values = {}
+        self.data_version = data_version
+        self.first_page = (len(self.rows), next_page)
+        self.warm = False
+        self.endResetModel()
+
+    def restore(self, storage, snapshot):
+        """Show the rows of a snapshot() without a query, until refresh_warm_rows or the next load"""
+        next_page = snapshot['next_page']
+        self.set_rows(storage, snapshot['rows'], tuple(next_page) if next_page is not None else None,
+                      snapshot['page_size'], snapshot['data_version'])
+        self.warm = True
+
+    def snapshot(self):
+        """The first page as loaded, without unsaved edits, for the warm-start cache; None if unknown"""
+        if self.storage is None or self.data_version is None:
+            return None
+        if self.first_page is not None:
+            count, next_page = self.first_page
+        elif self.next_page is None and self.sort_column >= 0:
+            # Everything is loaded and sorted here, so the page ends where the sort key says
+            count = min(len(self.rows), self.page_size)
+            next_page = self.row_key(self.rows[count - 1]) if len(self.rows) > count else None
+        else:
+            return None
+        rows = []
+        for row in self.rows[:count]:
+            original = self.original_values.get(row[0])
+            if original:
+                row = list(row)
+                for field, value in original.items():
+                    row[FIELD_INDEX[field]] = value
+            rows.append(row)
+        return {
+            'data_version': self.data_version,
+            'sort_field': self.sort_field(),
+            'descending': self.descending(),
+            'page_size': self.page_size,
+            'rows': rows,
+            'next_page': next_page,
+        }
+
+    def refresh_warm_rows(self, rows, next_page, data_version):
+        """Reconcile rows restored from the warm-start cache with a freshly queried first page
+
+        If the same cards are in the same places only the changed rows are
+        updated, keeping the scroll position and selection; otherwise the
+        fresh page replaces everything, unless there are unsaved edits.
+        """
+        if not self.warm:
+            return
+        self.warm = False
+        count, cached_next_page = self.first_page
+        if [row[0] for row in rows] == [row[0] for row in self.rows[:count]] and next_page == cached_next_page:
+            for i, row in enumerate(rows):
+                if row[0] not in self.original_values and list(row) != self.rows[i]:
+                    self.rows[i] = list(row)
+                    self.dataChanged.emit(self.index(i, 0), self.index(i, len(COLUMNS) - 1))
+            self.data_version = data_version
+        elif not self.original_values:
+            self.set_rows(self.storage, rows, next_page, self.page_size, data_version)
+
+    def reindex(self):
+        self.row_by_card = {row[0]: i for i, row in enumerate(self.rows)}
+
+    def sort_field(self):
+        return COLUMNS[self.sort_column][1] if self.sort_column >= 0 else None
+
+    def descending(self):
+        return self.sort_order == Qt.SortOrder.DescendingOrder
+
+    def row_key(self, row):
+        field = self.sort_field()
+        return sort_value(field, row[FIELD_INDEX[field]]), row[0]
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.next_page is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Append the next page of rows"""
+        if not self.canFetchMore(parent):
+            return
+        rows, self.next_page = self.storage.get_cards_page(
+            self.sort_field(), self.descending(), self.next_page, self.page_size
+        )
+        # A card edited since its page was loaded may come round again
+        rows = [list(row) for row in rows if row[0] not in self.row_by_card]
+        if not rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        for i, row in enumerate(rows, first):
+            self.row_by_card[row[0]] = i
+        self.endInsertRows()
+
+    def fetch_all(self):
+        """Load every remaining page"""
+        while self.canFetchMore():
+            self.fetchMore()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Sort by a column, keeping the order for later reloads"""
+        if column >= len(COLUMNS) or (column >= 0 and not self.is_sortable(column)):
+            return
+        column = max(column, -1)
+        if self.storage is not None and not self.original_values and (
+                self.next_page is not None or column < 0):
+            # One indexed query for the first page beats loading everything
+            self.sort_column, self.sort_order = column, order
+            self.load(self.storage, self.page_size)
+            return
+        # Unsaved table edits must stay, so the rest is loaded (in the old
+        # order, which the page cursor belongs to) and everything sorted here
+        self.fetch_all()
+        self.sort_column, self.sort_order = column, order
+        self.first_page = None
+        if column >= 0:
+            self.sort_rows()
+
+    def is_sortable(self, column):
+        """Whether a column has an indexed sort key"""
+        return COLUMNS[column][1] in SORT_KEYS
+
+    def sort_rows(self):
+        """Reorder the loaded rows in place, keeping selections and other persistent indexes"""
+        hint = QAbstractItemModel.LayoutChangeHint.VerticalSortHint
+        self.layoutAboutToBeChanged.emit([], hint)
+        keys = [self.row_key(row) for row in self.rows]
+        order = sorted(range(len(self.rows)), key=keys.__getitem__, reverse=self.descending())
+        new_position = [0] * len(order)
+        for new, old in enumerate(order):
+            new_position[old] = new
+        self.rows = [self.rows[i] for i in order]
+        self.reindex()
+        old_indexes = self.persistentIndexList()
+        self.changePersistentIndexList(
+            old_indexes, [self.index(new_position[index.row()], index.column()) for index in old_indexes]
+        )
+        self.layoutChanged.emit([], hint)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        _, field, kind = COLUMNS[index.column()]
+        value = row[FIELD_INDEX[field]] if field else None
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if kind == 'pin':
+                return "****" if value else ""
+            if kind == 'money':
+                try:
+                    return f"${float(value):.2f}" if value is not None else "$0.00"
+                except (TypeError, ValueError):
+                    return str(value)
+            if kind in ('percent', 'days'):
+                if value is None:
+                    return ""
+                return f"{value:.1f}%" if kind == 'percent' else str(value)
+            if kind == 'image':
+                if value and row[FIELD_INDEX['image_exists']] == 0:
+                    return "Missing"
+                return "Yes" if value else "No"
+            if kind == 'action':
+                return None
+            return str(value) if value is not None else ""
+        if role == Qt.ItemDataRole.EditRole:
+            return value
+        if role == ImagePathRole and kind == 'image':
+            # Files the last image check found missing are not requested
+            if row[FIELD_INDEX['image_exists']] == 0:
+                return ""
+            return value or ""
+        if role in (Qt.ItemDataRole.BackgroundRole, Qt.ItemDataRole.ForegroundRole):
+            # Sold cards (Pending == 'No') are highlighted in green
+            pending = str(row[FIELD_INDEX['pending']]).strip().lower()
+            if pending.startswith('no'):
+                return SOLD_BACKGROUND if role == Qt.ItemDataRole.BackgroundRole else SOLD_FOREGROUND
+            return None if role == Qt.ItemDataRole.BackgroundRole else PENDING_FOREGROUND
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
+        _, field, kind = COLUMNS[index.column()]
+        if (field != 'card_number' and kind not in READ_ONLY_KINDS and field not in READ_ONLY_FIELDS
+                and field not in self.locked_fields):
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        _, field, kind = COLUMNS[index.column()]
+        if kind == 'money':
+            try:
+                value = float(str(value).replace('$', '').strip() or 0)
+            except ValueError:
+                return False
+        else:
+            value = str(value).strip()
+
+        row = self.rows[index.row()]
+        original = self.original_values.setdefault(row[0], {})
+        original.setdefault(field, row[FIELD_INDEX[field]])
+        row[FIELD_INDEX[field]] = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def card_at(self, row):
+        """Get the card at a model row as a dictionary"""
+        return dict(zip(CARD_LIST_COLUMNS, self.rows[row]))
+
+    def card_numbers(self, rows):
+        """Card numbers of model rows, read from the row cache without building indexes"""
+        return [self.rows[row][0] for row in rows]
+
+    def update_card(self, card_number, card_data):
+        """Update one cached row in place after it was saved"""
+        row = self.row_by_card.get(card_number)
+        if row is None:
+            return
+        values = self.rows[row]
+        if card_data.get('card_image_path', values[FIELD_INDEX['card_image_path']]) != values[FIELD_INDEX['card_image_path']]:
+            # A new file has not been checked yet
+            values[FIELD_INDEX['image_exists']] = None
+        for field, value in card_data.items():
+            if field in FIELD_INDEX and field != 'card_number':
+                values[FIELD_INDEX[field]] = value
+        if 'pin' in card_data:
+            values[FIELD_INDEX['has_pin']] = bool(card_data['pin'])
+        self.original_values.pop(card_number, None)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+    def update_image_status(self, statuses):
+        """Apply {card_number: image_exists} from an image check, keeping unsaved edits"""
+        for card_number, exists in statuses.items():
+            row = self.row_by_card.get(card_number)
+            if row is not None and self.rows[row][FIELD_INDEX['image_exists']] != exists:
+                self.rows[row][FIELD_INDEX['image_exists']] = exists
+                index = self.index(row, IMAGE_COLUMN)
+                self.dataChanged.emit(index, index)
+
+    def memory_usage(self):
+        """Approximate bytes held by the cached rows"""
+        return sys.getsizeof(self.rows) + sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in self.rows
+        )
+
+    def image_path(self, row):
+        """Get the stored image path of a model row"""
+        return self.rows[row][FIELD_INDEX['card_image_path']] or ""
+
+    def get_pending_updates(self):
+        """Get (card_number, changed columns, loaded version) for cards edited in the table"""
+        updates = []
+        for card_number, original in self.original_values.items():
+            row = self.rows[self.row_by_card[card_number]]
+            changes = {field: row[FIELD_INDEX[field]] for field, value in original.items()
+                       if row[FIELD_INDEX[field]] != value}
+            if changes:
+                updates.append((card_number, changes, row[FIELD_INDEX['version']]))
+        return updates
+
+    def get_original_card(self, card_number):
+        """Get a card as it was loaded, before any table edits"""
+        card = self.card_at(self.row_by_card[card_number])
+        card.update(self.original_values.get(card_number, {}))
+        return card
@@ -1,17 +1,352 @@
 import sqlite3
 import os
-from datetime import datetime
+import json
+import string
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+from access import Access, DEFAULT_ROLES, PERMISSION_DENIED, ROLE_COLUMNS, ROW_SCOPES, PIN_ACCESS, USER_COLUMNS
+from near_duplicates import MAX_DISTANCE, NEIGHBOUR_WINDOW, closest_card_numbers, normalize_card_number
+
+# Column order of the rows returned by get_all_cards. The listing never
+# carries PINs, only whether the card has one
+CARD_LIST_COLUMNS = [
+    'card_number', 'brand', 'has_pin', 'denomination',
+    'purchase_price', 'expected_price', 'expected_percent', 'profit', 'source', 'purchase_date',
+    'pending', 'sold_date', 'payment_received', 'payment_mode', 'card_image_path', 'version',
+    'image_exists', 'realized_profit', 'discount_percent', 'days_held', 'expiry_date'
+]
+
+# Values derived from other columns, as virtual generated columns of cards.
+# They are never written and cannot go stale; derived_values is the Python twin
+DERIVED_COLUMNS = {
+    'profit': "expected_price - purchase_price",
+    'realized_profit': "payment_received - purchase_price",
+    'discount_percent': "CASE WHEN denomination > 0 THEN (denomination - purchase_price) * 100.0 / denomination END",
+}
+
+# Days from purchase until sold, or until today for unsold cards. Depends on
+# the current date, so it is computed when listing instead of generated
+DAYS_HELD = "CAST(julianday(COALESCE(NULLIF(sold_date, ''), date('now'))) - julianday(purchase_date) AS INTEGER)"
+
+# Everything computed by the database, refreshed after a card is saved
+DERIVED_FIELDS = list(DERIVED_COLUMNS) + ['days_held']
+
+# SQL expression of each listing column that is not a plain column
+CARD_LIST_EXPRESSIONS = {
+    'has_pin': "COALESCE(pin, '') <> ''",
+    'days_held': DAYS_HELD,
+}
+
+def card_list_fields(masked=()):
+    """Listing projection producing rows in CARD_LIST_COLUMNS order, with the masked columns as NULL"""
+    return ", ".join(
+        f"NULL AS {column}" if column in masked
+        else f"{CARD_LIST_EXPRESSIONS[column]} AS {column}" if column in CARD_LIST_EXPRESSIONS
+        else column
+        for column in CARD_LIST_COLUMNS
+    )
+
+# (SQL expression, kind) of the sort key of each sortable listing field.
+# NULLs sort as empty or zero and text ignores ASCII case, so a sorted
+# listing can be paged through with a (key, card_number) cursor; sort_value
+# computes the same keys in Python
+SORT_KEYS = {
+    'card_number': ("card_number", 'text'),
+    'brand': ("IFNULL(brand, '') COLLATE NOCASE", 'nocase'),
+    'has_pin': ("(COALESCE(pin, '') <> '')", 'flag'),
+    'denomination': ("IFNULL(denomination, 0)", 'number'),
+    'purchase_price': ("IFNULL(purchase_price, 0)", 'number'),
+    'expected_price': ("IFNULL(expected_price, 0)", 'number'),
+    'expected_percent': ("IFNULL(expected_percent, 0)", 'number'),
+    'profit': ("IFNULL(profit, 0)", 'number'),
+    'realized_profit': ("IFNULL(realized_profit, 0)", 'number'),
+    'discount_percent': ("IFNULL(discount_percent, 0)", 'number'),
+    'source': ("IFNULL(source, '') COLLATE NOCASE", 'nocase'),
+    'purchase_date': ("IFNULL(purchase_date, '')", 'text'),
+    'pending': ("IFNULL(pending, '') COLLATE NOCASE", 'nocase'),
+    'sold_date': ("IFNULL(sold_date, '')", 'text'),
+    'payment_received': ("IFNULL(payment_received, 0)", 'number'),
+    'payment_mode': ("IFNULL(payment_mode, '') COLLATE NOCASE", 'nocase'),
+    'card_image_path': ("(COALESCE(card_image_path, '') <> '')", 'flag'),
+    'expiry_date': ("IFNULL(expiry_date, '')", 'text'),
+}
+
+# Listing rows fetched per get_cards_page call
+PAGE_SIZE = 500
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Columns that update_card may change
+UPDATABLE_COLUMNS = [
+    'brand', 'pin', 'denomination', 'purchase_price', 'expected_price', 'expected_percent',
+    'source', 'purchase_date', 'pending', 'sold_date', 'payment_received', 'payment_mode', 'card_image_path',
+    'expiry_date', 'owner'
+]
+
+# Cached file metadata of card_image_path, maintained by image_reconciler;
+# NULL until the file has been checked
+IMAGE_STATUS_COLUMNS = ['image_exists', 'image_size']
+
+# Columns that may be fetched individually through get_card_fields
+CARD_COLUMNS = ['card_number', 'version'] + UPDATABLE_COLUMNS + IMAGE_STATUS_COLUMNS + DERIVED_FIELDS
+
+# Columns of a card returned by get_card_by_number
+CARD_DETAIL_COLUMNS = [
+    'card_number', 'brand', 'pin', 'denomination', 'purchase_price', 'expected_price', 'expected_percent', 'profit',
+    'source', 'purchase_date', 'card_image_path', 'pending', 'sold_date', 'payment_received', 'payment_mode',
+    'version', 'image_exists', 'realized_profit', 'discount_percent', 'expiry_date', 'owner'
+]
+
+# Columns whose values never go into the audit trail, only whether they are set
+MASKED_HISTORY_COLUMNS = ['pin']
+MASKED_VALUE = "***"
+
+# A full inventory snapshot is taken in the background every this many card
+# events, so recent point-in-time reconstruction replays few events
+SNAPSHOT_INTERVAL = 5000
+
+# Newest snapshots always kept; older ones are thinned to one per doubling
+# of their age in events, plus the oldest baseline
+SNAPSHOT_KEEP = 4
+
+# Message returned when a compare-and-swap update finds a newer row version
+VERSION_CONFLICT = "Card was modified by someone else"
+
+# Columns of a pricing rule; NULL brand, source or band limits match any card
+PRICING_RULE_COLUMNS = ['id', 'brand', 'source', 'min_denomination', 'max_denomination', 'percent']
+
+# New expected price and percent of every unsold card whose most specific
+# matching rule changes it. Brand, source and denomination band each make a
+# rule more specific; the newest rule wins ties. pricing_rule_rank and
+# pricing_rule_matches are the Python equivalents
+REPRICE_SELECT = """
+SELECT card_number, brand, purchase_price, expected_price AS old_price, expected_percent AS old_percent,
+       percent, ROUND(purchase_price * percent / 100.0, 2) AS new_price
+FROM (
+    SELECT c.card_number, c.brand, c.purchase_price, c.expected_price, c.expected_percent, (
+        SELECT r.percent FROM pricing_rules r
+        WHERE (r.brand IS NULL OR r.brand = c.brand COLLATE NOCASE)
+          AND (r.source IS NULL OR r.source = c.source COLLATE NOCASE)
+          AND (r.min_denomination IS NULL OR c.denomination >= r.min_denomination)
+          AND (r.max_denomination IS NULL OR c.denomination < r.max_denomination)
+        ORDER BY (r.brand IS NOT NULL) + (r.source IS NOT NULL)
+                 + (r.min_denomination IS NOT NULL OR r.max_denomination IS NOT NULL) DESC, r.id DESC
+        LIMIT 1
+    ) AS percent
+    FROM cards c
+    WHERE LOWER(TRIM(IFNULL(c.pending, ''))) NOT LIKE 'no%'
+)
+WHERE percent IS NOT NULL
+  AND (expected_price IS NOT ROUND(purchase_price * percent / 100.0, 2) OR expected_percent IS NOT percent)
+"""
+
+# Changed cards listed in a repricing preview
+PREVIEW_ROWS = 200
+
+# Sold cards without a recorded payment, awaiting reconciliation against statements
+UNPAID_SOLD_CONDITION = "LOWER(TRIM(IFNULL(pending, ''))) LIKE 'no%' AND COALESCE(NULLIF(payment_received, ''), 0) = 0"
+
+# Cards not sold yet, which lose value while they wait. The aging queries
+# only read partial indexes over them, never the whole table
+UNSOLD_CONDITION = "LOWER(TRIM(IFNULL(pending, ''))) NOT LIKE 'no%'"
+
+# Upper bounds in days held of the holding-age buckets of get_aging_buckets.
+# Older cards make one more bucket, cards without a purchase date another
+AGING_BUCKETS = [30, 60, 90, 180]
+
+# Cards listed per aging alert; the counts cover all of them
+ALERT_ROWS = 100
+
+# Keys of get_card_totals; profit is expected on unsold cards, realized_profit earned on sold ones
+CARD_TOTALS = ['count', 'unsold', 'denomination', 'purchase_price', 'profit', 'realized_profit']
+
+def history_value(column, value):
+    """Value of a column as recorded in the audit trail"""
+    if column in MASKED_HISTORY_COLUMNS:
+        return MASKED_VALUE if value else ''
+    return value
+
+def derived_values(card, today=None):
+    """Generated columns of a card dictionary, plus days_held, computed like SQLite would"""
+    def number(column):
+        value = card.get(column)
+        return value if isinstance(value, (int, float)) else None
+    
+    expected, purchase, received, denomination = (
+        number('expected_price'), number('purchase_price'), number('payment_received'), number('denomination'))
+    values = {
+        'profit': expected - purchase if None not in (expected, purchase) else None,
+        'realized_profit': received - purchase if None not in (received, purchase) else None,
+        'discount_percent': (denomination - purchase) * 100.0 / denomination
+        if None not in (denomination, purchase) and denomination > 0 else None,
+        'days_held': None,
+    }
+    try:
+        end = date.fromisoformat(card.get('sold_date') or today or datetime.now(timezone.utc).date().isoformat())
+        values['days_held'] = (end - date.fromisoformat(card.get('purchase_date') or '')).days
+    except (TypeError, ValueError):
+        pass
+    return values
+
+def pricing_rule_rank(rule):
+    """Sort key of a pricing rule; the highest ranked matching rule prices a card"""
+    band = rule['min_denomination'] is not None or rule['max_denomination'] is not None
+    return (rule['brand'] is not None) + (rule['source'] is not None) + band, rule['id']
+
+def pricing_rule_matches(rule, card):
+    """Whether a pricing rule applies to an unsold card"""
+    if str(card['pending'] or '').strip().lower().startswith('no'):
+        return False
+    if rule['brand'] is not None and rule['brand'].translate(ASCII_LOWER) != (card['brand'] or '').translate(ASCII_LOWER):
+        return False
+    if rule['source'] is not None and rule['source'].translate(ASCII_LOWER) != (card['source'] or '').translate(ASCII_LOWER):
+        return False
+    if rule['min_denomination'] is not None and not (card['denomination'] or 0) >= rule['min_denomination']:
+        return False
+    return rule['max_denomination'] is None or (card['denomination'] or 0) < rule['max_denomination']
+
+def clean_pricing_rule(rule):
+    """Validate a pricing rule from the UI, returning (rule with NULLs for 'any', error message)"""
+    rule = {
+        'brand': (rule.get('brand') or '').strip() or None,
+        'source': (rule.get('source') or '').strip() or None,
+        'min_denomination': rule.get('min_denomination') or None,
+        'max_denomination': rule.get('max_denomination') or None,
+        'percent': rule.get('percent') or 0,
+    }
+    if rule['percent'] <= 0:
+        return None, "The percentage must be greater than 0"
+    if (rule['min_denomination'] is not None and rule['max_denomination'] is not None
+            and rule['min_denomination'] >= rule['max_denomination']):
+        return None, "The denomination band is empty"
+    return rule, ""
+
+def aging_bucket_labels():
+    """Names of the holding-age buckets, in the order get_aging_buckets returns them"""
+    bounds = [0] + AGING_BUCKETS
+    labels = [f"{low + 1 if low else 0}-{high} days" for low, high in zip(bounds, AGING_BUCKETS)]
+    return labels + [f"Over {AGING_BUCKETS[-1]} days", "No purchase date"]
+
+def aging_cutoffs(today=None):
+    """Earliest purchase date of each bucket in AGING_BUCKETS as of today, a UTC 'YYYY-MM-DD' date by default"""
+    today = date.fromisoformat(today) if today else datetime.now(timezone.utc).date()
+    return [(today - timedelta(days=days)).isoformat() for days in AGING_BUCKETS]
+
+def aging_bucket(purchase_date, cutoffs):
+    """Bucket index of a purchase date, compared as text like the SQL of get_aging_buckets"""
+    if not purchase_date:
+        return len(cutoffs) + 1
+    return next((i for i, cutoff in enumerate(cutoffs) if str(purchase_date) >= cutoff), len(cutoffs))
+
+def sort_value(field, value):
+    """Python equivalent of a field's SQL sort key in SORT_KEYS"""
+    kind = SORT_KEYS[field][1]
+    if kind == 'flag':
+        return int(bool(value))
+    if kind == 'number':
+        # SQLite orders numbers before text
+        try:
+            return (0, float(value or 0))
+        except (TypeError, ValueError):
+            return (1, str(value))
+    value = "" if value is None else str(value)
+    return value.translate(ASCII_LOWER) if kind == 'nocase' else value
 
 class DatabaseManager:
-    def __init__(self, db_path="giftcards.db"):
+    def __init__(self, db_path="giftcards.db", tracer=None):
         self.db_path = db_path
+        # Optional sql_trace.SqlTracer timing every statement
+        self.tracer = tracer
+        # Newest event written through this manager and the one the latest
+        # snapshot covers, so deciding on a snapshot needs no query
+        self.last_event_id = 0
+        self.snapshot_event_id = 0
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_thread = None
         self.init_db()
+        # Full access until a user's session starts, see set_user
+        self._apply_access(Access())
+    
+    def _connect(self):
+        """Open a connection, traced when a tracer is set"""
+        if self.tracer is not None:
+            return sqlite3.connect(self.db_path, timeout=20.0, factory=self.tracer.connection_factory)
+        return sqlite3.connect(self.db_path, timeout=20.0)
+    
+    def set_user(self, name):
+        """Start a session as a user, or with full access for None, returning (success, message)
+        
+        The user's role is read once here; every later query uses the
+        filters and projections cached from it.
+        """
+        if name is None:
+            self._apply_access(Access())
+            return True, "Full access"
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+            SELECT u.source, {', '.join(f'r.{column}' for column in ROLE_COLUMNS)}
+            FROM users u JOIN roles r ON r.name = u.role WHERE u.name = ?
+            """, (name,))
+            row = cursor.fetchone()
+        except Exception as e:
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+        if row is None:
+            return False, f"Unknown user {name}"
+        self._apply_access(Access(name, row[0], dict(zip(ROLE_COLUMNS, row[1:]))))
+        return True, f"Signed in as {name}"
+    
+    def _apply_access(self, access):
+        """Cache the SQL fragments of a session's permissions"""
+        self.access = access
+        self.masked_columns = access.masked_columns()
+        self.list_fields = card_list_fields(self.masked_columns)
+        self.row_filter, self.row_params = access.row_filter()
+        self.pin_field, self.pin_params = access.pin_projection()
+        # Masked columns sort as all equal, by card number, so the order leaks
+        # nothing; a bare 0 would be read as a result column number
+        self.sort_keys = {field: ("0 + 0", kind) if field in self.masked_columns else (key, kind)
+                          for field, (key, kind) in SORT_KEYS.items()}
+    
+    def _where(self, *conditions):
+        """WHERE clause of the given conditions and the session's row filter
+        
+        The row filter comes last, so self.row_params follow the parameters
+        of the conditions.
+        """
+        conditions = [condition for condition in conditions + (self.row_filter,) if condition]
+        return f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    
+    def _projection(self, fields):
+        """(SQL expressions, parameters) of card columns as this session may read them"""
+        expressions = []
+        params = []
+        for field in fields:
+            if field == 'pin':
+                expressions.append(f"{self.pin_field} AS pin")
+                params.extend(self.pin_params)
+            elif field in self.masked_columns:
+                expressions.append(f"NULL AS {field}")
+            elif field == 'days_held':
+                expressions.append(f"{DAYS_HELD} AS days_held")
+            else:
+                expressions.append(field)
+        return expressions, params
     
     def init_db(self):
         """Initialize database and create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # Readers never block the intake writer, and it blocks them only while committing
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Create table if it doesn't exist
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS cards (
@@ -21,9 +356,11 @@ class DatabaseManager:
         )
         """)
         
-        # Check if we need to migrate the database
-        cursor.execute("PRAGMA table_info(cards)")
-        columns = [column[1] for column in cursor.fetchall()]
+        # Check if we need to migrate the database; generated columns are
+        # hidden (2 or 3) in table_xinfo
+        cursor.execute("PRAGMA table_xinfo(cards)")
+        hidden = {column[1]: column[6] for column in cursor.fetchall()}
+        columns = list(hidden)
         
         # Add new columns if they don't exist
         if 'brand' not in columns:
@@ -36,8 +373,6 @@ class DatabaseManager:
             cursor.execute("ALTER TABLE cards ADD COLUMN purchase_price REAL")
         if 'expected_price' not in columns:
             cursor.execute("ALTER TABLE cards ADD COLUMN expected_price REAL")
-        if 'profit' not in columns:
-            cursor.execute("ALTER TABLE cards ADD COLUMN profit REAL")
         if 'source' not in columns:
             cursor.execute("ALTER TABLE cards ADD COLUMN source TEXT")
         if 'card_image_path' not in columns:
@@ -56,48 +391,190 @@ class DatabaseManager:
             cursor.execute("ALTER TABLE cards ADD COLUMN payment_mode TEXT")
         if 'expected_percent' not in columns:
             cursor.execute("ALTER TABLE cards ADD COLUMN expected_percent REAL")
+        if 'version' not in columns:
+            # Row version for optimistic concurrency control, bumped by every update
+            cursor.execute("ALTER TABLE cards ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if 'image_exists' not in columns:
+            cursor.execute("ALTER TABLE cards ADD COLUMN image_exists INTEGER")
+        if 'image_size' not in columns:
+            cursor.execute("ALTER TABLE cards ADD COLUMN image_size INTEGER")
+        if 'card_number_key' not in columns:
+            # Normalized card number, unique, and reversed for near-duplicate lookups
+            cursor.execute("ALTER TABLE cards ADD COLUMN card_number_key TEXT")
+            cursor.execute("ALTER TABLE cards ADD COLUMN card_number_rkey TEXT")
+            self._fill_number_keys(cursor)
+        if 'expiry_date' not in columns:
+            cursor.execute("ALTER TABLE cards ADD COLUMN expiry_date TEXT")
+        if 'owner' not in columns:
+            # User who added the card; NULL for cards from before users existed
+            cursor.execute("ALTER TABLE cards ADD COLUMN owner TEXT")
+        if hidden.get('profit') == 0:
+            # Profit used to be stored, and could disagree with the prices
+            cursor.execute("DROP INDEX IF EXISTS idx_cards_sort_profit")
+            cursor.execute("ALTER TABLE cards DROP COLUMN profit")
+            del hidden['profit']
+        for column, expression in DERIVED_COLUMNS.items():
+            if column not in hidden:
+                cursor.execute(f"ALTER TABLE cards ADD COLUMN {column} REAL GENERATED ALWAYS AS ({expression}) VIRTUAL")
+        
+        # Filters used by query_cards
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_brand ON cards (brand, purchase_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_purchase_date ON cards (purchase_date)")
+        # Partial index of the cards get_unpaid_sold_cards lists, which stay few
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_cards_unpaid ON cards (sold_date, card_number) WHERE {UNPAID_SOLD_CONDITION}")
+        # Partial indexes of the unsold cards for the aging alerts and report. The
+        # holding age changes every day and cannot be indexed, but its purchase
+        # date can. Carrying pending and the prices lets the counts and bucket
+        # totals be read from the indexes alone
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_cards_unsold_expiry ON cards (expiry_date, card_number, pending) "
+                       f"WHERE {UNSOLD_CONDITION} AND expiry_date <> ''")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_cards_unsold_age ON cards "
+                       f"(purchase_date, card_number, denomination, purchase_price, expected_price, pending) WHERE {UNSOLD_CONDITION}")
+        
+        # Row scope of users who only see the cards they added; the source
+        # scope uses the source sort index
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_owner ON cards (owner, card_number)")
+        
+        # Normalized duplicates are rejected; both orders serve near-duplicate lookups
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_cards_number_key ON cards (card_number_key)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_number_rkey ON cards (card_number_rkey, card_number)")
+        
+        # Sorted listing pages, see get_cards_page; card_number has its UNIQUE index
+        for field in SORT_KEYS:
+            if field == 'card_number':
+                continue
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_cards_sort_{field} ON cards ({SORT_KEYS[field][0]}, card_number)")
+        
+        # Wrapped PIN encryption keys, see pin_vault.PinVault
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vault_settings (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            salt BLOB NOT NULL,
+            scrypt_n INTEGER NOT NULL,
+            scrypt_r INTEGER NOT NULL,
+            scrypt_p INTEGER NOT NULL,
+            active_key_id INTEGER NOT NULL
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vault_keys (
+            key_id INTEGER PRIMARY KEY,
+            wrapped_key TEXT NOT NULL
+        )
+        """)
+        
+        # Append-only audit trail: one row per mutation with column-level diffs
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'card_events'")
+        new_audit_trail = cursor.fetchone() is None
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS card_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_number TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            changes TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_events_card ON card_events (card_number, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_events_created ON card_events (created_at)")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS card_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            last_event_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS card_snapshot_rows (
+            snapshot_id INTEGER NOT NULL,
+            card_number TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (snapshot_id, card_number)
+        ) WITHOUT ROWID
+        """)
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pricing_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            brand TEXT,
+            source TEXT,
+            min_denomination REAL,
+            max_denomination REAL,
+            percent REAL NOT NULL CHECK (percent > 0)
+        )
+        """)
+        
+        # Users and their roles, see access.Access
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS roles (
+            name TEXT PRIMARY KEY,
+            row_scope TEXT NOT NULL CHECK (row_scope IN ({', '.join(f"'{scope}'" for scope in ROW_SCOPES)})),
+            pin_access TEXT NOT NULL CHECK (pin_access IN ({', '.join(f"'{access}'" for access in PIN_ACCESS)})),
+            see_costs INTEGER NOT NULL,
+            can_add INTEGER NOT NULL,
+            can_edit INTEGER NOT NULL,
+            can_delete INTEGER NOT NULL,
+            administer INTEGER NOT NULL
+        )
+        """)
+        cursor.executemany(f"INSERT OR IGNORE INTO roles ({', '.join(ROLE_COLUMNS)}) VALUES ({', '.join('?' * len(ROLE_COLUMNS))})",
+                           DEFAULT_ROLES)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            name TEXT PRIMARY KEY,
+            role TEXT NOT NULL REFERENCES roles (name),
+            source TEXT
+        )
+        """)
         
         # Update existing records to have default values for new columns
         cursor.execute("UPDATE cards SET brand = 'Unknown' WHERE brand IS NULL")
         cursor.execute("UPDATE cards SET denomination = balance WHERE denomination IS NULL")
         cursor.execute("UPDATE cards SET purchase_price = balance WHERE purchase_price IS NULL")
         cursor.execute("UPDATE cards SET expected_price = balance WHERE expected_price IS NULL")
-        cursor.execute("UPDATE cards SET profit = 0 WHERE profit IS NULL")
         cursor.execute("UPDATE cards SET source = 'Unknown' WHERE source IS NULL")
         cursor.execute("UPDATE cards SET purchase_date = date('now') WHERE purchase_date IS NULL")
         cursor.execute("UPDATE cards SET pending = 'No' WHERE pending IS NULL")
         
+        # Cards that predate the audit trail have no create events, so start
+        # the history from a baseline snapshot of them
+        if new_audit_trail:
+            self._take_snapshot(cursor, 0)
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM card_events")
+        self.last_event_id = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(last_event_id), 0) FROM card_snapshots")
+        self.snapshot_event_id = cursor.fetchone()[0]
+        
         conn.commit()
         conn.close()
     
+    def _fill_number_keys(self, cursor):
+        """Set the number keys of existing cards, oldest first
+        
+        A card whose key an older card already has keeps a NULL key, so the
+        unique index can be built; find_duplicates still reports the pair.
+        """
+        cursor.execute("SELECT id, card_number FROM cards ORDER BY id")
+        seen = set()
+        updates = []
+        for row_id, card_number in cursor.fetchall():
+            key = normalize_card_number(card_number)
+            updates.append((None if key in seen else key, key[::-1], row_id))
+            seen.add(key)
+        cursor.executemany("UPDATE cards SET card_number_key = ?, card_number_rkey = ? WHERE id = ?", updates)
+    
     def add_card(self, card_data):
         """Add a new gift card to the database"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path, timeout=20.0)
+            conn = self._connect()
             cursor = conn.cursor()
-            
-            # Check for existing card number
-            cursor.execute("SELECT card_number FROM cards WHERE card_number = ?", (card_data['card_number'],))
-            if cursor.fetchone():
-                return False, "Card number already exists"
-            
-            # Insert new card
-            cursor.execute("""
-            INSERT INTO cards (card_number, brand, pin, denomination, 
-                              purchase_price, expected_price, expected_percent, profit, source, card_image_path, purchase_date, 
-                              pending, sold_date, payment_received, payment_mode, balance) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                card_data['card_number'], card_data['brand'],
-                card_data['pin'], card_data['denomination'], card_data['purchase_price'],
-                card_data['expected_price'], card_data.get('expected_percent', None), card_data['profit'], card_data['source'],
-                card_data['card_image_path'], card_data['purchase_date'], card_data['pending'],
-                card_data['sold_date'], card_data['payment_received'], card_data['payment_mode'],
-                card_data['denomination']
-            ))
+            success, message = self._insert_card(cursor, card_data)
+            if not success:
+                return False, message
             conn.commit()
-            return True, "Card added successfully"
+            self._maybe_snapshot()
+            return True, message
             
         except Exception as e:
             if conn:
@@ -107,18 +584,76 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    def add_cards(self, cards):
+        """Add many cards in one transaction, returning (card_number, success, message) per card"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            results = []
+            for card_data in cards:
+                success, message = self._insert_card(cursor, card_data)
+                results.append((card_data['card_number'], success, message))
+            conn.commit()
+            self._maybe_snapshot()
+            return results
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return [(card_data['card_number'], False, str(e)) for card_data in cards]
+        finally:
+            if conn:
+                conn.close()
+    
+    def _insert_card(self, cursor, card_data):
+        """Insert one card and its create event, inside the caller's transaction"""
+        if not self.access.can_add:
+            return False, PERMISSION_DENIED
+        # Cards belong to the user adding them; administrators may name another owner
+        card_data = dict(card_data, owner=card_data.get('owner') if self.access.administer and card_data.get('owner')
+                         else self.access.user)
+        
+        # Check for existing card number, also written with other separators
+        key = normalize_card_number(card_data['card_number'])
+        cursor.execute("SELECT card_number FROM cards WHERE card_number = ? OR card_number_key = ?",
+                       (card_data['card_number'], key))
+        existing = cursor.fetchone()
+        if existing:
+            if existing[0] == card_data['card_number']:
+                return False, "Card number already exists"
+            return False, f"Card number already exists as {existing[0]}"
+        
+        # Insert new card
+        cursor.execute("""
+        INSERT INTO cards (card_number, brand, pin, denomination, 
+                          purchase_price, expected_price, expected_percent, source, card_image_path, purchase_date, 
+                          pending, sold_date, payment_received, payment_mode, balance, card_number_key, card_number_rkey,
+                          expiry_date, owner) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            card_data['card_number'], card_data['brand'],
+            card_data['pin'], card_data['denomination'], card_data['purchase_price'],
+            card_data['expected_price'], card_data.get('expected_percent', None), card_data['source'],
+            card_data['card_image_path'], card_data['purchase_date'], card_data['pending'],
+            card_data['sold_date'], card_data['payment_received'], card_data['payment_mode'],
+            card_data['denomination'], key, key[::-1], card_data.get('expiry_date'), card_data['owner']
+        ))
+        self._record_event(cursor, card_data['card_number'], 'create', {
+            column: history_value(column, card_data.get(column)) for column in UPDATABLE_COLUMNS
+            if card_data.get(column) not in (None, '')
+        })
+        return True, "Card added successfully"
+    
     def get_all_cards(self):
         """Get all cards from the database"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path, timeout=20.0)
+            conn = self._connect()
             cursor = conn.cursor()
-            cursor.execute("""
-            SELECT card_number, brand, pin, denomination, 
-                   purchase_price, expected_price, expected_percent, profit, source, purchase_date, 
-                   pending, sold_date, payment_received, payment_mode, card_image_path
-            FROM cards ORDER BY created_at DESC
-            """)
+            # id breaks ties between cards added within the same second
+            cursor.execute(f"SELECT {self.list_fields} FROM cards {self._where()}ORDER BY created_at DESC, id DESC",
+                           self.row_params)
             return cursor.fetchall()
         except Exception as e:
             return []
@@ -126,43 +661,696 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
-    def update_card(self, card_number, card_data):
-        """Update an existing card"""
+    def get_cards_page(self, sort_field=None, descending=True, after=None, limit=PAGE_SIZE):
+        """Get one page of listing rows in a stable order, and the cursor of the next page
+        
+        Rows are ordered by the sort key of sort_field with the card number
+        breaking ties, or newest first without a sort field. after is the
+        cursor returned with the previous page; None is returned as the
+        cursor of the last page.
+        """
+        if sort_field is not None and sort_field not in SORT_KEYS:
+            raise ValueError(f"Cannot sort by {sort_field}")
+        keys = [self.sort_keys[sort_field][0], "card_number"] if sort_field else ["id"]
+        direction = "DESC" if descending else "ASC"
+        condition = ""
+        params = []
+        if after is not None:
+            # Continuing from the cursor instead of an OFFSET keeps pages stable
+            # while cards are added or deleted. Spelled out rather than as a row
+            # value comparison, so SQLite seeks the index to the cursor
+            beyond = '<' if descending else '>'
+            if sort_field:
+                condition = f"{keys[0]} {beyond}= ? AND ({keys[0]} {beyond} ? OR card_number {beyond} ?)"
+                params.extend([after[0], after[0], after[1]])
+            else:
+                condition = f"id {beyond} ?"
+                params.append(after[0])
+        params.extend(self.row_params)
+        params.append(limit)
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {self.list_fields}, {', '.join(keys)} FROM cards {self._where(condition)}"
+                f"ORDER BY {', '.join(f'{key} {direction}' for key in keys)} LIMIT ?",
+                params
+            )
+            rows = cursor.fetchall()
+        except Exception:
+            return [], None
+        finally:
+            if conn:
+                conn.close()
+        width = len(CARD_LIST_COLUMNS)
+        next_page = tuple(rows[-1][width:]) if len(rows) == limit else None
+        return [row[:width] for row in rows], next_page
+    
+    def count_cards(self):
+        """Count all cards"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM cards {self._where()}", self.row_params)
+            return cursor.fetchone()[0]
+        except Exception:
+            return 0
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_data_version(self):
+        """Id of the newest audit event, which grows with every committed card change"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM card_events")
+            return cursor.fetchone()[0]
+        except Exception:
+            return None
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_unpaid_sold_cards(self):
+        """Get (card_number, expected_price, sold_date, payment_mode, version) of sold cards without a payment"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+            SELECT card_number, expected_price, sold_date, payment_mode, version FROM cards
+            {self._where(UNPAID_SOLD_CONDITION)}ORDER BY sold_date, card_number
+            """, self.row_params)
+            return cursor.fetchall()
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_card_totals(self):
+        """Get the card count and money totals of the whole inventory in one scan; masked totals are None"""
+        sold = "LOWER(TRIM(IFNULL(pending, ''))) LIKE 'no%'"
+        totals = [self._total("denomination"), self._total("purchase_price"),
+                  self._total(f"CASE WHEN NOT ({sold}) THEN profit END", 'profit'),
+                  self._total(f"CASE WHEN {sold} THEN realized_profit END", 'realized_profit')]
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+            SELECT COUNT(*), COUNT(*) - TOTAL({sold}), {', '.join(totals)}
+            FROM cards {self._where()}
+            """, self.row_params)
+            count, unsold, *money = cursor.fetchone()
+            return dict(zip(CARD_TOTALS, [count, int(unsold)] + money))
+        except Exception:
+            return None
+        finally:
+            if conn:
+                conn.close()
+    
+    def _total(self, expression, column=None):
+        """SQL sum of an expression over a column, or NULL if the session may not read the column"""
+        return "NULL" if (column or expression) in self.masked_columns else f"TOTAL({expression})"
+    
+    def get_expiring_cards(self, before, limit=ALERT_ROWS):
+        """Get (count, [(card_number, brand, denomination, expiry_date)]) of unsold cards expiring by a date, soonest first
+        
+        Only reads the range of the unsold expiry index up to the date.
+        """
+        where = self._where(f"{UNSOLD_CONDITION} AND expiry_date <> '' AND expiry_date <= ?")
+        params = [before] + self.row_params
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM cards {where}", params)
+            count = cursor.fetchone()[0]
+            cursor.execute(f"""
+            SELECT card_number, brand, denomination, expiry_date FROM cards {where}
+            ORDER BY expiry_date, card_number LIMIT ?
+            """, params + [limit])
+            return count, cursor.fetchall()
+        except Exception:
+            return 0, []
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_aging_cards(self, purchased_before, limit=ALERT_ROWS):
+        """Get (count, [(card_number, brand, denomination, purchase_date)]) of unsold cards bought by a date, oldest first"""
+        where = self._where(f"{UNSOLD_CONDITION} AND purchase_date <> '' AND purchase_date <= ?")
+        params = [purchased_before] + self.row_params
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM cards {where}", params)
+            count = cursor.fetchone()[0]
+            cursor.execute(f"""
+            SELECT card_number, brand, denomination, purchase_date FROM cards {where}
+            ORDER BY purchase_date, card_number LIMIT ?
+            """, params + [limit])
+            return count, cursor.fetchall()
+        except Exception:
+            return 0, []
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_aging_buckets(self, today=None):
+        """Get [(count, denomination, purchase_price, expected_price)] totals of the unsold cards per holding-age bucket
+        
+        Buckets are in aging_bucket_labels order, counted from the covering
+        unsold age index without reading the table. Masked totals are None.
+        """
+        cutoffs = aging_cutoffs(today)
+        cases = " ".join(f"WHEN purchase_date >= ? THEN {i}" for i in range(len(cutoffs)))
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+            SELECT CASE WHEN IFNULL(purchase_date, '') = '' THEN {len(cutoffs) + 1} {cases} ELSE {len(cutoffs)} END AS bucket,
+                   COUNT(*), {self._total("denomination")}, {self._total("purchase_price")}, {self._total("expected_price")}
+            FROM cards {self._where(UNSOLD_CONDITION)}GROUP BY bucket
+            """, cutoffs + self.row_params)
+            totals = {row[0]: row[1:] for row in cursor.fetchall()}
+            empty = (0, 0.0, None if 'purchase_price' in self.masked_columns else 0.0, 0.0)
+            return [totals.get(i, empty) for i in range(len(cutoffs) + 2)]
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def query_cards(self, brand=None, pending=None, purchased_from=None, purchased_to=None):
+        """Get the listing rows matching all of the given filters, newest first"""
+        conditions = []
+        params = []
+        if brand is not None:
+            conditions.append("brand = ?")
+            params.append(brand)
+        if pending is not None:
+            conditions.append("pending = ?")
+            params.append(pending)
+        if purchased_from is not None:
+            conditions.append("purchase_date >= ?")
+            params.append(purchased_from)
+        if purchased_to is not None:
+            conditions.append("purchase_date <= ?")
+            params.append(purchased_to)
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {self.list_fields} FROM cards {self._where(' AND '.join(conditions))}"
+                           "ORDER BY created_at DESC, id DESC", params + self.row_params)
+            return cursor.fetchall()
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def update_card(self, card_number, card_data, expected_version=None):
+        """Update the given columns of a card, only if it is still at expected_version"""
+        if not any(column in card_data for column in UPDATABLE_COLUMNS):
+            return True, "No changes to save"
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            status = self._update_card_row(cursor, card_number, card_data, expected_version)
+            if status == 'denied':
+                conn.rollback()
+                return False, PERMISSION_DENIED
+            if status == 'missing':
+                return False, "Card not found"
+            if status == 'conflict':
+                return False, VERSION_CONFLICT
+            conn.commit()
+            self._maybe_snapshot()
+            return True, "Card updated successfully"
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+    
+    def update_cards(self, updates):
+        """Apply (card_number, changes, expected_version) updates in one transaction
+        
+        Non-conflicting updates are committed; the card numbers that conflicted
+        are returned so the caller can merge them. Nothing is saved if the
+        session may not make one of the changes.
+        """
+        if not self.access.can_edit:
+            return False, PERMISSION_DENIED
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            conflicts = []
+            for card_number, changes, expected_version in updates:
+                status = self._update_card_row(cursor, card_number, changes, expected_version)
+                if status == 'denied':
+                    conn.rollback()
+                    return False, PERMISSION_DENIED
+                if status != 'updated':
+                    conflicts.append(card_number)
+            conn.commit()
+            self._maybe_snapshot()
+            return True, conflicts
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+    
+    def _update_card_row(self, cursor, card_number, card_data, expected_version):
+        """Compare-and-swap update of the changed columns of one card, with its audit event
+        
+        Cards outside the session's rows are 'missing'; changes its role does
+        not allow are 'denied'.
+        """
+        columns = [column for column in UPDATABLE_COLUMNS if column in card_data]
+        cursor.execute(f"SELECT {', '.join(['version', 'owner'] + columns)} FROM cards {self._where('card_number = ?')}",
+                       [card_number] + self.row_params)
+        row = cursor.fetchone()
+        if row is None:
+            return 'missing'
+        if not self.access.may_change({'owner': row[1]}, columns):
+            return 'denied'
+        if expected_version is not None and row[0] != expected_version:
+            return 'conflict'
+        row = row[:1] + row[2:]
+        
+        assignments = [f"{column} = ?" for column in columns] + ["version = version + 1"]
+        if 'card_image_path' in columns and row[1 + columns.index('card_image_path')] != card_data['card_image_path']:
+            # The new file has not been checked yet
+            assignments += ["image_exists = NULL", "image_size = NULL"]
+        params = [card_data[column] for column in columns] + [card_number, row[0]]
+        cursor.execute(f"UPDATE cards SET {', '.join(assignments)} WHERE card_number = ? AND version = ?", params)
+        if not cursor.rowcount:
+            return 'conflict'
+        
+        diff = {
+            column: [history_value(column, old), history_value(column, card_data[column])]
+            for column, old in zip(columns, row[1:]) if old != card_data[column]
+        }
+        if diff:
+            self._record_event(cursor, card_number, 'update', diff)
+        return 'updated'
+    
+    def _record_event(self, cursor, card_number, event_type, changes):
+        """Append an event to the audit trail, inside the caller's transaction"""
+        cursor.execute(
+            "INSERT INTO card_events (card_number, event_type, changes) VALUES (?, ?, ?)",
+            (card_number, event_type, json.dumps(changes, separators=(',', ':')))
+        )
+        self.last_event_id = max(self.last_event_id, cursor.lastrowid)
+    
+    def _take_snapshot(self, cursor, last_event_id):
+        """Store the state of every card as of last_event_id"""
+        cursor.execute("INSERT INTO card_snapshots (last_event_id) VALUES (?)", (last_event_id,))
+        snapshot_id = cursor.lastrowid
+        fields = ", ".join(
+            f"'{column}', CASE WHEN COALESCE({column}, '') <> '' THEN '{MASKED_VALUE}' ELSE '' END"
+            if column in MASKED_HISTORY_COLUMNS else f"'{column}', {column}"
+            for column in UPDATABLE_COLUMNS
+        )
+        cursor.execute(f"""
+        INSERT INTO card_snapshot_rows (snapshot_id, card_number, data)
+        SELECT ?, card_number, json_object({fields}) FROM cards
+        """, (snapshot_id,))
+    
+    def _prune_snapshots(self, cursor):
+        """Drop snapshots no longer worth their space, inside the caller's transaction"""
+        cursor.execute("SELECT id, last_event_id FROM card_snapshots ORDER BY last_event_id DESC, id DESC")
+        snapshots = cursor.fetchall()
+        if not snapshots:
+            return
+        newest = snapshots[0][1]
+        kept_ages = set()
+        stale = []
+        # The oldest snapshot is the baseline reconstruction starts from
+        for position, (snapshot_id, last_event_id) in enumerate(snapshots[:-1]):
+            if position < SNAPSHOT_KEEP:
+                continue
+            age = ((newest - last_event_id) // SNAPSHOT_INTERVAL).bit_length()
+            if age in kept_ages:
+                stale.append((snapshot_id,))
+            else:
+                kept_ages.add(age)
+        cursor.executemany("DELETE FROM card_snapshot_rows WHERE snapshot_id = ?", stale)
+        cursor.executemany("DELETE FROM card_snapshots WHERE id = ?", stale)
+    
+    def _maybe_snapshot(self):
+        """Start a background snapshot once SNAPSHOT_INTERVAL events have accumulated since the last one"""
+        with self.snapshot_lock:
+            if self.last_event_id - self.snapshot_event_id < SNAPSHOT_INTERVAL:
+                return
+            if self.snapshot_thread is not None and self.snapshot_thread.is_alive():
+                return
+            previous, self.snapshot_event_id = self.snapshot_event_id, self.last_event_id
+            # Copying every card takes a while on large inventories, so it never
+            # runs on the GUI or intake thread that made the change
+            self.snapshot_thread = threading.Thread(
+                target=self._snapshot_in_background, args=(previous,), name="card-snapshot", daemon=True
+            )
+            self.snapshot_thread.start()
+    
+    def _snapshot_in_background(self, previous_event_id):
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM card_events")
+            last_event_id = cursor.fetchone()[0]
+            cursor.execute("SELECT COALESCE(MAX(last_event_id), 0) FROM card_snapshots")
+            if last_event_id > cursor.fetchone()[0]:
+                self._take_snapshot(cursor, last_event_id)
+                self._prune_snapshots(cursor)
+            conn.commit()
+        except Exception:
+            # Snapshots only speed up history queries; a missed one is retaken later
+            if conn:
+                conn.rollback()
+            with self.snapshot_lock:
+                self.snapshot_event_id = previous_event_id
+        finally:
+            if conn:
+                conn.close()
+    
+    def wait_for_snapshot(self, timeout=None):
+        """Block until a running background snapshot has finished"""
+        thread = self.snapshot_thread
+        if thread is not None:
+            thread.join(timeout)
+    
+    def get_roles(self):
+        """Get every role as a dictionary of ROLE_COLUMNS"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(ROLE_COLUMNS)} FROM roles ORDER BY name")
+            return [dict(zip(ROLE_COLUMNS, row)) for row in cursor.fetchall()]
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_users(self):
+        """Get every user as a dictionary of USER_COLUMNS"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY name")
+            return [dict(zip(USER_COLUMNS, row)) for row in cursor.fetchall()]
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def save_user(self, name, role, source=""):
+        """Add a user or change an existing user's role and source"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        name = (name or "").strip()
+        if not name:
+            return False, "User name is required"
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM roles WHERE name = ?", (role,))
+            if cursor.fetchone() is None:
+                return False, f"Unknown role {role}"
+            cursor.execute("""
+            INSERT INTO users (name, role, source) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET role = excluded.role, source = excluded.source
+            """, (name, role, (source or "").strip()))
+            conn.commit()
+            return True, f"User {name} saved"
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+    
+    def delete_user(self, name):
+        """Delete a user other than the session's own; their cards keep them as owner"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        if name == self.access.user:
+            return False, "You cannot delete your own user"
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM users WHERE name = ?", (name,))
+            conn.commit()
+            return True, "User deleted"
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_pricing_rules(self):
+        """Get every pricing rule as a dictionary, most specific first"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(PRICING_RULE_COLUMNS)} FROM pricing_rules")
+            rules = [dict(zip(PRICING_RULE_COLUMNS, row)) for row in cursor.fetchall()]
+            return sorted(rules, key=pricing_rule_rank, reverse=True)
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def add_pricing_rule(self, rule):
+        """Add a pricing rule; brand, source and band limits left empty match any card"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        rule, message = clean_pricing_rule(rule)
+        if rule is None:
+            return False, message
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path, timeout=20.0)
+            conn = self._connect()
             cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO pricing_rules (brand, source, min_denomination, max_denomination, percent) VALUES (?, ?, ?, ?, ?)",
+                (rule['brand'], rule['source'], rule['min_denomination'], rule['max_denomination'], rule['percent'])
+            )
+            conn.commit()
+            return True, "Pricing rule added"
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+    
+    def delete_pricing_rule(self, rule_id):
+        """Delete a pricing rule"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM pricing_rules WHERE id = ?", (rule_id,))
+            conn.commit()
+            return True, "Pricing rule deleted"
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+    
+    def preview_repricing(self, limit=PREVIEW_ROWS):
+        """Count the cards the pricing rules would change and list the first few
+        
+        Returns {'count', 'profit_change', 'rows'} with rows of (card_number,
+        brand, purchase_price, old expected price, new expected price, percent).
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*), IFNULL(SUM(new_price - IFNULL(old_price, 0)), 0) FROM ({REPRICE_SELECT})")
+            count, profit_change = cursor.fetchone()
+            cursor.execute(f"""
+            SELECT card_number, brand, purchase_price, old_price, new_price, percent
+            FROM ({REPRICE_SELECT}) ORDER BY card_number LIMIT ?
+            """, (limit,))
+            return {'count': count, 'profit_change': profit_change, 'rows': cursor.fetchall()}
+        except Exception:
+            return {'count': 0, 'profit_change': 0, 'rows': []}
+        finally:
+            if conn:
+                conn.close()
+    
+    def apply_pricing_rules(self):
+        """Reprice every unsold card matched by a rule in one set-based transaction
+        
+        Expected price and percent are recomputed in SQL (profit follows, being
+        generated) and each changed card gets a version bump and an update event.
+        """
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"CREATE TEMP TABLE reprice AS {REPRICE_SELECT}")
             cursor.execute("""
-            UPDATE cards SET brand = ?, pin = ?, denomination = ?,
-                            purchase_price = ?, expected_price = ?, expected_percent = ?, profit = ?, 
-                            source = ?, purchase_date = ?, pending = ?, sold_date = ?,
-                            payment_received = ?, payment_mode = ?, card_image_path = ? WHERE card_number = ?
-            """, (
-                card_data['brand'], card_data['pin'],
-                card_data['denomination'], card_data['purchase_price'],
-                card_data['expected_price'], card_data.get('expected_percent', None), card_data['profit'], card_data['source'],
-                card_data['purchase_date'], card_data['pending'], card_data['sold_date'],
-                card_data['payment_received'], card_data['payment_mode'], 
-                card_data.get('card_image_path', ''), card_number
-            ))
+            INSERT INTO card_events (card_number, event_type, changes)
+            SELECT card_number, 'update', json_object(
+                'expected_price', json_array(old_price, new_price),
+                'expected_percent', json_array(old_percent, percent)
+            ) FROM reprice ORDER BY card_number
+            """)
+            count = cursor.rowcount
+            if count:
+                self.last_event_id = max(self.last_event_id, cursor.lastrowid)
+            cursor.execute("""
+            UPDATE cards SET expected_price = r.new_price, expected_percent = r.percent, version = version + 1
+            FROM reprice r WHERE cards.card_number = r.card_number
+            """)
+            cursor.execute("DROP TABLE temp.reprice")
             conn.commit()
-            return True
+            self._maybe_snapshot()
+            return True, f"Repriced {count} card(s)"
         except Exception as e:
             if conn:
                 conn.rollback()
-            return False
+            return False, str(e)
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_card_history(self, card_number):
+        """Get the audit events of a card, newest first; none for a card outside the session's rows"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            if self.row_filter:
+                cursor.execute(f"SELECT 1 FROM cards {self._where('card_number = ?')}", [card_number] + self.row_params)
+                if cursor.fetchone() is None:
+                    return []
+            cursor.execute("""
+            SELECT id, event_type, changes, created_at FROM card_events
+            WHERE card_number = ? ORDER BY id DESC
+            """, (card_number,))
+            return [
+                {'id': row[0], 'event_type': row[1], 'changes': self._mask_changes(json.loads(row[2])),
+                 'created_at': row[3]}
+                for row in cursor.fetchall()
+            ]
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def _mask_changes(self, changes):
+        """Audit event changes with the values of masked columns hidden"""
+        for column in self.masked_columns.intersection(changes):
+            value = changes[column]
+            changes[column] = [MASKED_VALUE, MASKED_VALUE] if isinstance(value, list) else MASKED_VALUE
+        return changes
+    
+    def get_inventory_at(self, timestamp):
+        """Reconstruct every card as it was at a UTC 'YYYY-MM-DD HH:MM:SS' timestamp
+        
+        Starts from the newest snapshot before that time and replays the
+        events after it; for recent times that is about SNAPSHOT_INTERVAL
+        events, more further back where old snapshots were thinned out.
+        Only the session's rows and columns are returned.
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM card_events WHERE created_at <= ?", (timestamp,))
+            target_event_id = cursor.fetchone()[0]
+            cursor.execute("""
+            SELECT id, last_event_id FROM card_snapshots
+            WHERE last_event_id <= ? AND created_at <= ?
+            ORDER BY last_event_id DESC LIMIT 1
+            """, (target_event_id, timestamp))
+            snapshot = cursor.fetchone()
+            if snapshot is None:
+                return None  # Earlier than the start of the audit trail
+            
+            cursor.execute("SELECT card_number, data FROM card_snapshot_rows WHERE snapshot_id = ?", (snapshot[0],))
+            inventory = {card_number: json.loads(data) for card_number, data in cursor.fetchall()}
+            cursor.execute("""
+            SELECT card_number, event_type, changes FROM card_events
+            WHERE id > ? AND id <= ? ORDER BY id
+            """, (snapshot[1], target_event_id))
+            for card_number, event_type, changes in cursor.fetchall():
+                changes = json.loads(changes)
+                if event_type == 'create':
+                    inventory[card_number] = changes
+                elif event_type == 'delete':
+                    inventory.pop(card_number, None)
+                elif card_number in inventory:
+                    for column, (_, new) in changes.items():
+                        inventory[card_number][column] = new
+            return [self.access.mask(dict(card, card_number=card_number)) for card_number, card in inventory.items()
+                    if self.access.allows(card)]
+        except Exception:
+            return None
         finally:
             if conn:
                 conn.close()
     
     def delete_card(self, card_number):
         """Delete a card from the database"""
+        if not self.access.can_delete:
+            return False, PERMISSION_DENIED
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path, timeout=20.0)
+            conn = self._connect()
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM cards WHERE card_number = ?", (card_number,))
+            cursor.execute(f"DELETE FROM cards {self._where('card_number = ?')}", [card_number] + self.row_params)
+            if cursor.rowcount:
+                self._record_event(cursor, card_number, 'delete', {})
             conn.commit()
+            self._maybe_snapshot()
             return True, "Card deleted successfully"
         except Exception as e:
             if conn:
@@ -172,11 +1360,65 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    def find_similar_card_numbers(self, card_number, max_distance=MAX_DISTANCE, window=NEIGHBOUR_WINDOW):
+        """Get [(card_number, distance)] of cards whose number is within max_distance edits, closest first
+        
+        Only the neighbours of the key in both index orders are compared, see
+        near_duplicates.find_duplicates; distance 0 means the same key.
+        """
+        key = normalize_card_number(card_number)
+        rkey = key[::-1]
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            candidates = []
+            for column, value in (('card_number_key', key), ('card_number_rkey', rkey)):
+                for comparison, direction in (('>=', 'ASC'), ('<', 'DESC')):
+                    cursor.execute(
+                        f"SELECT card_number, {column} FROM cards WHERE {column} {comparison} ? "
+                        f"ORDER BY {column} {direction} LIMIT ?", (value, window)
+                    )
+                    candidates += [(number, found if column == 'card_number_key' else found[::-1])
+                                   for number, found in cursor.fetchall()]
+            return closest_card_numbers(key, candidates, max_distance)
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_card_number_keys(self, reverse=False, after=None, limit=PAGE_SIZE):
+        """Get (key, card_number) in key order, or (reversed key, card_number) in reversed key order
+        
+        after is the last pair of the previous chunk.
+        """
+        column = 'card_number_rkey' if reverse else 'card_number_key'
+        where = f"WHERE {column} IS NOT NULL "
+        params = []
+        if after is not None:
+            where += f"AND {column} >= ? AND ({column} > ? OR card_number > ?) "
+            params.extend([after[0], after[0], after[1]])
+        params.append(limit)
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {column}, card_number FROM cards {where}ORDER BY {column}, card_number LIMIT ?", params
+            )
+            return cursor.fetchall()
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
     def check_card_exists(self, card_number):
         """Check if a card number already exists"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path, timeout=20.0)
+            conn = self._connect()
             cursor = conn.cursor()
             cursor.execute("SELECT card_number FROM cards WHERE card_number = ?", (card_number,))
             return cursor.fetchone() is not None
@@ -186,38 +1428,102 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    def get_card_fields(self, card_number, fields):
+        """Get only the requested columns of a card"""
+        fields = [field for field in fields if field in CARD_COLUMNS]
+        if not fields:
+            return {}
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            expressions, params = self._projection(fields)
+            cursor.execute(f"SELECT {', '.join(expressions)} FROM cards {self._where('card_number = ?')}",
+                           params + [card_number] + self.row_params)
+            row = cursor.fetchone()
+            return dict(zip(fields, row)) if row else None
+        except Exception:
+            return None
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_cards_fields(self, card_numbers, fields):
+        """Get {card_number: values of the requested columns, in order} of many cards in one query
+        
+        The card numbers travel as one JSON array parameter, so any number
+        of them is looked up through the card number index without a
+        statement per card or a limit on bound variables.
+        """
+        fields = [field for field in fields if field in CARD_COLUMNS]
+        expressions, params = self._projection(fields)
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(['card_number'] + expressions)} FROM cards "
+                f"{self._where('card_number IN (SELECT value FROM json_each(?))')}",
+                params + [json.dumps(list(card_numbers))] + self.row_params
+            )
+            return {row[0]: row[1:] for row in cursor}
+        except Exception:
+            return {}
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_image_paths(self):
+        """Get (card_number, card_image_path) of every card with an image"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT card_number, card_image_path FROM cards WHERE COALESCE(card_image_path, '') <> ''")
+            return cursor.fetchall()
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def update_image_status(self, updates):
+        """Write (image_exists, image_size, card_number, card_image_path) in one transaction
+        
+        Cards whose image path changed since it was checked are left alone.
+        This is cached metadata, so neither the version nor the audit trail changes.
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE cards SET image_exists = ?, image_size = ? WHERE card_number = ? AND card_image_path = ?",
+                updates
+            )
+            conn.commit()
+            return True
+        except Exception:
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+    
     def get_card_by_number(self, card_number):
-        """Get a specific card by card number"""
+        """Get a specific card by card number, as this session may read it"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path, timeout=20.0)
+            conn = self._connect()
             cursor = conn.cursor()
-            cursor.execute("""
-            SELECT card_number, brand, pin, denomination, 
-                   purchase_price, expected_price, expected_percent, profit, source, purchase_date, 
-                   card_image_path, pending, sold_date, payment_received, payment_mode
-            FROM cards WHERE card_number = ?
-            """, (card_number,))
+            expressions, params = self._projection(CARD_DETAIL_COLUMNS)
+            cursor.execute(f"SELECT {', '.join(expressions)} FROM cards {self._where('card_number = ?')}",
+                           params + [card_number] + self.row_params)
             
             row = cursor.fetchone()
             if row:
-                return {
-                    'card_number': row[0],
-                    'brand': row[1],
-                    'pin': row[2],
-                    'denomination': row[3],
-                    'purchase_price': row[4],
-                    'expected_price': row[5],
-                    'expected_percent': row[6],
-                    'profit': row[7],
-                    'source': row[8],
-                    'purchase_date': row[9],
-                    'card_image_path': row[10],
-                    'pending': row[11],
-                    'sold_date': row[12],
-                    'payment_received': row[13],
-                    'payment_mode': row[14]
-                }
+                return dict(zip(CARD_DETAIL_COLUMNS, row))
             return None
         except Exception as e:
             return None
@@ -225,4 +1531,105 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
- 
\ No newline at end of file
+    def get_pins(self):
+        """Get the stored (possibly encrypted) PIN of every card that has one and this session may read"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            where = self._where("COALESCE(pin, '') <> ''")
+            cursor.execute(f"SELECT card_number, {self.pin_field} FROM cards {where}", self.pin_params + self.row_params)
+            return {card_number: pin for card_number, pin in cursor.fetchall() if pin}
+        except Exception:
+            return {}
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_pins_to_rekey(self, active_prefix, after_rowid, limit):
+        """Get the next batch of PINs not encrypted under the active key, in rowid order"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT rowid, card_number, pin FROM cards
+            WHERE rowid > ? AND COALESCE(pin, '') <> '' AND substr(pin, 1, ?) <> ?
+            ORDER BY rowid LIMIT ?
+            """, (after_rowid, len(active_prefix), active_prefix, limit))
+            return cursor.fetchall()
+        except Exception:
+            return []
+        finally:
+            if conn:
+                conn.close()
+    
+    def update_pins(self, updates):
+        """Write (pin, card_number, previous pin) triples in one transaction
+        
+        A PIN that no longer holds the previous value was edited meanwhile
+        and is left alone.
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.executemany("UPDATE cards SET pin = ? WHERE card_number = ? AND pin = ?", updates)
+            conn.commit()
+            return True
+        except Exception:
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_vault_settings(self):
+        """Get the PIN vault settings and wrapped keys, or None if no vault is set up"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT salt, scrypt_n, scrypt_r, scrypt_p, active_key_id FROM vault_settings WHERE id = 1")
+            row = cursor.fetchone()
+            if not row:
+                return None
+            cursor.execute("SELECT key_id, wrapped_key FROM vault_keys")
+            return {
+                'salt': row[0],
+                'scrypt_n': row[1],
+                'scrypt_r': row[2],
+                'scrypt_p': row[3],
+                'active_key_id': row[4],
+                'keys': dict(cursor.fetchall())
+            }
+        except Exception:
+            return None
+        finally:
+            if conn:
+                conn.close()
+    
+    def save_vault_settings(self, settings):
+        """Replace the PIN vault settings and wrapped keys in one transaction"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("""
+            INSERT OR REPLACE INTO vault_settings (id, salt, scrypt_n, scrypt_r, scrypt_p, active_key_id)
+            VALUES (1, ?, ?, ?, ?, ?)
+            """, (settings['salt'], settings['scrypt_n'], settings['scrypt_r'], settings['scrypt_p'],
+                  settings['active_key_id']))
+            cursor.execute("DELETE FROM vault_keys")
+            cursor.executemany("INSERT INTO vault_keys (key_id, wrapped_key) VALUES (?, ?)",
+                               list(settings['keys'].items()))
+            conn.commit()
+            return True
+        except Exception:
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
@@ -0,0 +1,103 @@
+from PyQt6.QtCore import QObject, QTimer, QSignalBlocker, pyqtSignal
+
+from theme import set_style_state
+
+AMOUNT_MODE = 0
+PERCENT_MODE = 1
+
+
+def style_profit_label(label):
+    """Let the application stylesheet style a profit label by its sign"""
+    label.setObjectName("profitLabel")
+    set_style_state(label, "negative", False)
+
+
+class PriceFormState(QObject):
+    """Keeps purchase price, expected price/percent and profit of a form consistent
+
+    Edits only record which field drives the others; the dependent values
+    are recomputed once per event-loop tick, with their signals blocked so
+    that setting one field never re-triggers the other.
+    """
+
+    # Emitted after a user edit changed the expected price
+    expected_price_edited = pyqtSignal(float)
+
+    def __init__(self, purchase_price_input, expected_price_input, expected_percent_input,
+                 expected_price_mode, profit_label, parent=None):
+        super().__init__(parent)
+        self.purchase_price_input = purchase_price_input
+        self.expected_price_input = expected_price_input
+        self.expected_percent_input = expected_percent_input
+        self.expected_price_mode = expected_price_mode
+        self.profit_label = profit_label
+        self.driver = 'price'
+        self.last_profit = None
+        self.last_expected_price = expected_price_input.value()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.flush)
+
+        style_profit_label(profit_label)
+        purchase_price_input.valueChanged.connect(self.on_purchase_price_changed)
+        expected_price_input.valueChanged.connect(self.on_expected_price_changed)
+        expected_percent_input.valueChanged.connect(self.on_expected_percent_changed)
+        expected_price_mode.currentIndexChanged.connect(self.on_mode_changed)
+
+    def on_purchase_price_changed(self, _):
+        # Whatever the visible field is keeps its value; the other one follows
+        self.driver = 'percent' if self.expected_price_mode.currentIndex() == PERCENT_MODE else 'price'
+        self.schedule()
+
+    def on_expected_price_changed(self, _):
+        self.driver = 'price'
+        self.schedule()
+
+    def on_expected_percent_changed(self, _):
+        self.driver = 'percent'
+        self.schedule()
+
+    def on_mode_changed(self, idx):
+        self.expected_price_input.setVisible(idx == AMOUNT_MODE)
+        self.expected_percent_input.setVisible(idx == PERCENT_MODE)
+        # The stored price stays authoritative when switching modes
+        self.driver = 'price'
+        self.flush()
+
+    def schedule(self):
+        """Coalesce all edits of this event-loop tick into one recalculation"""
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        """Recompute the dependent field and the profit display"""
+        self.timer.stop()
+        purchase_price = self.purchase_price_input.value()
+        if self.driver == 'percent':
+            with QSignalBlocker(self.expected_price_input):
+                self.expected_price_input.setValue(purchase_price * self.expected_percent_input.value() / 100)
+        elif purchase_price > 0:
+            with QSignalBlocker(self.expected_percent_input):
+                self.expected_percent_input.setValue(self.expected_price_input.value() / purchase_price * 100)
+        self.show_profit()
+        expected_price = self.expected_price_input.value()
+        if expected_price != self.last_expected_price:
+            self.last_expected_price = expected_price
+            self.expected_price_edited.emit(expected_price)
+
+    def load(self):
+        """Adopt values that were set programmatically, without recomputing them"""
+        self.timer.stop()
+        self.driver = 'percent' if self.expected_price_mode.currentIndex() == PERCENT_MODE else 'price'
+        self.last_expected_price = self.expected_price_input.value()
+        self.show_profit()
+
+    def show_profit(self):
+        profit = self.expected_price_input.value() - self.purchase_price_input.value()
+        if profit == self.last_profit:
+            return
+        self.last_profit = profit
+        self.profit_label.setText(f"${profit:.2f}")
+        set_style_state(self.profit_label, "negative", profit < 0)
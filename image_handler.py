@@ -1,20 +1,94 @@
 import os
-import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from PyQt6.QtWidgets import QFileDialog, QLabel, QPushButton
-from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPixmap, QImage, QImageReader, QPainter, QColor
+from PyQt6.QtCore import Qt, QObject, QSize, pyqtSignal
 
-class ImageHandler:
-    def __init__(self, image_dir="card_images"):
+from theme import set_style_state
+
+# Stored images are always re-encoded to this format, so the extension is honest
+STORED_IMAGE_FORMAT = "JPG"
+STORED_IMAGE_EXTENSION = ".jpg"
+THUMBNAIL_DIR_NAME = "thumbs"
+
+
+def resolve_image_path(image_path, image_dir="card_images"):
+    """Get the file of a stored image path; bare file names live in the image directory"""
+    if not image_path or os.path.dirname(image_path):
+        return image_path
+    return os.path.join(image_dir, image_path)
+
+
+def read_image(source_path, max_dimension):
+    """Decode an image once, applying EXIF orientation and downscaling while decoding"""
+    reader = QImageReader(source_path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and max_dimension and max(size.width(), size.height()) > max_dimension:
+        # The longest side is the same before and after rotation, so the
+        # scale factor can be applied to the raw (untransformed) size
+        factor = max_dimension / max(size.width(), size.height())
+        reader.setScaledSize(QSize(max(1, round(size.width() * factor)),
+                                   max(1, round(size.height() * factor))))
+    image = reader.read()
+    if image.isNull():
+        raise Exception(reader.errorString())
+    return image
+
+
+def flatten_image(image):
+    """Composite transparent images onto white so they can be stored as JPEG"""
+    if not image.hasAlphaChannel():
+        return image.convertToFormat(QImage.Format.Format_RGB32)
+    flattened = QImage(image.size(), QImage.Format.Format_RGB32)
+    flattened.fill(QColor("white"))
+    painter = QPainter(flattened)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return flattened
+
+
+def write_image_atomically(image, destination, quality):
+    """Encode the image to a temp file next to the destination and rename it into place"""
+    directory = os.path.dirname(destination) or "."
+    fd, temp_path = tempfile.mkstemp(suffix=STORED_IMAGE_EXTENSION, dir=directory)
+    os.close(fd)
+    try:
+        if not image.save(temp_path, STORED_IMAGE_FORMAT, quality):
+            raise Exception(f"Could not encode image to {destination}")
+        os.replace(temp_path, destination)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ImageHandler(QObject):
+    # (card_number, stored path, error message or "") once an ingestion has
+    # finished; emitted from the worker pool, delivered on the GUI thread
+    ingest_finished = pyqtSignal(str, str, str)
+    
+    def __init__(self, image_dir="card_images", max_dimension=1600, thumbnail_size=96,
+                 quality=85, max_workers=2):
+        super().__init__()
         self.image_dir = image_dir
+        self.thumbnail_dir = os.path.join(image_dir, THUMBNAIL_DIR_NAME)
+        self.max_dimension = max_dimension
+        self.thumbnail_size = thumbnail_size
+        self.quality = quality
         self.selected_image_path = ""
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-ingest")
+        self.pending_jobs = {}
         self.ensure_image_directory()
     
     def ensure_image_directory(self):
         """Create the image directory if it doesn't exist"""
         if not os.path.exists(self.image_dir):
             os.makedirs(self.image_dir)
+        if not os.path.exists(self.thumbnail_dir):
+            os.makedirs(self.thumbnail_dir)
     
     def upload_image(self, parent_widget):
         """Open file dialog to select an image"""
@@ -28,26 +102,70 @@ class ImageHandler:
         return False, ""
     
     def save_image(self, card_number):
-        """Save the selected image to the card_images directory"""
+        """Queue the selected image for ingestion and return its final path in card_images"""
         if not self.selected_image_path:
             return ""
         
+        # Cheap header check on the GUI thread so unsupported files fail immediately
+        if not QImageReader(self.selected_image_path).canRead():
+            raise Exception(f"Failed to save image: unsupported image file {self.selected_image_path}")
+        
+        # Create unique filename
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{card_number}_{timestamp}{STORED_IMAGE_EXTENSION}"
+        destination = os.path.join(self.image_dir, filename)
+        
+        # Decode, normalize and write in the worker pool
+        future = self.executor.submit(self.ingest_image, self.selected_image_path, destination)
+        self.pending_jobs[destination] = future
+        future.add_done_callback(lambda done, path=destination: self.on_ingested(card_number, path, done))
+        return destination
+    
+    def on_ingested(self, card_number, destination, future):
+        """Report a finished ingestion, so a failed one does not leave a dangling path"""
+        self.pending_jobs.pop(destination, None)
+        error = future.exception() if not future.cancelled() else Exception("Image ingestion was cancelled")
+        self.ingest_finished.emit(card_number, destination, str(error) if error else "")
+    
+    def ingest_image(self, source_path, destination):
+        """Normalize an image and write it plus its thumbnail (runs in the worker pool)"""
         try:
-            # Create unique filename
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{card_number}_{timestamp}.jpg"
-            destination = os.path.join(self.image_dir, filename)
+            image = flatten_image(read_image(source_path, self.max_dimension))
+            write_image_atomically(image, destination, self.quality)
             
-            # Copy image to destination
-            shutil.copy2(self.selected_image_path, destination)
+            # The thumbnail is produced from the already decoded image
+            thumbnail = image.scaled(
+                self.thumbnail_size, self.thumbnail_size,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+            write_image_atomically(thumbnail, self.thumbnail_path(destination), self.quality)
             return destination
         except Exception as e:
             raise Exception(f"Failed to save image: {str(e)}")
     
+    def thumbnail_path(self, image_path):
+        """Get the thumbnail path for a stored image"""
+        return os.path.join(self.thumbnail_dir, os.path.basename(image_path))
+    
+    def wait_for_pending(self, timeout=None):
+        """Block until all queued image ingestions have finished"""
+        for future in list(self.pending_jobs.values()):
+            future.result(timeout)
+    
+    def shutdown(self):
+        """Finish queued ingestions and stop the worker pool"""
+        self.executor.shutdown(wait=True)
+    
     def show_preview(self, image_path, preview_label):
         """Show image preview in the given label"""
-        if image_path and os.path.exists(image_path):
-            pixmap = QPixmap(image_path)
+        if image_path:
+            # A missing or unreadable file simply fails to decode
+            try:
+                # Decode at preview resolution instead of the full image
+                pixmap = QPixmap.fromImage(read_image(image_path, 480))
+            except Exception:
+                return False
             if not pixmap.isNull():
                 # Get original image dimensions
                 original_width = pixmap.width()
@@ -77,16 +195,7 @@ class ImageHandler:
                 # Adjust label size to fit the image with some padding
                 preview_label.setFixedSize(new_width + 20, new_height + 20)
                 
-                preview_label.setStyleSheet("""
-                    QLabel {
-                        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                            stop:0 #ffffff, stop:0.5 #f8f9fa, stop:1 #e9ecef);
-                        border: 3px solid #28a745;
-                        border-radius: 15px;
-                        padding: 10px;
-                        margin: 5px;
-                    }
-                """)
+                set_style_state(preview_label, "state", "image")
                 return True
         return False
     
@@ -98,19 +207,7 @@ class ImageHandler:
         preview_label.setMinimumSize(150, 200)
         preview_label.setMaximumSize(250, 300)
         preview_label.setFixedSize(180, 220)  # Set a smaller default size
-        preview_label.setStyleSheet("""
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:0.5 #f8f9fa, stop:1 #e9ecef);
-                border: 3px dashed #6c757d;
-                border-radius: 15px;
-                padding: 10px;
-                margin: 5px;
-                font-size: 12px;
-                color: #6c757d;
-                font-weight: bold;
-            }
-        """)
+        set_style_state(preview_label, "state", "empty")
     
     def reset(self):
         """Reset the image handler state"""
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from image_handler import THUMBNAIL_DIR_NAME, resolve_image_path
+
+QUARANTINE_DIR_NAME = "quarantine"
+
+# Unreferenced files younger than this may belong to an ingestion in flight
+ORPHAN_GRACE_SECONDS = 300
+
+
+def normalize_path(path):
+    """Key under which a path and a scanned file compare equal"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def scan_files(directory):
+    """Map normalized path -> (path, size, mtime) of the regular files directly in a directory"""
+    files = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files[normalize_path(entry.path)] = (entry.path, stat.st_size, stat.st_mtime)
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def quarantine_file(path, quarantine_dir):
+    """Move a file into the quarantine directory without overwriting an earlier one"""
+    os.makedirs(quarantine_dir, exist_ok=True)
+    name, extension = os.path.splitext(os.path.basename(path))
+    destination = os.path.join(quarantine_dir, name + extension)
+    suffix = 1
+    while os.path.exists(destination):
+        destination = os.path.join(quarantine_dir, f"{name}_{suffix}{extension}")
+        suffix += 1
+    os.replace(path, destination)
+    return destination
+
+
+def reconcile_images(storage, image_dir="card_images", quarantine=False,
+                     grace_seconds=ORPHAN_GRACE_SECONDS, now=None):
+    """Compare the image directory with the referenced image paths in one pass
+
+    Missing and present files are cached on the cards (image_exists,
+    image_size), so the UI can decide what to show without a stat call.
+    Orphaned files, and thumbnails of images no card uses, are reported and
+    optionally moved to the quarantine directory.
+    """
+    # Query first: a card added after this has a fresh file, which the grace period covers
+    references = storage.get_image_paths()
+    images = scan_files(image_dir)
+    thumbnails = scan_files(os.path.join(image_dir, THUMBNAIL_DIR_NAME))
+    image_dir_key = normalize_path(image_dir)
+
+    referenced = set()
+    missing = []
+    updates = []
+    for card_number, image_path in references:
+        path = resolve_image_path(image_path, image_dir)
+        key = normalize_path(path)
+        referenced.add(key)
+        found = images.get(key)
+        if found is None and (os.path.dirname(key) != image_dir_key or os.path.exists(path)):
+            # Outside the scanned directory, or written since the scan
+            try:
+                found = (path, os.stat(path).st_size, 0)
+            except OSError:
+                found = None
+        if found is None:
+            missing.append((card_number, image_path))
+            updates.append((0, None, card_number, image_path))
+        else:
+            updates.append((1, found[1], card_number, image_path))
+    storage.update_image_status(updates)
+
+    cutoff = (time.time() if now is None else now) - grace_seconds
+    orphans = sorted(
+        (path, size) for key, (path, size, mtime) in images.items()
+        if key not in referenced and mtime < cutoff
+    )
+    referenced_names = {os.path.basename(key) for key in referenced}
+    orphans += sorted(
+        (path, size) for key, (path, size, mtime) in thumbnails.items()
+        if os.path.basename(key) not in referenced_names and mtime < cutoff
+    )
+
+    quarantined = []
+    errors = []
+    if quarantine:
+        quarantine_dir = os.path.join(image_dir, QUARANTINE_DIR_NAME)
+        for path, _ in orphans:
+            # Thumbnails keep their own folder so names never collide with images
+            target = quarantine_dir
+            if os.path.basename(os.path.dirname(path)) == THUMBNAIL_DIR_NAME:
+                target = os.path.join(quarantine_dir, THUMBNAIL_DIR_NAME)
+            try:
+                quarantined.append(quarantine_file(path, target))
+            except OSError as e:
+                errors.append(f"{path}: {e}")
+
+    return {
+        'checked': len(references),
+        # card_number -> image_exists, as written to the storage
+        'statuses': {card_number: exists for exists, _, card_number, _ in updates},
+        'missing': missing,
+        'orphans': [path for path, _ in orphans],
+        'orphan_bytes': sum(size for _, size in orphans),
+        'quarantined': quarantined,
+        'errors': errors,
+    }
+
+
+def format_reconcile_report(result):
+    """Format the result of reconcile_images for display"""
+    if result.get('error'):
+        return f"The image check failed: {result['error']}"
+    lines = [f"Checked {result['checked']} card images."]
+    if result['missing']:
+        lines.append(f"\n{len(result['missing'])} missing:")
+        lines.extend(f"  {card_number}: {path}" for card_number, path in result['missing'][:50])
+        if len(result['missing']) > 50:
+            lines.append(f"  ... and {len(result['missing']) - 50} more")
+    if result['quarantined']:
+        lines.append(f"\nMoved {len(result['quarantined'])} orphaned files to quarantine.")
+    elif result['orphans']:
+        lines.append(f"\n{len(result['orphans'])} orphaned files "
+                     f"({result['orphan_bytes'] / (1024 * 1024):.1f} MB) are not used by any card.")
+    for error in result['errors']:
+        lines.append(f"Could not move {error}")
+    if not result['missing'] and not result['orphans']:
+        lines.append("Every image is present and in use.")
+    return "\n".join(lines)
+
+
+class ImageReconciler(QObject):
+    """Runs reconcile_images on a background thread"""
+
+    # Result dictionary and whether it was requested from the menu;
+    # emitted from the worker thread, delivered on the GUI thread
+    finished = pyqtSignal(object, bool)
+
+    def __init__(self, storage, image_dir="card_images"):
+        super().__init__()
+        self.storage = storage
+        self.image_dir = image_dir
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, quarantine=False, interactive=False):
+        """Start a check unless one is already running"""
+        if self.is_running():
+            return False
+        self.thread = threading.Thread(target=self.run, args=(quarantine, interactive),
+                                       name="image-reconcile", daemon=True)
+        self.thread.start()
+        return True
+
+    def run(self, quarantine, interactive):
+        try:
+            result = reconcile_images(self.storage, self.image_dir, quarantine)
+        except Exception as e:
+            result = {'error': str(e)}
+        self.finished.emit(result, interactive)
+
+    def wait(self, timeout=None):
+        """Block until the running check has finished"""
+        if self.thread is not None:
+            self.thread.join(timeout)
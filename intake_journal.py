@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import threading
+
+
+def journal_path_for(storage):
+    """Journal file next to a storage's database, or None for storages without a file"""
+    db_path = getattr(storage, 'db_path', None)
+    return f"{db_path}-intake.jsonl" if db_path else None
+
+
+def is_locked_error(message):
+    """Whether a storage error message means another connection held the lock"""
+    return "locked" in str(message) or "busy" in str(message)
+
+
+class IntakeJournal:
+    """Append-only JSON lines file of accepted cards and edits not yet in the database
+
+    Each entry is flushed to the OS as it is appended, so a crash of the app
+    loses nothing; sync() fsyncs everything appended so far, once per batch.
+    Entries are acknowledged after their transaction committed, and the
+    unacknowledged ones are handed back by the next open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = self.read_pending()
+        self.next_seq = max((entry['seq'] for entry in self.pending), default=0) + 1
+        # Rewritten without acknowledged entries or a torn last line
+        self.rewrite(self.pending)
+        self.outstanding = {entry['seq'] for entry in self.pending}
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def read_pending(self):
+        """Entries not acknowledged in the journal on disk, oldest first"""
+        entries = {}
+        try:
+            with open(self.path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Cut off by a crash in the middle of a write
+                        continue
+                    if 'ack' in record:
+                        for seq in record['ack']:
+                            entries.pop(seq, None)
+                    else:
+                        entries[record['seq']] = record
+        except FileNotFoundError:
+            pass
+        return [entries[seq] for seq in sorted(entries)]
+
+    def rewrite(self, entries):
+        """Atomically replace the journal with the given entries"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(suffix=".jsonl", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as journal:
+                journal.writelines(json.dumps(entry) + "\n" for entry in entries)
+                journal.flush()
+                os.fsync(journal.fileno())
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def append(self, op, data):
+        """Record one entry and return it"""
+        with self.lock:
+            entry = {'seq': self.next_seq, 'op': op, 'data': data}
+            self.next_seq += 1
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            self.outstanding.add(entry['seq'])
+            return entry
+
+    def sync(self):
+        """Make every appended entry durable"""
+        with self.lock:
+            os.fsync(self.file.fileno())
+
+    def acknowledge(self, seqs):
+        """Mark entries as written, emptying the journal once nothing is outstanding"""
+        with self.lock:
+            self.outstanding.difference_update(seqs)
+            if not self.outstanding:
+                self.file.truncate(0)
+            else:
+                self.file.write(json.dumps({'ack': list(seqs)}) + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -1,26 +1,94 @@
+import argparse
+import logging
 import sys
 import os
 from datetime import datetime
-from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget, QMessageBox, QWidget, QFileDialog
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget, QMessageBox, QWidget, QFileDialog, QInputDialog, QLineEdit, QLabel
+from PyQt6.QtCore import Qt, QTimer
 
-from database import DatabaseManager
+from database import DatabaseManager, DERIVED_FIELDS
+from storage import MEMORY_PATH, open_storage
 from image_handler import ImageHandler
-from ui_components import AddCardTab, ViewCardsTab, EditCardDialog
+from image_reconciler import ImageReconciler, format_reconcile_report
+from pin_vault import PinVault
+from memory_governor import MemoryGovernor
+from rapid_entry import IntakeWriter
+from intake_journal import journal_path_for, is_locked_error
+from aging import AgingMonitor, CHECK_INTERVAL_MS, FIRST_CHECK_MS, flagged_cards, format_aging_alert, format_aging_report
+from warm_start import ListingRefresher, load_warm_cache, save_warm_cache, session_settings_for, warm_cache_path_for
+from card_model import COLUMNS
+from theme import apply_theme
+from near_duplicates import DuplicateFinder, format_duplicate_report
+from reconciliation import (PAYMENT_MODES, apply_payments, detect_mode, format_reconciliation_report,
+                            reconcile_statement)
+from reports import export_cards, export_storage, brand_report, brand_totals_from_storage, write_brand_report
+from sql_trace import SqlTracer, SLOW_QUERY_LOG, SLOW_QUERY_THRESHOLD_MS, load_slow_queries, format_slow_queries
+from ui_components import AddCardTab, ViewCardsTab, EditCardDialog, SlowQueryDialog, PricingRulesDialog, UsersDialog
 
 class GiftCardApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, storage=None):
         super().__init__()
         self.setWindowTitle("Gift Card Management System")
         self.setGeometry(100, 100, 1200, 800)
+        apply_theme(QApplication.instance())
         
         # Initialize components
-        self.db_manager = DatabaseManager()
+        # Any CardStorage implementation; SQLite in giftcards.db by default
+        self.db_manager = storage if storage is not None else DatabaseManager()
         self.image_handler = ImageHandler()
+        self.image_handler.ingest_finished.connect(self.on_image_ingested)
+        self.pin_vault = PinVault(self.db_manager)
+        # Cards and locked-out edits go through a crash-safe journal next to the database
+        self.intake_writer = IntakeWriter(self.db_manager, journal_path=journal_path_for(self.db_manager))
+        self.intake_writer.batch_written.connect(self.on_cards_written)
+        self.intake_writer.updates_written.connect(self.on_updates_written)
+        # Card numbers added from the form, or replayed from the journal, and not written yet
+        self.form_pending = {entry['data']['card_number'] for entry in self.intake_writer.replayed
+                             if entry['op'] == 'add'}
+        self.image_reconciler = ImageReconciler(self.db_manager, self.image_handler.image_dir)
+        self.image_reconciler.finished.connect(self.on_images_checked)
+        self.duplicate_finder = DuplicateFinder(self.db_manager)
+        self.duplicate_finder.finished.connect(self.on_duplicates_found)
+        self.aging_monitor = AgingMonitor(self.db_manager)
+        self.aging_monitor.finished.connect(self.on_aging_checked)
+        # Cards already announced by an aging alert, so a repeated check stays quiet
+        self.aging_notified = set()
+        # Listing pages and inventory totals are queried off the GUI thread
+        self.listing_refresher = ListingRefresher(self.db_manager)
+        self.listing_refresher.finished.connect(self.on_listing_refreshed)
         
         # Setup UI
         self.setup_ui()
         self.connect_signals()
+        
+        # Keeps the long-lived caches in check over long sessions
+        self.memory_governor = MemoryGovernor(parent=self)
+        self.memory_governor.register("Thumbnail cache", self.view_tab.thumbnail_loader)
+        self.memory_governor.register("Card rows", self.view_tab.model)
+        self.memory_governor.start()
+        
+        # Window and table state of the last session, with its first page if the data is unchanged
+        self.session = session_settings_for(self.db_manager)
+        self.restore_session()
+        # After the restored header, which may show columns the role cannot read
+        self.apply_access()
+        
+        # Refresh the cached image metadata once the window is up
+        self.image_check_timer = QTimer(self)
+        self.image_check_timer.setSingleShot(True)
+        self.image_check_timer.setInterval(10000)
+        self.image_check_timer.timeout.connect(self.image_reconciler.start)
+        self.image_check_timer.start()
+        
+        # Flag cards close to expiry or pending too long, periodically and without blocking
+        self.aging_timer = QTimer(self)
+        self.aging_timer.setInterval(FIRST_CHECK_MS)
+        self.aging_timer.timeout.connect(self.check_aging_periodically)
+        self.aging_timer.start()
+        
+        if self.intake_writer.replayed:
+            self.statusBar().showMessage(
+                f"Saving {len(self.intake_writer.replayed)} entries left over from the last session", 10000)
     
     def setup_ui(self):
         """Setup the main application UI"""
@@ -45,14 +113,33 @@ class GiftCardApp(QMainWindow):
         
         # Set central widget
         self.setCentralWidget(self.tabs)
+        
+        # Tools menu
+        tools_menu = self.menuBar().addMenu("Tools")
+        self.brand_report_action = tools_menu.addAction("Brand Report...")
+        self.pricing_rules_action = tools_menu.addAction("Pricing Rules...")
+        self.reconcile_action = tools_menu.addAction("Reconcile Payments...")
+        self.check_images_action = tools_menu.addAction("Check Images...")
+        self.find_duplicates_action = tools_menu.addAction("Find Duplicates...")
+        self.aging_report_action = tools_menu.addAction("Aging Report...")
+        self.users_action = tools_menu.addAction("Users...")
+        self.memory_action = tools_menu.addAction("Memory Diagnostics")
+        self.slow_query_action = tools_menu.addAction("Slow Queries")
+        # Only available when the app was started with --trace-sql
+        self.slow_query_action.setEnabled(getattr(self.db_manager, 'tracer', None) is not None)
+        
+        # Standing aging alert, next to the transient status messages
+        self.aging_label = QLabel()
+        self.aging_label.setToolTip("See Tools > Aging Report")
+        self.aging_label.setVisible(False)
+        self.statusBar().addPermanentWidget(self.aging_label)
     
     def connect_signals(self):
         """Connect all signal handlers"""
         # Add card tab signals
-        self.add_tab.purchase_price_input.valueChanged.connect(self.calculate_profit)
-        self.add_tab.expected_price_input.valueChanged.connect(self.calculate_profit)
         self.add_tab.upload_button.clicked.connect(self.upload_image)
         self.add_tab.add_button.clicked.connect(self.add_card)
+        self.add_tab.rapid_entry_button.toggled.connect(self.toggle_rapid_entry)
         
         # View cards tab signals
         self.view_tab.view_button.clicked.connect(self.view_cards)
@@ -62,16 +149,53 @@ class GiftCardApp(QMainWindow):
         
         # Tab change signal - auto-load data when View Cards tab is selected
         self.tabs.currentChanged.connect(self.on_tab_changed)
+        
+        # Tools menu
+        self.brand_report_action.triggered.connect(self.export_brand_report)
+        self.pricing_rules_action.triggered.connect(self.show_pricing_rules)
+        self.reconcile_action.triggered.connect(self.reconcile_payments)
+        self.check_images_action.triggered.connect(self.check_images)
+        self.find_duplicates_action.triggered.connect(self.find_duplicates)
+        self.aging_report_action.triggered.connect(self.show_aging_report)
+        self.users_action.triggered.connect(self.show_users)
+        self.memory_action.triggered.connect(self.show_memory_diagnostics)
+        self.slow_query_action.triggered.connect(self.show_slow_queries)
+    
+    def apply_access(self):
+        """Show the signed-in user and offer only what their role allows
+        
+        The storage enforces the same permissions; this only keeps the
+        window from offering what would be refused.
+        """
+        access = self.db_manager.access
+        if access.user:
+            self.setWindowTitle(f"Gift Card Management System - {access.user} ({access.role})")
+        self.add_tab.add_button.setEnabled(access.can_add)
+        self.add_tab.rapid_entry_button.setEnabled(access.can_add)
+        self.view_tab.save_button.setEnabled(access.can_edit)
+        self.view_tab.delete_button.setEnabled(access.can_delete)
+        self.reconcile_action.setEnabled(access.can_edit)
+        for action in (self.pricing_rules_action, self.check_images_action, self.find_duplicates_action,
+                       self.users_action):
+            action.setEnabled(access.administer)
+        masked = access.masked_columns()
+        model = self.view_tab.model
+        model.locked_fields = set(masked) if access.can_edit else {field for _, field, _ in COLUMNS}
+        for column, (_, field, kind) in enumerate(COLUMNS):
+            if field in masked or (kind == 'action' and not access.can_edit):
+                self.view_tab.table.setColumnHidden(column, True)
+    
+    def full_access(self):
+        """Whether the session sees every card and column, so exports may read the database file directly"""
+        access = self.db_manager.access
+        return access.row_scope == 'all' and not access.masked_columns()
     
     def on_tab_changed(self, index):
         """Handle tab changes - auto-load data when View Cards tab is selected"""
-        if index == 1:  # View Cards tab (index 1)
+        # The first page cached by the last session is being refreshed already
+        if index == 1 and not self.view_tab.model.warm:  # View Cards tab (index 1)
             self.view_cards()
     
-    def calculate_profit(self):
-        """Calculate and update profit display"""
-        self.add_tab.update_profit()
-    
     def upload_image(self):
         """Handle image upload"""
         success, filename = self.image_handler.upload_image(self)
@@ -96,8 +220,28 @@ class GiftCardApp(QMainWindow):
             QMessageBox.warning(self, "Input Error", "Denomination, Purchase Price, and Expected Price must be greater than 0.")
             return
         
-        # Calculate profit
-        card_data['profit'] = card_data['expected_price'] - card_data['purchase_price']
+        # The same number with other separators is the same card; a digit or two off probably too
+        similar = self.db_manager.find_similar_card_numbers(card_data['card_number'])
+        if similar and similar[0][1] == 0:
+            QMessageBox.warning(self, "Duplicate Card", f"Card {card_data['card_number']} already exists as {similar[0][0]}.")
+            return
+        if similar:
+            lines = "\n".join(f"{number} ({distance} character{'s' if distance > 1 else ''} different)"
+                              for number, distance in similar[:10])
+            reply = QMessageBox.question(
+                self, "Possible Duplicate",
+                f"Card {card_data['card_number']} looks like existing cards:\n\n{lines}\n\nAdd it anyway?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        
+        # PINs are only ever stored encrypted
+        if card_data['pin']:
+            if not self.unlock_pin_vault():
+                QMessageBox.warning(self, "PIN Error", "The PIN passphrase is required to store a PIN.")
+                return
+            card_data['pin'] = self.pin_vault.encrypt(card_data['card_number'], card_data['pin'])
         
         # Handle image upload (optional)
         card_data['card_image_path'] = ""
@@ -108,17 +252,68 @@ class GiftCardApp(QMainWindow):
             QMessageBox.warning(self, "Image Error", f"Failed to save image: {str(e)}")
             card_data['card_image_path'] = ""
         
-        # Add to database
-        success, message = self.db_manager.add_card(card_data)
-        
-        if success:
-            QMessageBox.information(self, "Success", message)
-            self.clear_form()
+        # Journaled and written in the background, so a busy database never blocks entry
+        self.form_pending.add(card_data['card_number'])
+        self.intake_writer.submit(card_data)
+        self.statusBar().showMessage(f"Saving card {card_data['card_number']}...")
+        self.clear_form()
+    
+    def on_cards_written(self, results):
+        """Report the outcome of cards added from the form or replayed from the journal"""
+        failures = []
+        written = 0
+        for card_number, success, message in results:
+            if card_number not in self.form_pending:
+                # Scanned cards are reported by the rapid entry panel
+                continue
+            self.form_pending.discard(card_number)
+            if success:
+                written += 1
+            else:
+                failures.append(f"{card_number}: {message}")
+        if written:
+            self.statusBar().showMessage(f"{written} card(s) added successfully", 5000)
             # Auto-refresh the view cards tab if it's currently visible
             if self.tabs.currentIndex() == 1:
                 self.view_cards()
+        if failures:
+            QMessageBox.warning(self, "Error", "These cards were not added:\n\n" + "\n".join(failures))
+    
+    def on_updates_written(self, results):
+        """Report edits that were queued because the database was locked"""
+        failures = [f"{card_number}: {message}" for card_number, success, message in results if not success]
+        if failures:
+            QMessageBox.warning(self, "Update Error",
+                                "These queued changes were not saved; reload the cards and redo them:\n\n"
+                                + "\n".join(failures))
         else:
-            QMessageBox.warning(self, "Error", message)
+            self.statusBar().showMessage(f"{len(results)} queued change(s) saved", 5000)
+    
+    def on_image_ingested(self, card_number, image_path, error):
+        """Show a stored image once written, or unlink it from its card if ingestion failed"""
+        if not error:
+            try:
+                size = os.path.getsize(image_path)
+            except OSError:
+                size = None
+            self.db_manager.update_image_status([(1, size, card_number, image_path)])
+            self.view_tab.model.update_image_status({card_number: 1})
+            self.view_tab.thumbnail_timer.start()
+            return
+        # Only clear the path if the card still points at the failed image
+        fields = self.db_manager.get_card_fields(card_number, ['card_image_path', 'version'])
+        if fields and fields['card_image_path'] == image_path:
+            success, _ = self.db_manager.update_card(card_number, {'card_image_path': ""}, fields['version'])
+            if success:
+                self.view_tab.model.update_card(card_number, {'card_image_path': "", 'version': fields['version'] + 1})
+        QMessageBox.warning(self, "Image Error", f"The image of card {card_number} could not be stored: {error}")
+    
+    def toggle_rapid_entry(self, enabled):
+        """Turn scanner intake on or off"""
+        if enabled and not self.unlock_pin_vault():
+            # Cards without a PIN can still be scanned; PIN scans are rejected inline
+            self.statusBar().showMessage("PIN vault locked - scans with a PIN will be rejected", 5000)
+        self.add_tab.set_rapid_entry(enabled)
     
     def clear_form(self):
         """Clear the add card form"""
@@ -126,9 +321,93 @@ class GiftCardApp(QMainWindow):
         self.image_handler.reset()
     
     def view_cards(self):
-        """Load and display all cards"""
-        cards_data = self.db_manager.get_all_cards()
-        self.view_tab.populate_table(cards_data)
+        """Load and display the cards, a page at a time"""
+        self.view_tab.load_cards(self.db_manager)
+        # Summing every card takes a scan, so the totals follow in the background
+        self.listing_refresher.start(page=False)
+    
+    def on_listing_refreshed(self, result):
+        """Reconcile a warm-started first page and show the inventory totals of a background refresh"""
+        if result['generation'] != self.listing_refresher.generation:
+            return
+        model = self.view_tab.model
+        if 'error' in result:
+            # The next switch to the View Cards tab loads the cards normally
+            model.warm = False
+            return
+        if 'rows' in result:
+            model.refresh_warm_rows(result['rows'], result['next_page'], result['data_version'])
+            self.view_tab.thumbnail_timer.start()
+        self.view_tab.show_totals(result['totals'], result['data_version'])
+    
+    def restore_session(self):
+        """Restore the window and table of the last session, showing its cached first page if still current"""
+        settings = self.session
+        if settings is None:
+            return
+        geometry = settings.value("window/geometry")
+        if geometry is not None:
+            self.restoreGeometry(geometry)
+        
+        # Column widths and order; a saved header only fits the columns it was saved with
+        header = self.view_tab.table.horizontalHeader()
+        if settings.value("table/columns", 0, type=int) == len(COLUMNS):
+            state = settings.value("table/header")
+            if state is not None:
+                header.restoreState(state)
+        sort_field = settings.value("table/sort_field", "", type=str)
+        column = next((i for i, (_, field, _) in enumerate(COLUMNS) if field and field == sort_field), -1)
+        order = (Qt.SortOrder.DescendingOrder if settings.value("table/descending", True, type=bool)
+                 else Qt.SortOrder.AscendingOrder)
+        header.setSortIndicator(column, order)
+        model = self.view_tab.model
+        model.sort(column, order)
+        
+        # The cached page is only shown if no card changed since it was saved
+        snapshot = load_warm_cache(warm_cache_path_for(self.db_manager))
+        # Another user's first page may hold cards this one cannot see
+        if (snapshot and snapshot.get('user') == self.db_manager.access.user
+                and snapshot.get('sort_field') == model.sort_field()
+                and snapshot.get('descending') == model.descending()
+                and snapshot.get('data_version') == self.db_manager.get_data_version()):
+            self.view_tab.restore_cards(self.db_manager, snapshot)
+            # Days held and image checks change without a new version
+            self.listing_refresher.start(model.sort_field(), model.descending(), model.page_size)
+        
+        self.tabs.setCurrentIndex(settings.value("window/tab", 0, type=int))
+        top_card = settings.value("table/top_card", "", type=str)
+        selected = settings.value("table/selected", [], type=list)
+        # Scrolling needs the laid out table of the shown window
+        QTimer.singleShot(0, lambda: self.view_tab.restore_position(top_card, selected))
+    
+    def save_session(self):
+        """Remember the window and table state, and the first page for a warm start next time"""
+        settings = self.session
+        if settings is None:
+            return
+        model = self.view_tab.model
+        top_card, selected = self.view_tab.position()
+        settings.setValue("window/geometry", self.saveGeometry())
+        settings.setValue("window/tab", self.tabs.currentIndex())
+        settings.setValue("table/columns", len(COLUMNS))
+        settings.setValue("table/header", self.view_tab.table.horizontalHeader().saveState())
+        settings.setValue("table/sort_field", model.sort_field() or "")
+        settings.setValue("table/descending", model.descending())
+        settings.setValue("table/top_card", top_card)
+        settings.setValue("table/selected", selected)
+        settings.sync()
+        
+        snapshot = model.snapshot()
+        if snapshot is None:
+            return
+        # Totals summed at another data version would be shown as current
+        if self.view_tab.totals_version == snapshot['data_version']:
+            snapshot['totals'] = self.view_tab.totals
+        snapshot['user'] = self.db_manager.access.user
+        try:
+            save_warm_cache(warm_cache_path_for(self.db_manager), snapshot)
+        except OSError:
+            pass
     
     def refresh_cards(self):
         """Refresh the cards table (alias for view_cards)"""
@@ -136,38 +415,47 @@ class GiftCardApp(QMainWindow):
     
     def save_changes(self):
         """Save changes made in the table"""
-        table_data = self.view_tab.get_table_data()
+        model = self.view_tab.model
+        updates = model.get_pending_updates()
         
-        for row_data in table_data:
-            card_number = row_data[0]
-            if not card_number:
+        # Write all edited rows in one transaction, each guarded by its row version
+        success, conflicts = self.db_manager.update_cards(updates)
+        if not success and is_locked_error(conflicts):
+            # Retried in the background; the rows already show the edits
+            for card_number, changes, version in updates:
+                self.intake_writer.submit_update(card_number, changes, version)
+                model.update_card(card_number, dict(changes, version=version + 1))
+            self.statusBar().showMessage(
+                f"Database busy - {len(updates)} change(s) queued and will be saved automatically", 10000)
+            return
+        if not success:
+            QMessageBox.warning(self, "Update Error", f"Failed to save changes: {conflicts}")
+            return
+        
+        # Cards someone else changed meanwhile are merged one by one
+        failures = []
+        saved = []
+        for card_number, changes, version in updates:
+            if card_number not in conflicts:
+                model.update_card(card_number, dict(changes, version=version + 1))
+                saved.append(card_number)
                 continue
-            
-            try:
-                card_data = {
-                    'card_holder': row_data[1],
-                    'brand': row_data[2],
-                    'pin': row_data[3],
-                    'denomination': float(row_data[4]),
-                    'purchase_price': float(row_data[5]),
-                    'expected_price': float(row_data[6]),
-                    'profit': float(row_data[7]),
-                    'source': row_data[8],
-                    'purchase_date': row_data[9],
-                    'pending': row_data[10],
-                    'sold_date': row_data[11],
-                    'payment_received': float(row_data[12]) if row_data[12] else 0.0,
-                    'payment_mode': row_data[13]
-                }
-                
-                success, message = self.db_manager.update_card(card_number, card_data)
-                if not success:
-                    QMessageBox.warning(self, "Update Error", f"Failed to update card {card_number}: {message}")
-                    return
-                    
-            except ValueError:
-                QMessageBox.warning(self, "Input Error", f"Invalid number format for card {card_number}")
-                return
+            merged, result = self.view_tab.merge_conflict(card_number, model.get_original_card(card_number), changes)
+            if merged:
+                model.update_card(card_number, result)
+                saved.append(card_number)
+            else:
+                failures.append(f"{card_number}: {result}")
+        
+        if failures:
+            # No reload follows, so the saved rows get their derived values from the database
+            for card_number in saved:
+                model.update_card(card_number, self.db_manager.get_card_fields(card_number, DERIVED_FIELDS) or {})
+            # Only the failed rows keep their unsaved edits, to be retried or reverted
+            QMessageBox.warning(self, "Update Error",
+                                f"{len(updates) - len(failures)} card(s) saved. These were not saved:\n\n"
+                                + "\n".join(failures))
+            return
         
         QMessageBox.information(self, "Success", "Changes saved successfully!")
         # Refresh the table to show updated data
@@ -189,7 +477,7 @@ class GiftCardApp(QMainWindow):
         if reply == QMessageBox.StandardButton.Yes:
             deleted_count = 0
             for row in sorted(selected_rows, reverse=True):
-                card_number = self.view_tab.table.item(row, 0).text()
+                card_number = self.view_tab.model.card_at(row)['card_number']
                 success, message = self.db_manager.delete_card(card_number)
                 if success:
                     deleted_count += 1
@@ -201,13 +489,199 @@ class GiftCardApp(QMainWindow):
             # Refresh the table to show updated data
             self.view_cards()
     
+    def unlock_pin_vault(self):
+        """Make the PIN key available, asking for the passphrase at most once per session"""
+        if self.pin_vault.is_unlocked():
+            return True
+        
+        if not self.pin_vault.is_initialized():
+            passphrase, ok = QInputDialog.getText(
+                self, "Set PIN Passphrase",
+                "PINs are stored encrypted. Choose a passphrase to protect them:",
+                QLineEdit.EchoMode.Password
+            )
+            if not ok or not passphrase:
+                return False
+            confirm, ok = QInputDialog.getText(self, "Set PIN Passphrase", "Repeat the passphrase:", QLineEdit.EchoMode.Password)
+            if not ok or confirm != passphrase:
+                QMessageBox.warning(self, "PIN Passphrase", "The passphrases do not match.")
+                return False
+            # Existing plaintext PINs are encrypted in batches here
+            if not self.pin_vault.initialize(passphrase):
+                QMessageBox.warning(self, "PIN Passphrase", "Failed to set up PIN encryption.")
+                return False
+            return True
+        
+        passphrase, ok = QInputDialog.getText(self, "Unlock PINs", "PIN passphrase:", QLineEdit.EchoMode.Password)
+        if not ok:
+            return False
+        if not self.pin_vault.unlock(passphrase):
+            QMessageBox.warning(self, "Unlock PINs", "Wrong passphrase.")
+            return False
+        return True
+    
+    def check_images(self):
+        """Compare card_images with the cards in the background and report the result"""
+        if not self.image_reconciler.start(interactive=True):
+            self.statusBar().showMessage("An image check is already running", 5000)
+            return
+        self.statusBar().showMessage("Checking images...")
+    
+    def on_images_checked(self, result, interactive):
+        """Show what an image check found and offer to quarantine orphaned files"""
+        self.view_tab.model.update_image_status(result.get('statuses', {}))
+        if not interactive:
+            if result.get('missing'):
+                self.statusBar().showMessage(
+                    f"{len(result['missing'])} card images are missing - see Tools > Check Images", 10000)
+            return
+        self.statusBar().clearMessage()
+        report = format_reconcile_report(result)
+        if result.get('orphans') and not result['quarantined']:
+            answer = QMessageBox.question(
+                self, "Check Images", report + "\n\nMove the orphaned files to the quarantine folder?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No
+            )
+            if answer == QMessageBox.StandardButton.Yes:
+                self.image_reconciler.start(quarantine=True, interactive=True)
+            return
+        QMessageBox.information(self, "Check Images", report)
+    
+    def find_duplicates(self):
+        """List card numbers that are probably the same card, scanned in the background"""
+        if not self.duplicate_finder.start():
+            self.statusBar().showMessage("A duplicate search is already running", 5000)
+            return
+        self.statusBar().showMessage("Searching for duplicate card numbers...")
+    
+    def on_duplicates_found(self, result):
+        """Show the pairs a duplicate search found"""
+        self.statusBar().clearMessage()
+        if isinstance(result, str):
+            QMessageBox.warning(self, "Find Duplicates", f"The duplicate search failed: {result}")
+            return
+        QMessageBox.information(self, "Find Duplicates", format_duplicate_report(result))
+    
+    def check_aging_periodically(self):
+        """Start a background aging check, then keep repeating it at the regular interval"""
+        self.aging_timer.setInterval(CHECK_INTERVAL_MS)
+        self.aging_monitor.start()
+    
+    def show_aging_report(self):
+        """Report the unsold cards by days held, with the ones close to expiry or pending too long"""
+        if not self.aging_monitor.start(interactive=True):
+            self.statusBar().showMessage("An aging check is already running", 5000)
+            return
+        self.statusBar().showMessage("Checking card ages...")
+    
+    def on_aging_checked(self, result, interactive):
+        """Update the standing aging alert, announcing newly flagged cards without interrupting"""
+        if 'error' in result:
+            if interactive:
+                self.statusBar().clearMessage()
+                QMessageBox.warning(self, "Aging Report", f"The aging check failed: {result['error']}")
+            return
+        alert = format_aging_alert(result)
+        self.aging_label.setText(alert)
+        self.aging_label.setVisible(bool(alert))
+        flagged = flagged_cards(result)
+        new_cards = flagged - self.aging_notified
+        self.aging_notified = flagged
+        if interactive:
+            self.statusBar().clearMessage()
+            QMessageBox.information(self, "Aging Report", format_aging_report(result))
+        elif new_cards:
+            self.statusBar().showMessage(f"{alert} - see Tools > Aging Report", 10000)
+    
+    def show_pricing_rules(self):
+        """Edit the pricing rules and show repriced cards afterwards"""
+        dialog = PricingRulesDialog(self, self.db_manager)
+        dialog.exec()
+        # Reloading would drop unsaved table edits; those rows now merge on save
+        if dialog.repriced and self.tabs.currentIndex() == 1 and not self.view_tab.model.get_pending_updates():
+            self.view_cards()
+    
+    def show_users(self):
+        """Add, change and delete users"""
+        UsersDialog(self, self.db_manager).exec()
+    
+    def reconcile_payments(self):
+        """Match a payment statement export against the unpaid sold cards and record the payments"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Reconcile Payments", "", "CSV Files (*.csv);;All Files (*)"
+        )
+        if not file_path:
+            return
+        modes = ["Any"] + PAYMENT_MODES
+        detected = detect_mode(file_path)
+        mode, ok = QInputDialog.getItem(
+            self, "Reconcile Payments", "Payments in this statement were made with:",
+            modes, modes.index(detected) if detected else 0, False
+        )
+        if not ok:
+            return
+        try:
+            result = reconcile_statement(self.db_manager, file_path, None if mode == "Any" else mode)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Reconcile Payments", f"Could not read the statement: {str(e)}")
+            return
+        
+        report = format_reconciliation_report(result)
+        matches = result['matches']
+        if not matches:
+            QMessageBox.information(self, "Reconcile Payments", report)
+            return
+        answer = QMessageBox.question(
+            self, "Reconcile Payments", report + f"\n\nRecord the {len(matches)} matched payments?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No
+        )
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        success, conflicts = apply_payments(self.db_manager, matches)
+        if not success:
+            QMessageBox.warning(self, "Reconcile Payments", f"Failed to record the payments: {conflicts}")
+            return
+        message = f"Recorded {len(matches) - len(conflicts)} payments."
+        if conflicts:
+            message += ("\n\nThese cards changed after matching and were left alone; reconcile again to include them:\n"
+                        + "\n".join(conflicts[:50]))
+        QMessageBox.information(self, "Reconcile Payments", message)
+        # Reloading would drop unsaved table edits; those rows now merge on save
+        if self.tabs.currentIndex() == 1 and not self.view_tab.model.get_pending_updates():
+            self.view_cards()
+    
+    def show_memory_diagnostics(self):
+        """Show memory use and object count changes since the last time this was opened"""
+        QMessageBox.information(self, "Memory Diagnostics", self.memory_governor.report())
+    
+    def show_slow_queries(self):
+        """Show the slow query log of the traced database"""
+        SlowQueryDialog(self, self.db_manager.tracer).exec()
+    
+    def closeEvent(self, event):
+        """Let queued image ingestions finish before the window closes"""
+        self.memory_governor.stop()
+        self.image_check_timer.stop()
+        self.aging_timer.stop()
+        self.image_reconciler.wait()
+        self.duplicate_finder.wait()
+        self.aging_monitor.wait()
+        self.listing_refresher.wait()
+        self.save_session()
+        self.intake_writer.stop()
+        self.view_tab.thumbnail_timer.stop()
+        self.view_tab.thumbnail_loader.shutdown()
+        self.image_handler.shutdown()
+        self.pin_vault.lock()
+        tracer = getattr(self.db_manager, 'tracer', None)
+        if tracer is not None:
+            tracer.flush()
+        super().closeEvent(event)
+    
     def export_to_excel(self):
         """Export card data to Excel file"""
         try:
-            # Get all cards from database
-            cards_data = self.db_manager.get_all_cards()
-            
-            if not cards_data:
+            if not self.db_manager.count_cards():
                 QMessageBox.warning(self, "Export Error", "No cards found to export.")
                 return
             
@@ -226,38 +700,39 @@ class GiftCardApp(QMainWindow):
             if not file_path:
                 return  # User cancelled
             
-            # Write data to CSV file
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                # Write header
-                csvfile.write("Card Number,Card Holder,Brand,PIN,Denomination,Purchase Price,Expected Price,Profit,Source,Purchase Date,Pending,Sold Date,Payment Received,Payment Mode,Image Path\n")
-                
-                # Write data rows
-                for card in cards_data:
-                    # Format the data properly
-                    card_number = str(card[0]).replace(',', ';')  # Replace commas to avoid CSV issues
-                    card_holder = str(card[1]).replace(',', ';')
-                    brand = str(card[2]).replace(',', ';')
-                    pin = str(card[3]).replace(',', ';') if card[3] else ""
-                    denomination = f"${card[4]:.2f}" if card[4] else "$0.00"
-                    purchase_price = f"${card[5]:.2f}" if card[5] else "$0.00"
-                    expected_price = f"${card[6]:.2f}" if card[6] else "$0.00"
-                    profit = f"${card[7]:.2f}" if card[7] else "$0.00"
-                    source = str(card[8]).replace(',', ';') if card[8] else ""
-                    purchase_date = str(card[9]) if card[9] else ""
-                    pending = str(card[10]) if card[10] else "No"
-                    sold_date = str(card[11]) if card[11] else ""
-                    payment_received = f"${card[12]:.2f}" if card[12] else "$0.00"
-                    payment_mode = str(card[13]).replace(',', ';') if card[13] else ""
-                    image_path = str(card[14]) if card[14] else ""
-                    
-                    # Write row
-                    csvfile.write(f"{card_number},{card_holder},{brand},{pin},{denomination},{purchase_price},{expected_price},{profit},{source},{purchase_date},{pending},{sold_date},{payment_received},{payment_mode},{image_path}\n")
+            # PINs are only decrypted when the export explicitly includes them
+            include_pins = False
+            reply = QMessageBox.question(
+                self, "Export PINs",
+                "Include card PINs in the export?\n\nThey will be written to the file in clear text.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply == QMessageBox.StandardButton.Yes:
+                if not self.unlock_pin_vault():
+                    return
+                include_pins = True
+            
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            try:
+                if isinstance(self.db_manager, DatabaseManager) and self.full_access():
+                    # Rows are formatted by worker processes, one rowid range each
+                    keys = self.pin_vault.session_keys() if include_pins else None
+                    count = export_cards(self.db_manager.db_path, file_path, keys)
+                else:
+                    pins = {}
+                    if include_pins:
+                        pins = {card_number: self.pin_vault.decrypt(card_number, pin)
+                                for card_number, pin in self.db_manager.get_pins().items()}
+                    count = export_storage(self.db_manager, file_path, pins)
+            finally:
+                QApplication.restoreOverrideCursor()
             
             # Show success message
             QMessageBox.information(
                 self, 
                 "Export Successful", 
-                f"Successfully exported {len(cards_data)} cards to:\n{file_path}"
+                f"Successfully exported {count} cards to:\n{file_path}"
             )
             
         except Exception as e:
@@ -266,11 +741,79 @@ class GiftCardApp(QMainWindow):
                 "Export Error", 
                 f"Failed to export data: {str(e)}"
             )
+    
+    def export_brand_report(self):
+        """Export per-brand totals to a CSV file"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Brand Report", f"brand_report_{timestamp}.csv", "CSV Files (*.csv);;All Files (*)"
+        )
+        if not file_path:
+            return
+        try:
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            try:
+                if isinstance(self.db_manager, DatabaseManager) and self.full_access():
+                    totals = brand_report(self.db_manager.db_path)
+                else:
+                    totals = brand_totals_from_storage(self.db_manager)
+                write_brand_report(totals, file_path)
+            finally:
+                QApplication.restoreOverrideCursor()
+            QMessageBox.information(self, "Export Successful", f"Exported totals for {len(totals)} brands to:\n{file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Export Error", f"Failed to export brand report: {str(e)}")
+
 
+def parse_args(argv):
+    """Parse the command line options, leaving Qt's own options alone"""
+    parser = argparse.ArgumentParser(description="Gift Card Management System")
+    parser.add_argument("--db", default="giftcards.db", metavar="PATH",
+                        help=f"card database to open; {MEMORY_PATH} keeps cards in memory only, for benchmarks")
+    parser.add_argument("--trace-sql", nargs="?", type=float, const=SLOW_QUERY_THRESHOLD_MS, metavar="MS",
+                        help="time every SQL statement and log the plans of statements slower than MS")
+    parser.add_argument("--dump-slow-queries", action="store_true",
+                        help=f"print the slow query log ({SLOW_QUERY_LOG}) and exit")
+    parser.add_argument("--user", metavar="NAME",
+                        help="user to sign in as; asked for at startup when users exist and none is given")
+    args, _ = parser.parse_known_args(argv[1:])
+    return args
+
+def sign_in(storage, name=None):
+    """Start the storage's session as a user, asking which one if users exist and none was given
+    
+    Without any users everything stays allowed, as before users existed.
+    Returns False if the user cancelled or is unknown.
+    """
+    if name is None:
+        users = [user['name'] for user in storage.get_users()]
+        if not users:
+            return True
+        name, ok = QInputDialog.getItem(None, "Sign In", "User:", users, 0, False)
+        if not ok:
+            return False
+    success, message = storage.set_user(name)
+    if not success:
+        QMessageBox.critical(None, "Sign In", message)
+    return success
 
 def main():
+    args = parse_args(sys.argv)
+    if args.dump_slow_queries:
+        print(format_slow_queries(load_slow_queries()) or "No slow queries logged.")
+        return
+    
     app = QApplication(sys.argv)
-    window = GiftCardApp()
+    tracer = None
+    if args.trace_sql is not None:
+        logging.basicConfig(level=logging.INFO)
+        # Every statement's duration and row count is logged at DEBUG
+        logging.getLogger("giftcards.sql").setLevel(logging.DEBUG)
+        tracer = SqlTracer(threshold_ms=args.trace_sql)
+    storage = open_storage(args.db, tracer)
+    if not sign_in(storage, args.user):
+        return
+    window = GiftCardApp(storage=storage)
     window.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,144 @@
+import gc
+import os
+import tracemalloc
+from collections import Counter
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QPixmapCache
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+try:
+    import psutil
+except ImportError:  # optional, /proc is used instead
+    psutil = None
+
+# Resident set size above which the registered caches are shrunk
+RSS_BUDGET_BYTES = 512 * 1024 * 1024
+CHECK_INTERVAL_MS = 10 * 1000
+
+# Stack depth recorded per allocation once tracing is started
+TRACEMALLOC_FRAMES = 10
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None if it cannot be read"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def object_counts():
+    """Count live widgets and Python objects by type name"""
+    counts = Counter()
+    app = QApplication.instance()
+    if app is not None:
+        counts.update(f"widget:{type(widget).__name__}" for widget in app.allWidgets())
+    counts.update(type(obj).__name__ for obj in gc.get_objects())
+    return counts
+
+
+def diff_counts(before, after, limit=20):
+    """Largest changes in object counts between two object_counts() results"""
+    changes = {name: after[name] - before[name] for name in set(before) | set(after)
+               if after[name] != before[name]}
+    return sorted(changes.items(), key=lambda item: -abs(item[1]))[:limit]
+
+
+def format_bytes(size):
+    return f"{size / (1024 * 1024):.1f} MB" if size is not None else "n/a"
+
+
+class MemoryGovernor(QObject):
+    """Watches process memory and keeps the registered caches within budget
+
+    A cache is any object with memory_usage() returning bytes; if it also
+    has trim(max_bytes) it is shrunk when the process exceeds its RSS budget.
+    """
+
+    # Emitted with the RSS that triggered a cache trim
+    budget_exceeded = pyqtSignal(int)
+
+    def __init__(self, rss_budget=RSS_BUDGET_BYTES, interval=CHECK_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.rss_budget = rss_budget
+        self.caches = {}
+        self.last_counts = None
+        self.last_snapshot = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.check)
+
+    def register(self, name, cache):
+        """Put a cache under the governor's control"""
+        self.caches[name] = cache
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def check(self):
+        """Shrink trimmable caches to half their size while the process is over budget"""
+        rss = rss_bytes()
+        if rss is None or rss <= self.rss_budget:
+            return rss
+        for cache in self.caches.values():
+            if hasattr(cache, 'trim'):
+                cache.trim(cache.memory_usage() // 2)
+        QPixmapCache.clear()
+        gc.collect()
+        self.budget_exceeded.emit(rss)
+        return rss
+
+    def allocation_growth(self, limit=10):
+        """Top Python allocation growth between two calls
+        
+        The first call starts tracemalloc and takes a baseline; the next one
+        compares against it and stops tracing again, since tracing slows
+        every allocation. Returns None after starting a trace.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self.last_snapshot = self.take_snapshot()
+            return None
+        snapshot = self.take_snapshot()
+        tracemalloc.stop()
+        previous, self.last_snapshot = self.last_snapshot, None
+        if previous is None:
+            return []
+        return [str(stat) for stat in snapshot.compare_to(previous, 'lineno')[:limit]]
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+
+    def report(self):
+        """Describe memory use and what changed since the previous report"""
+        lines = [f"Resident set: {format_bytes(rss_bytes())} (budget {format_bytes(self.rss_budget)})"]
+        for name, cache in self.caches.items():
+            lines.append(f"{name}: {format_bytes(cache.memory_usage())}")
+
+        counts = object_counts()
+        widgets = sum(count for name, count in counts.items() if name.startswith("widget:"))
+        lines.append(f"Widgets: {widgets}, Python objects: {sum(counts.values()) - widgets}")
+        if self.last_counts is not None:
+            lines.append("")
+            lines.append("Object count changes since last report:")
+            lines.extend(f"  {name}: {change:+d}" for name, change in diff_counts(self.last_counts, counts))
+        self.last_counts = counts
+
+        growth = self.allocation_growth()
+        if growth is None:
+            lines.append("")
+            lines.append("Allocation tracing started; open this report again to see what grew meanwhile.")
+        elif growth:
+            lines.append("")
+            lines.append("Allocation growth since last report:")
+            lines.extend(f"  {line}" for line in growth)
+        return "\n".join(lines)
@@ -0,0 +1,157 @@
+import threading
+from collections import deque
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+# Typos (substitutions, missing or extra characters, swapped neighbours) still flagged
+MAX_DISTANCE = 2
+
+# Neighbours read on each side of a number, in key and in reversed key order
+NEIGHBOUR_WINDOW = 8
+
+# Preceding entries each key is compared with by the batch scan
+SCAN_WINDOW = 3
+
+# Keys read per query by the batch scan
+KEY_CHUNK = 20000
+
+
+def normalize_card_number(card_number):
+    """Card number without spaces, dashes or other separators, upper-cased
+
+    Two cards with the same key are the same card.
+    """
+    return "".join(character for character in str(card_number or "") if character.isalnum()).upper()
+
+
+def within_distance(a, b, k):
+    """Whether two keys are at most k edits apart, counting a swap of neighbours as one edit"""
+    if a == b:
+        return True
+    if k == 0 or abs(len(a) - len(b)) > k:
+        return False
+    i = 0
+    while i < len(a) and i < len(b) and a[i] == b[i]:
+        i += 1
+    a, b = a[i:], b[i:]
+    # The first difference is a substitution, a deletion, an insertion or a swap
+    k -= 1
+    return (within_distance(a[1:], b[1:], k) or within_distance(a[1:], b, k) or within_distance(a, b[1:], k)
+            or (a[1:2] == b[:1] and a[:1] == b[1:2] and within_distance(a[2:], b[2:], k)))
+
+
+def card_number_distance(a, b, max_distance=MAX_DISTANCE):
+    """Edit distance of two keys, or None if above max_distance
+
+    Slice comparisons instead of a distance matrix: with a small
+    max_distance most pairs are rejected after a few of them.
+    """
+    if not within_distance(a, b, max_distance):
+        return None
+    return next(k for k in range(max_distance + 1) if within_distance(a, b, k))
+
+
+def closest_card_numbers(key, candidates, max_distance=MAX_DISTANCE):
+    """[(card_number, distance)] of the (card_number, key) candidates within max_distance, closest first"""
+    found = {}
+    for card_number, candidate_key in candidates:
+        distance = card_number_distance(key, candidate_key, max_distance)
+        if distance is not None:
+            found[card_number] = distance
+    return sorted(found.items(), key=lambda item: (item[1], item[0]))
+
+
+def iter_number_keys(storage, reverse=False, chunk=KEY_CHUNK):
+    """Yield (key, card_number) of every card in key order, or reversed key order, a chunk at a time"""
+    after = None
+    while True:
+        rows = storage.get_card_number_keys(reverse, after, chunk)
+        yield from rows
+        if len(rows) < chunk:
+            return
+        after = rows[-1]
+
+
+def near_duplicate_pairs(entries, window=SCAN_WINDOW, max_distance=MAX_DISTANCE):
+    """Yield (card_number, card_number, distance) of sorted (key, card_number) entries close to a recent one
+
+    Only keys sharing their first half are compared, a cheap test that
+    rejects nearly every pair before the distance is computed.
+    """
+    recent = deque(maxlen=window)
+    for key, card_number in entries:
+        for other_key, other_number in recent:
+            half = (min(len(key), len(other_key)) - max_distance) // 2
+            if key[:half] != other_key[:half]:
+                continue
+            distance = card_number_distance(key, other_key, max_distance)
+            if distance is not None:
+                yield other_number, card_number, distance
+        recent.append((key, card_number))
+
+
+def find_duplicates(storage, window=SCAN_WINDOW, max_distance=MAX_DISTANCE):
+    """Find pairs of card numbers that are probably the same card, closest first
+
+    A sorted neighbourhood scan: the keys are read in index order and each
+    is compared with the few keys before it, once sorted from the front and
+    once from the back. A typo leaves the half of the number before or after
+    it intact, which sorts the pair next to each other in one of the orders;
+    only typos in both halves of a number can keep it apart. Runs in one
+    pass per order with constant memory besides the pairs found.
+    """
+    pairs = {}
+    for reverse in (False, True):
+        for first, second, distance in near_duplicate_pairs(iter_number_keys(storage, reverse), window, max_distance):
+            pairs[tuple(sorted((first, second)))] = distance
+    return sorted(((first, second, distance) for (first, second), distance in pairs.items()),
+                  key=lambda pair: (pair[2], pair[0], pair[1]))
+
+
+def format_duplicate_report(pairs, limit=200):
+    """Format the result of find_duplicates for display"""
+    if not pairs:
+        return "No duplicate or near-duplicate card numbers found."
+    exact = sum(1 for _, _, distance in pairs if distance == 0)
+    lines = [f"{len(pairs)} pairs of card numbers look like the same card ({exact} differ only in separators):", ""]
+    for first, second, distance in pairs[:limit]:
+        difference = "separators only" if distance == 0 else f"{distance} character{'s' if distance > 1 else ''} apart"
+        lines.append(f"  {first}  ~  {second}  ({difference})")
+    if len(pairs) > limit:
+        lines.append(f"  ... and {len(pairs) - limit} more")
+    return "\n".join(lines)
+
+
+class DuplicateFinder(QObject):
+    """Runs find_duplicates on a background thread"""
+
+    # Pairs, or an error message string; emitted from the worker thread, delivered on the GUI thread
+    finished = pyqtSignal(object)
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start a scan unless one is already running"""
+        if self.is_running():
+            return False
+        self.thread = threading.Thread(target=self.run, name="find-duplicates", daemon=True)
+        self.thread.start()
+        return True
+
+    def run(self):
+        try:
+            result = find_duplicates(self.storage)
+        except Exception as e:
+            result = str(e)
+        self.finished.emit(result)
+
+    def wait(self, timeout=None):
+        """Block until the running scan has finished"""
+        if self.thread is not None:
+            self.thread.join(timeout)
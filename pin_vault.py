@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import os
+import time
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Marks an encrypted value in cards.pin: "enc1:<key id>:<base64 nonce + ciphertext>"
+# Anything without the prefix is a legacy plaintext PIN
+ENCRYPTED_PREFIX = "enc1:"
+
+# Derived keys are forgotten after this many idle seconds
+KEY_TIMEOUT_SECONDS = 15 * 60
+
+# Rows re-encrypted per transaction when re-keying
+REKEY_BATCH_SIZE = 500
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+
+
+class VaultLockedError(Exception):
+    """Raised when a PIN has to be encrypted or decrypted while the vault is locked"""
+
+
+class PinVault:
+    """Per-field PIN encryption with a session-cached key
+
+    PINs are encrypted with AES-GCM data keys. The data keys are stored in
+    the database wrapped by a key derived from the passphrase with scrypt,
+    so the passphrase is only run through the KDF once per session and can
+    be changed without touching any card.
+    """
+
+    def __init__(self, db_manager, timeout=KEY_TIMEOUT_SECONDS):
+        self.db_manager = db_manager
+        self.timeout = timeout
+        self.keys = {}
+        self.ciphers = {}
+        self.active_key_id = None
+        self.last_used = 0.0
+
+    @staticmethod
+    def derive_key(passphrase, salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        """Derive the key-wrapping key from the passphrase"""
+        return hashlib.scrypt(passphrase.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=SCRYPT_MAXMEM, dklen=32)
+
+    @staticmethod
+    def wrap_key(wrapping_key, key_id, data_key):
+        """Encrypt a data key for storage"""
+        nonce = os.urandom(12)
+        wrapped = AESGCM(wrapping_key).encrypt(nonce, data_key, f"key:{key_id}".encode())
+        return base64.b64encode(nonce + wrapped).decode('ascii')
+
+    @staticmethod
+    def unwrap_key(wrapping_key, key_id, wrapped):
+        """Decrypt a stored data key; raises InvalidTag for a wrong passphrase"""
+        raw = base64.b64decode(wrapped)
+        return AESGCM(wrapping_key).decrypt(raw[:12], raw[12:], f"key:{key_id}".encode())
+
+    def is_initialized(self):
+        """Check whether a PIN passphrase has been set up"""
+        return self.db_manager.get_vault_settings() is not None
+
+    def is_unlocked(self):
+        """Check whether the data keys are cached and have not timed out"""
+        if self.keys and time.monotonic() - self.last_used > self.timeout:
+            self.lock()
+        return bool(self.keys)
+
+    def lock(self):
+        """Forget the cached keys"""
+        self.keys = {}
+        self.ciphers = {}
+        self.active_key_id = None
+
+    def unlock(self, passphrase):
+        """Derive the wrapping key once and cache the unwrapped data keys"""
+        settings = self.db_manager.get_vault_settings()
+        if settings is None:
+            return False
+        wrapping_key = self.derive_key(passphrase, settings['salt'], settings['scrypt_n'],
+                                       settings['scrypt_r'], settings['scrypt_p'])
+        try:
+            keys = {key_id: self.unwrap_key(wrapping_key, key_id, wrapped)
+                    for key_id, wrapped in settings['keys'].items()}
+        except InvalidTag:
+            return False
+        self.cache_keys(keys, settings['active_key_id'])
+        return True
+
+    def cache_keys(self, keys, active_key_id):
+        """Keep unwrapped data keys in memory until the idle timeout"""
+        self.keys = dict(keys)
+        self.ciphers = {key_id: AESGCM(key) for key_id, key in keys.items()}
+        self.active_key_id = active_key_id
+        self.last_used = time.monotonic()
+
+    def initialize(self, passphrase):
+        """Set up the vault with a new passphrase and encrypt all existing plaintext PINs"""
+        salt = os.urandom(16)
+        wrapping_key = self.derive_key(passphrase, salt)
+        data_key = AESGCM.generate_key(bit_length=256)
+        settings = {
+            'salt': salt, 'scrypt_n': SCRYPT_N, 'scrypt_r': SCRYPT_R, 'scrypt_p': SCRYPT_P,
+            'active_key_id': 1, 'keys': {1: self.wrap_key(wrapping_key, 1, data_key)}
+        }
+        if not self.db_manager.save_vault_settings(settings):
+            return False
+        self.cache_keys({1: data_key}, 1)
+        return self.rekey_pins()
+
+    def change_passphrase(self, passphrase):
+        """Re-wrap the data keys under a new passphrase; no PIN is re-encrypted"""
+        self.key_for(self.active_key_id)
+        settings = self.db_manager.get_vault_settings()
+        settings['salt'] = os.urandom(16)
+        wrapping_key = self.derive_key(passphrase, settings['salt'], settings['scrypt_n'],
+                                       settings['scrypt_r'], settings['scrypt_p'])
+        settings['keys'] = {key_id: self.wrap_key(wrapping_key, key_id, self.keys[key_id])
+                            for key_id in settings['keys']}
+        return self.db_manager.save_vault_settings(settings)
+
+    def rotate_key(self, passphrase):
+        """Switch to a fresh data key and re-encrypt every PIN with it in batches"""
+        if not self.unlock(passphrase):
+            return False
+        settings = self.db_manager.get_vault_settings()
+        wrapping_key = self.derive_key(passphrase, settings['salt'], settings['scrypt_n'],
+                                       settings['scrypt_r'], settings['scrypt_p'])
+        key_id = max(settings['keys']) + 1
+        data_key = AESGCM.generate_key(bit_length=256)
+        settings['keys'][key_id] = self.wrap_key(wrapping_key, key_id, data_key)
+        settings['active_key_id'] = key_id
+        # The old keys stay stored until no PIN uses them, so an interrupted
+        # re-key can simply be resumed
+        if not self.db_manager.save_vault_settings(settings):
+            return False
+        self.cache_keys({**self.keys, key_id: data_key}, key_id)
+        if not self.rekey_pins():
+            return False
+        settings['keys'] = {key_id: settings['keys'][key_id]}
+        return self.db_manager.save_vault_settings(settings)
+
+    def rekey_pins(self, batch_size=REKEY_BATCH_SIZE):
+        """Encrypt every PIN not yet under the active key, one transaction per batch"""
+        active_prefix = f"{ENCRYPTED_PREFIX}{self.active_key_id}:"
+        after_rowid = 0
+        while True:
+            batch = self.db_manager.get_pins_to_rekey(active_prefix, after_rowid, batch_size)
+            if not batch:
+                return True
+            # Guarded by the value read, so a PIN edited meanwhile is not overwritten
+            updates = [(self.encrypt(card_number, self.decrypt(card_number, pin)), card_number, pin)
+                       for _, card_number, pin in batch]
+            if not self.db_manager.update_pins(updates):
+                return False
+            after_rowid = batch[-1][0]
+
+    def key_for(self, key_id):
+        """Get a cached data key, refreshing the idle timeout"""
+        if not self.is_unlocked():
+            raise VaultLockedError("The PIN vault is locked")
+        cipher = self.ciphers.get(key_id)
+        if cipher is None:
+            raise VaultLockedError(f"Unknown PIN key {key_id}")
+        self.last_used = time.monotonic()
+        return cipher
+
+    def encrypt(self, card_number, pin):
+        """Encrypt one PIN, bound to its card number"""
+        if not pin:
+            return pin
+        key = self.key_for(self.active_key_id)
+        nonce = os.urandom(12)
+        ciphertext = key.encrypt(nonce, pin.encode('utf-8'), card_number.encode('utf-8'))
+        encoded = base64.b64encode(nonce + ciphertext).decode('ascii')
+        return f"{ENCRYPTED_PREFIX}{self.active_key_id}:{encoded}"
+
+    def decrypt(self, card_number, value):
+        """Decrypt one stored PIN; legacy plaintext values are returned unchanged"""
+        if not is_encrypted(value):
+            return value
+        key_id, raw = split_encrypted(value)
+        return open_pin(self.key_for(key_id), card_number, raw)
+
+    def session_keys(self):
+        """Copy of the unwrapped data keys, for decrypting in worker processes"""
+        self.key_for(self.active_key_id)
+        return dict(self.keys)
+
+
+def is_encrypted(value):
+    """Check whether a stored PIN value is encrypted"""
+    return bool(value) and value.startswith(ENCRYPTED_PREFIX)
+
+
+def split_encrypted(value):
+    """Split an encrypted PIN into its key id and raw nonce + ciphertext"""
+    key_id, encoded = value[len(ENCRYPTED_PREFIX):].split(':', 1)
+    return int(key_id), base64.b64decode(encoded)
+
+
+def open_pin(cipher, card_number, raw):
+    """Decrypt raw nonce + ciphertext of a PIN bound to its card number"""
+    return cipher.decrypt(raw[:12], raw[12:], card_number.encode('utf-8')).decode('utf-8')
+
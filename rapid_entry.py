@@ -0,0 +1,286 @@
+import queue
+import re
+import threading
+import time
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QListWidget
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from database import VERSION_CONFLICT
+from intake_journal import IntakeJournal, is_locked_error
+
+# Scan payload layouts, tried in order. Keyboard-wedge scanners usually send
+# the card number and PIN joined by a separator, or the card number alone.
+SCAN_PATTERNS = [
+    re.compile(r'^(?P<card_number>[A-Za-z0-9-]+)\s*[|;,\t]\s*(?P<pin>[A-Za-z0-9]*)$'),
+    re.compile(r'^(?P<card_number>[A-Za-z0-9-]+)\s+(?P<pin>[A-Za-z0-9]+)$'),
+    re.compile(r'^(?P<card_number>[A-Za-z0-9-]+)$'),
+]
+
+# Cards written per transaction, and how long the writer waits to fill a batch
+BATCH_SIZE = 200
+BATCH_WINDOW_SECONDS = 0.25
+
+# Waits between attempts while another connection holds the database lock
+RETRY_BACKOFF_SECONDS = (0.5, 1, 2, 5, 10, 30)
+
+# Rejected scans kept in the on-screen list
+MAX_REJECTIONS = 200
+
+
+def parse_scan(payload, patterns=SCAN_PATTERNS):
+    """Split a scan payload into (card_number, pin), or None if no pattern matches"""
+    payload = payload.strip()
+    for pattern in patterns:
+        match = pattern.match(payload)
+        if match:
+            groups = match.groupdict()
+            return groups['card_number'], (groups.get('pin') or '').strip()
+    return None
+
+
+class IntakeWriter(QObject):
+    """Writes queued cards and edits to the database in batched transactions on a background thread
+
+    With a journal, everything submitted is recorded there first and only
+    acknowledged once committed. Batches that find the database locked are
+    retried with backoff, and entries left over by a crash or a locked
+    shutdown are replayed when the next writer starts. Replays are safe:
+    added cards are rejected as duplicates and edits carry their row version.
+    """
+
+    # List of (card_number, success, message) for added cards, delivered on the GUI thread
+    batch_written = pyqtSignal(object)
+    # Same for edits
+    updates_written = pyqtSignal(object)
+
+    def __init__(self, db_manager, batch_size=BATCH_SIZE, window=BATCH_WINDOW_SECONDS,
+                 journal_path=None, backoff=RETRY_BACKOFF_SECONDS):
+        super().__init__()
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.window = window
+        self.backoff = backoff
+        self.queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.journal = IntakeJournal(journal_path) if journal_path else None
+        # Entries a previous session accepted but never wrote
+        self.replayed = self.journal.pending if self.journal else []
+        for entry in self.replayed:
+            self.queue.put(entry)
+        self.thread = threading.Thread(target=self.run, name="intake-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, card_data):
+        """Queue one validated card for writing"""
+        self.enqueue('add', card_data)
+
+    def submit_update(self, card_number, changes, expected_version):
+        """Queue an edit, guarded by the row version it was made against"""
+        self.enqueue('update', {'card_number': card_number, 'changes': changes, 'version': expected_version})
+
+    def enqueue(self, op, data):
+        if self.journal:
+            self.queue.put(self.journal.append(op, data))
+        else:
+            self.queue.put({'op': op, 'data': data})
+
+    def run(self):
+        """Collect entries until the batch is full or the window closes, then write them together"""
+        stopping = False
+        while not stopping:
+            entry = self.queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            if self.journal:
+                # One fsync for the whole batch
+                self.journal.sync()
+            if not self.write_with_retry(batch):
+                return
+
+    def write_with_retry(self, batch):
+        """Write a batch, waiting out database locks; False if stopped while locked"""
+        attempt = 0
+        while True:
+            batch = self.write(batch)
+            if not batch:
+                return True
+            if self.stopping.is_set():
+                # Left in the journal for the next start
+                return False
+            self.stopping.wait(self.backoff[min(attempt, len(self.backoff) - 1)])
+            attempt += 1
+
+    def write(self, batch):
+        """Write runs of adds and edits in order, returning the entries that found the database locked"""
+        start = 0
+        while start < len(batch):
+            end = start + 1
+            while end < len(batch) and batch[end]['op'] == batch[start]['op']:
+                end += 1
+            run = batch[start:end]
+            if not (self.write_cards(run) if run[0]['op'] == 'add' else self.write_updates(run)):
+                return batch[start:]
+            start = end
+        return []
+
+    def write_cards(self, entries):
+        """Add a run of cards in one transaction; False if the database was locked"""
+        results = self.db_manager.add_cards([entry['data'] for entry in entries])
+        if any(not success and is_locked_error(message) for _, success, message in results):
+            return False
+        self.acknowledge(entries)
+        self.batch_written.emit(results)
+        return True
+
+    def write_updates(self, entries):
+        """Apply a run of edits in one transaction; False if the database was locked"""
+        updates = [(entry['data']['card_number'], entry['data']['changes'], entry['data']['version'])
+                   for entry in entries]
+        success, conflicts = self.db_manager.update_cards(updates)
+        if not success and is_locked_error(conflicts):
+            return False
+        self.acknowledge(entries)
+        if success:
+            results = [(card_number, card_number not in conflicts,
+                        VERSION_CONFLICT if card_number in conflicts else "Card updated successfully")
+                       for card_number, _, _ in updates]
+        else:
+            results = [(card_number, False, conflicts) for card_number, _, _ in updates]
+        self.updates_written.emit(results)
+        return True
+
+    def acknowledge(self, entries):
+        if self.journal:
+            self.journal.acknowledge([entry['seq'] for entry in entries])
+
+    def stop(self):
+        """Write whatever is still queued and stop the writer thread
+
+        A batch still locked out is left in the journal instead of blocking.
+        """
+        self.stopping.set()
+        self.queue.put(None)
+        self.thread.join()
+        if self.journal:
+            self.journal.close()
+
+
+class RapidEntryPanel(QWidget):
+    """Scan input for high-volume intake, using the Add Card form as sticky defaults"""
+
+    def __init__(self, app, add_tab, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.add_tab = add_tab
+        # Card numbers queued or saved during this session, and the ones not written yet
+        self.seen = set()
+        self.waiting = set()
+        self.queued = 0
+        self.saved = 0
+        self.rejected = 0
+        self.setup_ui()
+        app.intake_writer.batch_written.connect(self.on_batch_written)
+
+    def setup_ui(self):
+        """Setup the scan field, status line and rejection list"""
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.scan_input = QLineEdit()
+        self.scan_input.setPlaceholderText("Scan card (card number, optionally followed by |PIN)")
+        self.scan_input.returnPressed.connect(self.on_scan)
+
+        self.status_label = QLabel("Ready to scan")
+        self.rejection_list = QListWidget()
+        self.rejection_list.setMaximumHeight(120)
+
+        layout.addWidget(self.scan_input)
+        layout.addWidget(self.status_label)
+        layout.addWidget(QLabel("Rejected scans:"))
+        layout.addWidget(self.rejection_list)
+        self.setLayout(layout)
+
+    def on_scan(self):
+        """Validate one scan and queue it for the background writer"""
+        payload = self.scan_input.text()
+        self.scan_input.clear()
+        if not payload.strip():
+            return
+
+        parsed = parse_scan(payload)
+        if parsed is None:
+            self.reject(payload.strip(), "Unrecognized scan")
+            return
+        card_number, pin = parsed
+        if card_number in self.seen:
+            self.reject(card_number, "Already scanned this session")
+            return
+
+        # Everything except the scanned fields comes from the form
+        card_data = self.add_tab.get_form_data()
+        card_data['card_number'] = card_number
+        card_data['pin'] = pin
+        card_data['card_image_path'] = ""
+        if not card_data['brand']:
+            self.reject(card_number, "Set a brand in the form first")
+            return
+        if card_data['denomination'] <= 0 or card_data['purchase_price'] <= 0 or card_data['expected_price'] <= 0:
+            self.reject(card_number, "Set denomination and prices in the form first")
+            return
+
+        # PINs are only ever stored encrypted
+        if pin:
+            if not self.app.pin_vault.is_unlocked():
+                self.reject(card_number, "PIN vault is locked")
+                return
+            card_data['pin'] = self.app.pin_vault.encrypt(card_number, pin)
+
+        self.seen.add(card_number)
+        self.waiting.add(card_number)
+        self.queued += 1
+        self.app.intake_writer.submit(card_data)
+        self.show_status(f"Queued {card_number}")
+
+    def on_batch_written(self, results):
+        """Count saved cards and list the ones the database refused"""
+        results = [result for result in results if result[0] in self.waiting]
+        if not results:
+            return
+        for card_number, success, message in results:
+            self.waiting.discard(card_number)
+            self.queued -= 1
+            if success:
+                self.saved += 1
+            else:
+                # Only duplicates stay blocked; other failures may be scanned again
+                if not message.startswith("Card number already exists"):
+                    self.seen.discard(card_number)
+                self.reject(card_number, message)
+        self.show_status(f"Saved batch of {len(results)}")
+
+    def reject(self, card_number, reason):
+        """Show a rejected scan without interrupting the operator"""
+        self.rejected += 1
+        self.rejection_list.insertItem(0, f"{card_number}: {reason}")
+        while self.rejection_list.count() > MAX_REJECTIONS:
+            self.rejection_list.takeItem(self.rejection_list.count() - 1)
+        self.show_status(f"Rejected {card_number}: {reason}")
+
+    def show_status(self, last):
+        self.status_label.setText(
+            f"Saved {self.saved} · Queued {self.queued} · Rejected {self.rejected} — {last}"
+        )
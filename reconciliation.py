@@ -0,0 +1,258 @@
+import csv
+import os
+from bisect import bisect_left
+from datetime import date, datetime
+
+# A payment may arrive this many days before or after the recorded sold date
+DATE_WINDOW_DAYS = 7
+
+# Payments off by up to this fraction of the expected price still match, as over/under payments
+AMOUNT_TOLERANCE = 0.10
+
+PAYMENT_MODES = ["PayPal", "Venmo", "Zelle", "CashApp", "Bank"]
+
+# Lower-cased statement headers per field, in order of preference
+STATEMENT_HEADERS = {
+    'date': ['date', 'datetime', 'transaction date', 'posted date', 'posting date', 'date (utc)'],
+    'amount': ['amount', 'amount (total)', 'gross', 'net', 'credit', 'amount (usd)'],
+    'id': ['transaction id', 'id', 'reference', 'reference number', 'confirmation number'],
+    'description': ['description', 'name', 'note', 'memo', 'from', 'details'],
+}
+
+DATE_FORMATS = ["%m/%d/%Y", "%m/%d/%y", "%d %b %Y", "%b %d, %Y", "%Y/%m/%d"]
+
+
+def parse_amount(text):
+    """Amount of a statement cell such as '$1,234.50', '+ $45.00' or '(12.00)'"""
+    text = str(text).strip().replace('$', '').replace(',', '').replace(' ', '')
+    negative = text.startswith('(') and text.endswith(')')
+    value = float(text.strip('()'))
+    return round(-value if negative else value, 2)
+
+
+def parse_date(text):
+    """ISO date of a statement cell in one of the common export formats"""
+    text = str(text).strip()
+    try:
+        return date.fromisoformat(text[:10]).isoformat()
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unknown date format: {text}")
+
+
+def detect_mode(path):
+    """Payment mode named in a statement's file name, or None"""
+    name = os.path.basename(path).lower()
+    return next((mode for mode in PAYMENT_MODES if mode.lower() in name), None)
+
+
+def find_columns(header):
+    """Map field -> column index for a header row, or None if it has no date and amount"""
+    names = [cell.strip().lower() for cell in header]
+    columns = {}
+    for field, candidates in STATEMENT_HEADERS.items():
+        for candidate in candidates:
+            if candidate in names:
+                columns[field] = names.index(candidate)
+                break
+    return columns if 'date' in columns and 'amount' in columns else None
+
+
+def read_statement(path, mode=None):
+    """Read the incoming payments of a statement CSV export
+
+    The header row is found by its date and amount columns, so the title
+    lines some exports start with are skipped. Outgoing and unreadable
+    rows are counted as skipped. Returns (transactions, skipped).
+    """
+    transactions = []
+    skipped = 0
+    columns = None
+    with open(path, newline='', encoding='utf-8-sig') as statement:
+        for line, row in enumerate(csv.reader(statement), 1):
+            if columns is None:
+                columns = find_columns(row)
+                continue
+            if not any(cell.strip() for cell in row):
+                continue
+            try:
+                amount = parse_amount(row[columns['amount']])
+                day = parse_date(row[columns['date']])
+            except (IndexError, ValueError):
+                skipped += 1
+                continue
+            if amount <= 0:
+                skipped += 1
+                continue
+            transactions.append({
+                'line': line,
+                'id': row[columns['id']].strip() if 'id' in columns and len(row) > columns['id'] else "",
+                'date': day,
+                'amount': amount,
+                'mode': mode,
+                'description': (row[columns['description']].strip()
+                                if 'description' in columns and len(row) > columns['description'] else ""),
+            })
+    if columns is None:
+        raise ValueError("No header with a date and an amount column was found")
+    return transactions, skipped
+
+
+def day_number(value):
+    try:
+        return date.fromisoformat(str(value or '')[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def match_payments(transactions, cards, window_days=DATE_WINDOW_DAYS, tolerance=AMOUNT_TOLERANCE):
+    """Pair statement transactions with unpaid sold cards, each card at most once
+
+    cards are get_unpaid_sold_cards() tuples. Exact amounts are matched
+    first, looked up in a dict of amount in cents to the cards of that
+    amount sorted by sold date, which is bisected for the date window.
+    Left-over transactions then take the closest priced card within the
+    tolerance among the cards sold in the window, bisected from one
+    date-sorted list. The card sold nearest the payment date wins ties;
+    cards without a sold date only match exact amounts.
+    """
+    by_amount = {}
+    undated_by_amount = {}
+    by_day = []
+    for card in cards:
+        card_number, expected, sold_date = card[0], card[1], card[2]
+        if expected is None:
+            continue
+        day = day_number(sold_date)
+        cents = round(expected * 100)
+        if day is None:
+            undated_by_amount.setdefault(cents, []).append(card)
+        else:
+            by_amount.setdefault(cents, []).append((day, card_number, card))
+            by_day.append((day, card_number, card))
+    for candidates in by_amount.values():
+        candidates.sort()
+    by_day.sort()
+
+    used = set()
+    matches = []
+    unmatched = []
+
+    def mode_fits(card, transaction):
+        return not card[3] or not transaction['mode'] or card[3].strip().lower() == transaction['mode'].lower()
+
+    def in_window(candidates, day):
+        return candidates[bisect_left(candidates, (day - window_days,)):
+                          bisect_left(candidates, (day + window_days + 1,))]
+
+    def record(transaction, card):
+        used.add(card[0])
+        matches.append({
+            'card_number': card[0], 'expected': card[1], 'amount': transaction['amount'],
+            'difference': round(transaction['amount'] - card[1], 2), 'mode': transaction['mode'],
+            'version': card[4], 'card_mode': card[3], 'transaction': transaction,
+        })
+
+    transactions = sorted(transactions, key=lambda transaction: (transaction['date'], transaction['line']))
+    for transaction in transactions:
+        day = day_number(transaction['date'])
+        cents = round(transaction['amount'] * 100)
+        dated = [(abs(card_day - day), card_number, card) for card_day, card_number, card
+                 in in_window(by_amount.get(cents, []), day)
+                 if card_number not in used and mode_fits(card, transaction)]
+        if dated:
+            record(transaction, min(dated, key=lambda candidate: candidate[:2])[2])
+            continue
+        undated = [card for card in undated_by_amount.get(cents, [])
+                   if card[0] not in used and mode_fits(card, transaction)]
+        if undated:
+            record(transaction, undated[0])
+            continue
+        unmatched.append(transaction)
+
+    still_unmatched = []
+    for transaction in unmatched:
+        day = day_number(transaction['date'])
+        close = [(abs(card[1] - transaction['amount']), abs(card_day - day), card_number, card)
+                 for card_day, card_number, card in in_window(by_day, day)
+                 if card_number not in used and mode_fits(card, transaction)
+                 and abs(card[1] - transaction['amount']) <= card[1] * tolerance]
+        if close:
+            record(transaction, min(close, key=lambda candidate: candidate[:3])[3])
+        else:
+            still_unmatched.append(transaction)
+
+    # Unpaid cards that could have been paid during the statement's period
+    first = min((day_number(transaction['date']) for transaction in transactions), default=0) - window_days
+    last = max((day_number(transaction['date']) for transaction in transactions), default=0) + window_days
+    unmatched_cards = [card[0] for card in cards if card[0] not in used
+                       and (day_number(card[2]) is None or first <= day_number(card[2]) <= last)]
+
+    matches.sort(key=lambda match: match['card_number'])
+    return {
+        'matches': matches,
+        'unmatched_transactions': still_unmatched,
+        'unmatched_cards': unmatched_cards,
+    }
+
+
+def reconcile_statement(storage, path, mode=None, window_days=DATE_WINDOW_DAYS, tolerance=AMOUNT_TOLERANCE):
+    """Match the payments of a statement file against the unpaid sold cards of a storage"""
+    transactions, skipped = read_statement(path, mode)
+    result = match_payments(transactions, storage.get_unpaid_sold_cards(), window_days, tolerance)
+    result['transactions'] = len(transactions)
+    result['skipped'] = skipped
+    return result
+
+
+def apply_payments(storage, matches):
+    """Record the matched payments in one transaction, each guarded by the card's version
+
+    The payment mode is only filled in on cards that have none. Returns
+    (success, card numbers changed since matching) or (False, message).
+    """
+    updates = []
+    for match in matches:
+        changes = {'payment_received': match['amount']}
+        if not match['card_mode'] and match['mode']:
+            changes['payment_mode'] = match['mode']
+        updates.append((match['card_number'], changes, match['version']))
+    return storage.update_cards(updates)
+
+
+def format_reconciliation_report(result, limit=50):
+    """Format the result of reconcile_statement for display"""
+    def listed(lines):
+        shown = lines[:limit]
+        if len(lines) > limit:
+            shown.append(f"  ... and {len(lines) - limit} more")
+        return shown
+
+    matches = result['matches']
+    lines = [f"Read {result['transactions']} incoming payments"
+             + (f", skipped {result['skipped']} other rows." if result['skipped'] else ".")]
+    lines.append(f"{len(matches)} matched a sold card, "
+                 f"{sum(1 for match in matches if not match['difference'])} of them for the exact expected price.")
+    off = [match for match in matches if match['difference']]
+    if off:
+        lines.append(f"\n{len(off)} over/under paid:")
+        lines.extend(listed([
+            f"  {match['card_number']}: expected ${match['expected']:.2f}, received ${match['amount']:.2f} "
+            f"({'+' if match['difference'] > 0 else '-'}${abs(match['difference']):.2f})"
+            for match in off
+        ]))
+    if result['unmatched_transactions']:
+        lines.append(f"\n{len(result['unmatched_transactions'])} payments match no card:")
+        lines.extend(listed([
+            f"  {transaction['date']} ${transaction['amount']:.2f} {transaction['description']}".rstrip()
+            for transaction in result['unmatched_transactions']
+        ]))
+    if result['unmatched_cards']:
+        lines.append(f"\n{len(result['unmatched_cards'])} sold cards of this period are still unpaid:")
+        lines.extend(listed([f"  {card_number}" for card_number in result['unmatched_cards']]))
+    return "\n".join(lines)
@@ -0,0 +1,199 @@
+import multiprocessing
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from urllib.request import pathname2url
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from database import CARD_LIST_COLUMNS
+from pin_vault import is_encrypted, split_encrypted, open_pin
+
+EXPORT_HEADER = ("Card Number,Brand,PIN,Denomination,Purchase Price,Expected Price,Profit,Source,"
+                 "Purchase Date,Pending,Sold Date,Payment Received,Payment Mode,Image Path\n")
+
+BRAND_REPORT_HEADER = ("Brand,Cards,Sold,Face Value,Purchase Cost,Expected Revenue,Expected Profit,"
+                       "Payments Received\n")
+
+# Rows handled by one worker task; smaller databases are processed in-process
+CHUNK_ROWS = 50000
+
+EXPORT_COLUMNS = [
+    'card_number', 'brand', 'pin', 'denomination', 'purchase_price', 'expected_price', 'profit',
+    'source', 'purchase_date', 'pending', 'sold_date', 'payment_received', 'payment_mode',
+    'card_image_path'
+]
+
+
+def connect_read_only(db_path):
+    """Open a read-only connection, so workers can never write"""
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    return sqlite3.connect(uri, uri=True, timeout=20.0)
+
+
+def rowid_ranges(db_path, chunk_rows=CHUNK_ROWS):
+    """Split the cards table into (low, high) rowid ranges, newest range first"""
+    conn = connect_read_only(db_path)
+    try:
+        low, high = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM cards").fetchone()
+    finally:
+        conn.close()
+    if low is None:
+        return []
+    ranges = [(start, min(start + chunk_rows - 1, high)) for start in range(low, high + 1, chunk_rows)]
+    return ranges[::-1]
+
+
+def run_chunks(function, db_path, ranges, *args, workers=None):
+    """Run function(db_path, low, high, *args) for every range, yielding results in range order"""
+    if len(ranges) <= 1:
+        for low, high in ranges:
+            yield function(db_path, low, high, *args)
+        return
+    workers = workers or os.cpu_count() or 1
+    # Spawned workers do not inherit the GUI's threads or open connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # Only a few results run ahead of the consumer, bounding memory use
+        pending = deque()
+        remaining = iter(ranges)
+        for low, high in islice(remaining, workers * 2):
+            pending.append(executor.submit(function, db_path, low, high, *args))
+        while pending:
+            result = pending.popleft().result()
+            for low, high in islice(remaining, 1):
+                pending.append(executor.submit(function, db_path, low, high, *args))
+            yield result
+
+
+def money(value):
+    return f"${value:.2f}" if value else "$0.00"
+
+
+def text(value):
+    # Commas are replaced so the simple CSV format stays parseable
+    return str(value).replace(',', ';') if value else ""
+
+
+def format_export_row(card, pin):
+    """One CSV line of the card export"""
+    return ",".join([
+        text(card['card_number']), text(card['brand']), text(pin),
+        money(card['denomination']), money(card['purchase_price']), money(card['expected_price']),
+        money(card['profit']), text(card['source']), str(card['purchase_date'] or ""),
+        str(card['pending']) if card['pending'] else "No", str(card['sold_date'] or ""),
+        money(card['payment_received']), text(card['payment_mode']), str(card['card_image_path'] or "")
+    ]) + "\n"
+
+
+def export_chunk(db_path, low, high, keys=None):
+    """Format the export lines of one rowid range, newest first (runs in a worker process)
+
+    Returns (number of cards, CSV text).
+    """
+    ciphers = {key_id: AESGCM(key) for key_id, key in keys.items()} if keys else None
+    conn = connect_read_only(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(EXPORT_COLUMNS)} FROM cards WHERE rowid BETWEEN ? AND ? ORDER BY rowid DESC",
+            (low, high)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    lines = []
+    for row in rows:
+        card = dict(zip(EXPORT_COLUMNS, row))
+        pin = ""
+        if ciphers is not None and card['pin']:
+            pin = card['pin']
+            if is_encrypted(pin):
+                key_id, raw = split_encrypted(pin)
+                pin = open_pin(ciphers[key_id], card['card_number'], raw)
+        lines.append(format_export_row(card, pin))
+    return len(lines), "".join(lines)
+
+
+def export_cards(db_path, file_path, keys=None, workers=None, chunk_rows=CHUNK_ROWS):
+    """Write the CSV export of all cards, formatted in parallel and merged in order
+
+    PINs are only decrypted when the session's data keys are given; they
+    travel to the local worker processes only. Returns the number of cards.
+    """
+    count = 0
+    ranges = rowid_ranges(db_path, chunk_rows)
+    with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csvfile.write(EXPORT_HEADER)
+        for rows, chunk in run_chunks(export_chunk, db_path, ranges, keys, workers=workers):
+            csvfile.write(chunk)
+            count += rows
+    return count
+
+
+def export_storage(storage, file_path, pins=None):
+    """Write the CSV export from any card storage, in-process"""
+    cards = [dict(zip(CARD_LIST_COLUMNS, row)) for row in storage.get_all_cards()]
+    with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csvfile.write(EXPORT_HEADER)
+        for card in cards:
+            csvfile.write(format_export_row(card, (pins or {}).get(card['card_number'], "")))
+    return len(cards)
+
+
+def brand_totals_chunk(db_path, low, high):
+    """Per-brand totals of one rowid range (runs in a worker process)"""
+    conn = connect_read_only(db_path)
+    try:
+        rows = conn.execute("""
+        SELECT COALESCE(brand, ''), COUNT(*), SUM(CASE WHEN pending = 'No' THEN 1 ELSE 0 END),
+               TOTAL(denomination), TOTAL(purchase_price), TOTAL(expected_price), TOTAL(profit),
+               TOTAL(payment_received)
+        FROM cards WHERE rowid BETWEEN ? AND ? GROUP BY COALESCE(brand, '')
+        """, (low, high)).fetchall()
+    finally:
+        conn.close()
+    return {row[0]: list(row[1:]) for row in rows}
+
+
+def merge_brand_totals(chunks):
+    """Sum per-brand totals from all ranges"""
+    totals = {}
+    for chunk in chunks:
+        for brand, values in chunk.items():
+            current = totals.setdefault(brand, [0] * len(values))
+            for i, value in enumerate(values):
+                current[i] += value
+    return totals
+
+
+def brand_report(db_path, workers=None, chunk_rows=CHUNK_ROWS):
+    """Per-brand totals over all cards: {brand: [cards, sold, face value, cost, expected, profit, received]}"""
+    ranges = rowid_ranges(db_path, chunk_rows)
+    return merge_brand_totals(run_chunks(brand_totals_chunk, db_path, ranges, workers=workers))
+
+
+def brand_totals_from_storage(storage):
+    """Per-brand totals computed in-process from any card storage"""
+    totals = {}
+    for row in storage.get_all_cards():
+        card = dict(zip(CARD_LIST_COLUMNS, row))
+        current = totals.setdefault(card['brand'] or "", [0] * 7)
+        values = [1, 1 if card['pending'] == 'No' else 0, card['denomination'], card['purchase_price'],
+                  card['expected_price'], card['profit'], card['payment_received']]
+        for i, value in enumerate(values):
+            current[i] += value or 0
+    return totals
+
+
+def write_brand_report(totals, file_path):
+    """Write brand totals as CSV, sorted by brand"""
+    with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csvfile.write(BRAND_REPORT_HEADER)
+        for brand in sorted(totals, key=str.lower):
+            cards, sold, face_value, cost, expected, profit, received = totals[brand]
+            csvfile.write(",".join([
+                text(brand), str(cards), str(sold), money(face_value), money(cost), money(expected),
+                money(profit), money(received)
+            ]) + "\n")
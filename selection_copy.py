@@ -0,0 +1,90 @@
+import csv
+import html
+import io
+
+from PyQt6.QtCore import QMimeData
+
+from card_model import COLUMNS
+
+# Tabs and line breaks inside a value would start a new cell or row in TSV
+TSV_SAFE = str.maketrans({'\t': ' ', '\r': ' ', '\n': ' '})
+
+
+def copy_columns(include_pins=False):
+    """(header, column) of each value copied per card, in table order
+
+    Raw stored values are copied, so the PIN column holds the PIN itself and
+    is left out unless PINs are included.
+    """
+    columns = []
+    for header, field, kind in COLUMNS:
+        if kind == 'action':
+            continue
+        if kind == 'pin':
+            if include_pins:
+                columns.append((header, 'pin'))
+            continue
+        columns.append((header, field))
+    return columns
+
+
+class ClipboardBuilder:
+    """Formats rows as TSV, CSV and an HTML table in one pass, a row at a time"""
+
+    def __init__(self, header):
+        self.tsv = io.StringIO()
+        self.csv_text = io.StringIO()
+        self.csv = csv.writer(self.csv_text, lineterminator="\n")
+        self.html = io.StringIO()
+        self.html.write("<table>")
+        self.rows = 0
+        self.write_row(header, "th")
+
+    def add_row(self, values):
+        self.write_row(values, "td")
+        self.rows += 1
+
+    def write_row(self, values, tag):
+        cells = ["" if value is None else str(value) for value in values]
+        self.tsv.write("\t".join(cell.translate(TSV_SAFE) for cell in cells))
+        self.tsv.write("\n")
+        self.csv.writerow(cells)
+        self.html.write("<tr>")
+        self.html.write("".join(f"<{tag}>{html.escape(cell)}</{tag}>" for cell in cells))
+        self.html.write("</tr>")
+
+    def mime_data(self):
+        """The rows as plain text (TSV), text/csv and text/html"""
+        mime = QMimeData()
+        mime.setText(self.tsv.getvalue())
+        mime.setData("text/csv", self.csv_text.getvalue().encode('utf-8'))
+        mime.setHtml(self.html.getvalue() + "</table>")
+        return mime
+
+
+def selection_mime_data(storage, card_numbers, unsaved=None, reveal_pin=None):
+    """Build the clipboard data of cards in the given order, returning (QMimeData, cards copied)
+
+    Raw values are fetched in one query instead of read from the table's
+    formatted cells. unsaved maps card numbers to table edits not saved
+    yet, which replace the stored values. PINs are only copied when
+    reveal_pin(card_number, stored PIN) is given to turn them into clear text.
+    """
+    columns = copy_columns(reveal_pin is not None)
+    fields = [field for _, field in columns]
+    position = {field: i for i, field in enumerate(fields)}
+    stored = storage.get_cards_fields(card_numbers, fields)
+    builder = ClipboardBuilder([header for header, _ in columns])
+    for card_number in card_numbers:
+        values = stored.get(card_number)
+        # Deleted since the table was loaded
+        if values is None:
+            continue
+        values = list(values)
+        for field, value in (unsaved or {}).get(card_number, {}).items():
+            if field in position:
+                values[position[field]] = value
+        if reveal_pin is not None and values[position['pin']]:
+            values[position['pin']] = reveal_pin(card_number, values[position['pin']])
+        builder.add_row(values)
+    return builder.mime_data(), builder.rows
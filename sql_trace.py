@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger("giftcards.sql")
+
+# Statements slower than this get their query plan captured
+SLOW_QUERY_THRESHOLD_MS = 50.0
+
+# Slow queries kept in memory and in the log file
+SLOW_QUERY_CAPACITY = 200
+
+SLOW_QUERY_LOG = "slow_queries.json"
+
+# New slow queries are written to the log file at most this often
+SAVE_DELAY_SECONDS = 5.0
+
+# Statements EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+def is_full_scan(plan):
+    """Check whether a query plan reads a whole table rather than an index"""
+    return any(step.startswith('SCAN ') and ' USING ' not in step for step in plan)
+
+
+class SqlTracer:
+    """Times every statement and keeps a bounded log of the slow ones
+
+    Only statement text is recorded, never parameters, so PINs and card
+    data do not end up in the log.
+    """
+
+    def __init__(self, threshold_ms=SLOW_QUERY_THRESHOLD_MS, capacity=SLOW_QUERY_CAPACITY,
+                 log_path=SLOW_QUERY_LOG):
+        self.threshold_ms = threshold_ms
+        self.log_path = log_path
+        self.slow_queries = deque(load_slow_queries(log_path) if log_path else (), maxlen=capacity)
+        self.lock = threading.Lock()
+        self.save_timer = None
+        self.connection_factory = make_connection_factory(self)
+
+    def record(self, connection, sql, duration_ms, rows, error=None):
+        """Log one statement, capturing its plan if it was slow"""
+        statement = " ".join(sql.split())
+        if error is not None:
+            logger.warning("SQL failed after %.1f ms: %s (%s)", duration_ms, statement, error)
+        else:
+            logger.debug("SQL %.1f ms, %s rows: %s", duration_ms, rows, statement)
+        if duration_ms < self.threshold_ms:
+            return
+
+        plan = self.explain(connection, sql)
+        entry = {
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'sql': statement,
+            'duration_ms': round(duration_ms, 2),
+            'rows': rows,
+            'plan': plan,
+            'full_scan': is_full_scan(plan),
+            'error': error,
+        }
+        if entry['full_scan']:
+            logger.warning("Slow full table scan (%.1f ms): %s", duration_ms, statement)
+        with self.lock:
+            self.slow_queries.append(entry)
+            self.schedule_save()
+
+    def explain(self, connection, sql):
+        """Query plan steps of a statement, or [] if it cannot be explained"""
+        if not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return []
+        # Parameters do not change the plan's shape, so NULLs stand in for them
+        placeholders = (None,) * sql.count('?')
+        try:
+            rows = sqlite3.Connection.execute(connection, f"EXPLAIN QUERY PLAN {sql}", placeholders).fetchall()
+        except sqlite3.Error:
+            return []
+        return [row[-1] for row in rows]
+
+    def schedule_save(self):
+        """Write the log a little later, batching the entries recorded meanwhile (lock held)"""
+        # Statements run on the GUI and intake threads, which must not wait for the disk
+        if not self.log_path or self.save_timer is not None:
+            return
+        self.save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.flush)
+        self.save_timer.daemon = True
+        self.save_timer.start()
+
+    def flush(self):
+        """Write the slow query log now, e.g. at exit"""
+        with self.lock:
+            if self.save_timer is not None:
+                self.save_timer.cancel()
+                self.save_timer = None
+            self.save()
+
+    def save(self):
+        """Write the slow query log atomically"""
+        if not self.log_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.log_path))
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as log_file:
+                json.dump(list(self.slow_queries), log_file, indent=1)
+            os.replace(temp_path, self.log_path)
+        except OSError as e:
+            logger.warning("Could not write %s: %s", self.log_path, e)
+
+    def clear(self):
+        with self.lock:
+            self.slow_queries.clear()
+        self.flush()
+
+
+def make_connection_factory(tracer):
+    """Connection class whose cursors report to the given tracer"""
+
+    class TracedConnection(sqlite3.Connection):
+        def cursor(self, factory=None):
+            cursor = super().cursor(TracedCursor)
+            cursor.tracer = tracer
+            self.__dict__.setdefault('traced_cursors', []).append(cursor)
+            return cursor
+
+        def execute(self, sql, parameters=()):
+            return self.cursor().execute(sql, parameters)
+
+        def executemany(self, sql, parameters):
+            return self.cursor().executemany(sql, parameters)
+
+        def close(self):
+            # Statements whose results were never fully fetched end here
+            for cursor in self.__dict__.get('traced_cursors', []):
+                cursor.finish()
+            super().close()
+
+    return TracedConnection
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's duration and row count to a tracer
+
+    A SELECT is timed through its fetches, so the entry is completed when
+    the next statement runs or the results are fully fetched.
+    """
+
+    tracer = None
+    current = None
+
+    def execute(self, sql, parameters=()):
+        self.finish()
+        return self.traced(super().execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        self.finish()
+        return self.traced(super().executemany, sql, parameters)
+
+    def traced(self, method, sql, parameters):
+        start = time.perf_counter()
+        try:
+            method(sql, parameters)
+        except sqlite3.Error as e:
+            self.tracer.record(self.connection, sql, (time.perf_counter() - start) * 1000, 0, str(e))
+            raise
+        elapsed = time.perf_counter() - start
+        if self.description is None:
+            self.tracer.record(self.connection, sql, elapsed * 1000, self.rowcount)
+        else:
+            self.current = [sql, elapsed, 0]
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self.fetched(start, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(size if size is not None else self.arraysize)
+        self.fetched(start, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self.fetched(start, len(rows), True)
+        return rows
+
+    def fetched(self, start, rows, exhausted):
+        if self.current is None:
+            return
+        self.current[1] += time.perf_counter() - start
+        self.current[2] += rows
+        if exhausted:
+            self.finish()
+
+    def finish(self):
+        """Report the SELECT whose results were being fetched"""
+        if self.current is not None:
+            sql, elapsed, rows = self.current
+            self.current = None
+            self.tracer.record(self.connection, sql, elapsed * 1000, rows)
+
+    def close(self):
+        self.finish()
+        super().close()
+
+
+def load_slow_queries(log_path=SLOW_QUERY_LOG):
+    """Read a slow query log written by SqlTracer"""
+    try:
+        with open(log_path, encoding='utf-8') as log_file:
+            return json.load(log_file)
+    except (OSError, ValueError):
+        return []
+
+
+def format_slow_queries(entries):
+    """Human-readable listing of slow query log entries"""
+    lines = []
+    for entry in entries:
+        flag = "  FULL SCAN" if entry.get('full_scan') else ""
+        lines.append(f"{entry['time']}  {entry['duration_ms']:.1f} ms  {entry['rows']} rows{flag}")
+        lines.append(f"  {entry['sql']}")
+        lines.extend(f"    {step}" for step in entry.get('plan', []))
+        if entry.get('error'):
+            lines.append(f"  error: {entry['error']}")
+    return "\n".join(lines)
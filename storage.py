@@ -0,0 +1,677 @@
+import copy
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Protocol, runtime_checkable
+
+from database import (
+    DatabaseManager, ALERT_ROWS, CARD_LIST_COLUMNS, CARD_COLUMNS, CARD_TOTALS, IMAGE_STATUS_COLUMNS, UPDATABLE_COLUMNS,
+    PAGE_SIZE, SORT_KEYS, PREVIEW_ROWS, VERSION_CONFLICT, aging_bucket, aging_cutoffs, clean_pricing_rule, derived_values,
+    MASKED_VALUE, history_value, pricing_rule_matches, pricing_rule_rank, sort_value
+)
+from access import Access, DEFAULT_ROLES, PERMISSION_DENIED, ROLE_COLUMNS
+from near_duplicates import MAX_DISTANCE, NEIGHBOUR_WINDOW, closest_card_numbers, normalize_card_number
+
+# Path that selects the in-memory engine in open_storage
+MEMORY_PATH = ":memory:"
+
+
+@runtime_checkable
+class CardStorage(Protocol):
+    """Operations the application needs from a card store
+
+    DatabaseManager (SQLite) is the default implementation. Listing rows are
+    tuples in CARD_LIST_COLUMNS order; mutating methods return
+    (success, message) like the SQLite implementation.
+    """
+
+    # Permissions of the current session, see set_user
+    access: Access
+
+    def add_card(self, card_data):
+        """Add one card, returning (success, message)"""
+
+    def add_cards(self, cards):
+        """Add many cards in one transaction, returning (card_number, success, message) per card"""
+
+    def get_all_cards(self):
+        """Get all listing rows, newest first"""
+
+    def get_cards_page(self, sort_field=None, descending=True, after=None, limit=PAGE_SIZE):
+        """Get (rows, cursor of the next page) of the listing in a stable sort order"""
+
+    def count_cards(self):
+        """Count all cards"""
+
+    def get_data_version(self):
+        """Number that changes whenever a card change is committed, or None if unknown"""
+
+    def get_card_totals(self):
+        """Get {key: total} for CARD_TOTALS over every card"""
+
+    def get_unpaid_sold_cards(self):
+        """Get (card_number, expected_price, sold_date, payment_mode, version) of sold cards without a payment"""
+
+    def get_expiring_cards(self, before, limit=ALERT_ROWS):
+        """Get (count, [(card_number, brand, denomination, expiry_date)]) of unsold cards expiring by a date, soonest first"""
+
+    def get_aging_cards(self, purchased_before, limit=ALERT_ROWS):
+        """Get (count, [(card_number, brand, denomination, purchase_date)]) of unsold cards bought by a date, oldest first"""
+
+    def get_aging_buckets(self, today=None):
+        """Get [(count, denomination, purchase_price, expected_price)] of the unsold cards per holding-age bucket"""
+
+    def query_cards(self, brand=None, pending=None, purchased_from=None, purchased_to=None):
+        """Get the listing rows matching all of the given filters, newest first"""
+
+    def update_card(self, card_number, card_data, expected_version=None):
+        """Compare-and-swap update of some columns, returning (success, message)"""
+
+    def update_cards(self, updates):
+        """Apply (card_number, changes, expected_version) updates, returning (True, conflicts)"""
+
+    def delete_card(self, card_number):
+        """Delete a card, returning (success, message)"""
+
+    def check_card_exists(self, card_number):
+        """Check if a card number already exists"""
+
+    def find_similar_card_numbers(self, card_number, max_distance=MAX_DISTANCE, window=NEIGHBOUR_WINDOW):
+        """Get [(card_number, distance)] of cards whose number is within max_distance edits, closest first"""
+
+    def get_card_number_keys(self, reverse=False, after=None, limit=PAGE_SIZE):
+        """Get (key, card_number), or (reversed key, card_number), pairs in order after the pair after"""
+
+    def get_card_fields(self, card_number, fields):
+        """Get only the requested columns of a card, or None if it does not exist"""
+
+    def get_cards_fields(self, card_numbers, fields):
+        """Get {card_number: values of the requested columns, in order} of many cards in one query"""
+
+    def get_card_by_number(self, card_number):
+        """Get every column of a card as a dictionary"""
+
+    def get_image_paths(self):
+        """Get (card_number, card_image_path) of every card with an image"""
+
+    def update_image_status(self, updates):
+        """Write (image_exists, image_size, card_number, card_image_path), skipping changed paths"""
+
+    def get_pricing_rules(self):
+        """Get every pricing rule as a dictionary, most specific first"""
+
+    def add_pricing_rule(self, rule):
+        """Add a pricing rule, returning (success, message)"""
+
+    def delete_pricing_rule(self, rule_id):
+        """Delete a pricing rule, returning (success, message)"""
+
+    def preview_repricing(self, limit=PREVIEW_ROWS):
+        """Count and list the cards the pricing rules would change"""
+
+    def apply_pricing_rules(self):
+        """Reprice every unsold card matched by a rule in one transaction, returning (success, message)"""
+
+    def get_card_history(self, card_number):
+        """Get the audit events of a card, newest first"""
+
+    def get_inventory_at(self, timestamp):
+        """Reconstruct every card as it was at a UTC 'YYYY-MM-DD HH:MM:SS' timestamp"""
+
+    def get_pins(self):
+        """Get the stored PIN of every card that has one"""
+
+    def get_pins_to_rekey(self, active_prefix, after_rowid, limit):
+        """Get (rowid, card_number, pin) of PINs not under the active key, in rowid order"""
+
+    def update_pins(self, updates):
+        """Write (pin, card_number, previous pin) triples, skipping PINs changed meanwhile"""
+
+    def get_vault_settings(self):
+        """Get the PIN vault settings, or None if no vault is set up"""
+
+    def save_vault_settings(self, settings):
+        """Replace the PIN vault settings"""
+
+    def set_user(self, name):
+        """Start a session as a user, or with full access for None, returning (success, message)"""
+
+    def get_roles(self):
+        """Get every role as a dictionary of ROLE_COLUMNS"""
+
+    def get_users(self):
+        """Get every user as a dictionary of USER_COLUMNS"""
+
+    def save_user(self, name, role, source=""):
+        """Add or change a user, returning (success, message)"""
+
+    def delete_user(self, name):
+        """Delete a user, returning (success, message)"""
+
+
+def utc_timestamp():
+    """Current time in the format the audit trail uses"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class InMemoryStorage:
+    """Pure in-memory card store for tests and benchmarks
+
+    Cards live in a dict keyed by card number, with a dict of sets per brand
+    and a sorted list per purchase date for queries. Behaves like
+    DatabaseManager, including row versions, the audit trail and the
+    session's row scope and column masks.
+    """
+
+    def __init__(self):
+        self.cards = {}
+        self.rowids = {}
+        self.next_rowid = 1
+        self.by_brand = {}
+        # Sorted (purchase_date, rowid, card_number) entries
+        self.by_purchase_date = []
+        # Normalized card number -> card number, and sorted (key, card_number), (reversed key, card_number)
+        self.key_owners = {}
+        self.number_keys = []
+        self.number_rkeys = []
+        self.events = []
+        self.event_times = []
+        self.events_by_card = {}
+        # card_number -> (image_exists, image_size) of checked images
+        self.image_status = {}
+        self.pricing_rules = []
+        self.next_rule_id = 1
+        self.vault_settings = None
+        self.created_at = utc_timestamp()
+        self.roles = {role[0]: dict(zip(ROLE_COLUMNS, role)) for role in DEFAULT_ROLES}
+        # name -> {'name', 'role', 'source'}
+        self.users = {}
+        self.access = Access()
+
+    def add_card(self, card_data):
+        """Add a new gift card"""
+        return self.insert_card(card_data)
+
+    def add_cards(self, cards):
+        """Add many cards, returning (card_number, success, message) per card"""
+        return [(card_data['card_number'],) + self.insert_card(card_data) for card_data in cards]
+
+    def insert_card(self, card_data):
+        if not self.access.can_add:
+            return False, PERMISSION_DENIED
+        card_data = dict(card_data, owner=card_data.get('owner') if self.access.administer and card_data.get('owner')
+                         else self.access.user)
+        card_number = card_data['card_number']
+        if card_number in self.cards:
+            return False, "Card number already exists"
+        key = normalize_card_number(card_number)
+        if key in self.key_owners:
+            return False, f"Card number already exists as {self.key_owners[key]}"
+        card = {column: card_data.get(column) for column in UPDATABLE_COLUMNS}
+        card['card_number'] = card_number
+        card['version'] = 0
+        self.cards[card_number] = card
+        self.rowids[card_number] = self.next_rowid
+        self.next_rowid += 1
+        self.index_card(card)
+        self.key_owners[key] = card_number
+        insort(self.number_keys, (key, card_number))
+        insort(self.number_rkeys, (key[::-1], card_number))
+        self.record_event(card_number, 'create', {
+            column: history_value(column, card_data.get(column)) for column in UPDATABLE_COLUMNS
+            if card_data.get(column) not in (None, '')
+        })
+        return True, "Card added successfully"
+
+    def index_card(self, card):
+        card_number = card['card_number']
+        self.by_brand.setdefault(card['brand'], set()).add(card_number)
+        insort(self.by_purchase_date, (card['purchase_date'] or '', self.rowids[card_number], card_number))
+
+    def unindex_card(self, card):
+        card_number = card['card_number']
+        brand_cards = self.by_brand.get(card['brand'])
+        if brand_cards is not None:
+            brand_cards.discard(card_number)
+            if not brand_cards:
+                del self.by_brand[card['brand']]
+        entry = (card['purchase_date'] or '', self.rowids[card_number], card_number)
+        position = bisect_left(self.by_purchase_date, entry)
+        if position < len(self.by_purchase_date) and self.by_purchase_date[position] == entry:
+            del self.by_purchase_date[position]
+
+    def card_values(self, card):
+        """Every column of a card, including the derived and cached ones"""
+        values = dict(card, has_pin=int(bool(card['pin'])), **derived_values(card))
+        values.update(zip(IMAGE_STATUS_COLUMNS, self.image_status.get(card['card_number'], (None, None))))
+        return values
+
+    def visible_values(self, card):
+        """card_values with the columns the session may not read set to None"""
+        return self.access.mask(self.card_values(card))
+
+    def visible_cards(self):
+        """The cards within the session's rows, oldest first"""
+        return [card for card in list(self.cards.values()) if self.access.allows(card)]
+
+    def visible_card(self, card_number):
+        card = self.cards.get(card_number)
+        return card if card is not None and self.access.allows(card) else None
+
+    def list_row(self, card):
+        values = self.visible_values(card)
+        return tuple(values[column] for column in CARD_LIST_COLUMNS)
+
+    def get_all_cards(self):
+        """Get all cards, newest first"""
+        return [self.list_row(card) for card in reversed(self.visible_cards())]
+
+    def get_cards_page(self, sort_field=None, descending=True, after=None, limit=PAGE_SIZE):
+        """Get one page of listing rows in a stable order, and the cursor of the next page"""
+        if sort_field is not None and sort_field not in SORT_KEYS:
+            raise ValueError(f"Cannot sort by {sort_field}")
+        cards = self.visible_cards()
+        if sort_field is None:
+            keys = sorted((self.rowids[card['card_number']], card['card_number']) for card in cards)
+        else:
+            keys = sorted((sort_value(sort_field, self.visible_values(card)[sort_field]), card['card_number'])
+                          for card in cards)
+        if descending:
+            end = len(keys) if after is None else bisect_left(keys, after)
+            page = keys[max(0, end - limit):end][::-1]
+        else:
+            start = 0 if after is None else bisect_right(keys, after)
+            page = keys[start:start + limit]
+        next_page = page[-1] if len(page) == limit else None
+        return [self.list_row(self.cards[number]) for _, number in page], next_page
+
+    def count_cards(self):
+        """Count all cards"""
+        return len(self.visible_cards())
+
+    def get_data_version(self):
+        """Number of audit events, which grows with every card change"""
+        return len(self.events)
+
+    def get_unpaid_sold_cards(self):
+        """Get (card_number, expected_price, sold_date, payment_mode, version) of sold cards without a payment"""
+        unpaid = [card for card in self.visible_cards()
+                  if str(card['pending'] or '').strip().lower().startswith('no') and not card['payment_received']]
+        unpaid.sort(key=lambda card: (card['sold_date'] or '', card['card_number']))
+        return [(card['card_number'], card['expected_price'], card['sold_date'], card['payment_mode'], card['version'])
+                for card in unpaid]
+
+    def get_card_totals(self):
+        """Get the card count and money totals of the whole inventory"""
+        totals = dict.fromkeys(CARD_TOTALS, 0.0)
+        cards = self.visible_cards()
+        totals['count'] = len(cards)
+        totals['unsold'] = 0
+        for card in cards:
+            values = self.card_values(card)
+            sold = str(card['pending'] or '').strip().lower().startswith('no')
+            totals['unsold'] += not sold
+            for column in ('denomination', 'purchase_price'):
+                totals[column] += values[column] or 0
+            profit = values['realized_profit'] if sold else values['profit']
+            totals['realized_profit' if sold else 'profit'] += profit or 0
+        for column in self.access.masked_columns().intersection(totals):
+            totals[column] = None
+        return totals
+
+    def unsold_cards(self):
+        return [card for card in self.visible_cards()
+                if not str(card['pending'] or '').strip().lower().startswith('no')]
+
+    def get_expiring_cards(self, before, limit=ALERT_ROWS):
+        """Get (count, [(card_number, brand, denomination, expiry_date)]) of unsold cards expiring by a date, soonest first"""
+        expiring = sorted((card['expiry_date'], card['card_number']) for card in self.unsold_cards()
+                          if card['expiry_date'] and card['expiry_date'] <= before)
+        return len(expiring), [(number, self.cards[number]['brand'], self.cards[number]['denomination'], expiry_date)
+                               for expiry_date, number in expiring[:limit]]
+
+    def get_aging_cards(self, purchased_before, limit=ALERT_ROWS):
+        """Get (count, [(card_number, brand, denomination, purchase_date)]) of unsold cards bought by a date, oldest first"""
+        aging = sorted((card['purchase_date'], card['card_number']) for card in self.unsold_cards()
+                       if card['purchase_date'] and card['purchase_date'] <= purchased_before)
+        return len(aging), [(number, self.cards[number]['brand'], self.cards[number]['denomination'], purchase_date)
+                            for purchase_date, number in aging[:limit]]
+
+    def get_aging_buckets(self, today=None):
+        """Get [(count, denomination, purchase_price, expected_price)] of the unsold cards per holding-age bucket"""
+        cutoffs = aging_cutoffs(today)
+        buckets = [[0, 0.0, 0.0, 0.0] for _ in range(len(cutoffs) + 2)]
+        for card in self.unsold_cards():
+            bucket = buckets[aging_bucket(card['purchase_date'], cutoffs)]
+            bucket[0] += 1
+            for i, column in enumerate(('denomination', 'purchase_price', 'expected_price'), 1):
+                bucket[i] += card[column] or 0
+        if 'purchase_price' in self.access.masked_columns():
+            for bucket in buckets:
+                bucket[2] = None
+        return [tuple(bucket) for bucket in buckets]
+
+    def query_cards(self, brand=None, pending=None, purchased_from=None, purchased_to=None):
+        """Get the listing rows matching all of the given filters, newest first"""
+        candidates = self.cards.keys()
+        if purchased_from is not None or purchased_to is not None:
+            low = bisect_left(self.by_purchase_date, (purchased_from,)) if purchased_from is not None else 0
+            high = (bisect_right(self.by_purchase_date, (purchased_to, float('inf')))
+                    if purchased_to is not None else len(self.by_purchase_date))
+            # Cards without a purchase date never match a date range, as in SQL
+            candidates = {number for date, _, number in self.by_purchase_date[low:high] if date}
+        if brand is not None:
+            candidates = self.by_brand.get(brand, set()) & candidates
+        matches = [self.cards[number] for number in candidates
+                   if (pending is None or self.cards[number]['pending'] == pending)
+                   and self.access.allows(self.cards[number])]
+        matches.sort(key=lambda card: self.rowids[card['card_number']], reverse=True)
+        return [self.list_row(card) for card in matches]
+
+    def update_card(self, card_number, card_data, expected_version=None):
+        """Update the given columns of a card, only if it is still at expected_version"""
+        if not any(column in card_data for column in UPDATABLE_COLUMNS):
+            return True, "No changes to save"
+        status = self.update_card_row(card_number, card_data, expected_version)
+        if status == 'denied':
+            return False, PERMISSION_DENIED
+        if status == 'missing':
+            return False, "Card not found"
+        if status == 'conflict':
+            return False, VERSION_CONFLICT
+        return True, "Card updated successfully"
+
+    def update_cards(self, updates):
+        """Apply (card_number, changes, expected_version) updates, returning the conflicting card numbers"""
+        if not self.access.can_edit:
+            return False, PERMISSION_DENIED
+        # Nothing is saved if one of the changes is not allowed
+        for card_number, changes, _ in updates:
+            card = self.visible_card(card_number)
+            columns = [column for column in UPDATABLE_COLUMNS if column in changes]
+            if card is not None and not self.access.may_change(card, columns):
+                return False, PERMISSION_DENIED
+        conflicts = [card_number for card_number, changes, expected_version in updates
+                     if self.update_card_row(card_number, changes, expected_version) != 'updated']
+        return True, conflicts
+
+    def update_card_row(self, card_number, card_data, expected_version):
+        card = self.visible_card(card_number)
+        if card is None:
+            return 'missing'
+        columns = [column for column in UPDATABLE_COLUMNS if column in card_data]
+        if not self.access.may_change(card, columns):
+            return 'denied'
+        if expected_version is not None and card['version'] != expected_version:
+            return 'conflict'
+        diff = {
+            column: [history_value(column, card[column]), history_value(column, card_data[column])]
+            for column in columns if card[column] != card_data[column]
+        }
+        self.unindex_card(card)
+        if 'card_image_path' in columns and card['card_image_path'] != card_data['card_image_path']:
+            self.image_status.pop(card_number, None)
+        for column in columns:
+            card[column] = card_data[column]
+        card['version'] += 1
+        self.index_card(card)
+        if diff:
+            self.record_event(card_number, 'update', diff)
+        return 'updated'
+
+    def record_event(self, card_number, event_type, changes):
+        event = {
+            'id': len(self.events) + 1, 'card_number': card_number, 'event_type': event_type,
+            'changes': copy.deepcopy(changes), 'created_at': utc_timestamp()
+        }
+        self.events.append(event)
+        self.event_times.append(event['created_at'])
+        self.events_by_card.setdefault(card_number, []).append(event)
+
+    def get_pricing_rules(self):
+        """Get every pricing rule as a dictionary, most specific first"""
+        return sorted((dict(rule) for rule in self.pricing_rules), key=pricing_rule_rank, reverse=True)
+
+    def add_pricing_rule(self, rule):
+        """Add a pricing rule; brand, source and band limits left empty match any card"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        rule, message = clean_pricing_rule(rule)
+        if rule is None:
+            return False, message
+        rule['id'] = self.next_rule_id
+        self.next_rule_id += 1
+        self.pricing_rules.append(rule)
+        return True, "Pricing rule added"
+
+    def delete_pricing_rule(self, rule_id):
+        """Delete a pricing rule"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        self.pricing_rules = [rule for rule in self.pricing_rules if rule['id'] != rule_id]
+        return True, "Pricing rule deleted"
+
+    def repricing(self):
+        """(card, percent, new expected price) of each card the pricing rules change, by card number"""
+        rules = self.get_pricing_rules()
+        changes = []
+        for card_number in sorted(self.cards):
+            card = self.cards[card_number]
+            rule = next((rule for rule in rules if pricing_rule_matches(rule, card)), None)
+            if rule is None or card['purchase_price'] is None:
+                continue
+            new_price = round(card['purchase_price'] * rule['percent'] / 100.0, 2)
+            if card['expected_price'] != new_price or card['expected_percent'] != rule['percent']:
+                changes.append((card, rule['percent'], new_price))
+        return changes
+
+    def preview_repricing(self, limit=PREVIEW_ROWS):
+        """Count the cards the pricing rules would change and list the first few"""
+        changes = self.repricing()
+        return {
+            'count': len(changes),
+            'profit_change': sum(new_price - (card['expected_price'] or 0) for card, _, new_price in changes),
+            'rows': [(card['card_number'], card['brand'], card['purchase_price'], card['expected_price'], new_price, percent)
+                     for card, percent, new_price in changes[:limit]],
+        }
+
+    def apply_pricing_rules(self):
+        """Reprice every unsold card matched by a rule"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        changes = self.repricing()
+        for card, percent, new_price in changes:
+            self.update_card_row(card['card_number'], {'expected_price': new_price, 'expected_percent': percent}, None)
+        return True, f"Repriced {len(changes)} card(s)"
+
+    def get_card_history(self, card_number):
+        """Get the audit events of a card, newest first; none for a card outside the session's rows"""
+        if self.access.row_filter()[0] and self.visible_card(card_number) is None:
+            return []
+        masked = self.access.masked_columns()
+        history = []
+        for event in reversed(self.events_by_card.get(card_number, [])):
+            event = {key: copy.deepcopy(event[key]) for key in ('id', 'event_type', 'changes', 'created_at')}
+            for column in masked.intersection(event['changes']):
+                value = event['changes'][column]
+                event['changes'][column] = [MASKED_VALUE, MASKED_VALUE] if isinstance(value, list) else MASKED_VALUE
+            history.append(event)
+        return history
+
+    def get_inventory_at(self, timestamp):
+        """Reconstruct every card as it was at a UTC 'YYYY-MM-DD HH:MM:SS' timestamp"""
+        if timestamp < self.created_at:
+            return None
+        inventory = {}
+        for event in self.events[:bisect_right(self.event_times, timestamp)]:
+            card_number = event['card_number']
+            if event['event_type'] == 'create':
+                inventory[card_number] = dict(event['changes'])
+            elif event['event_type'] == 'delete':
+                inventory.pop(card_number, None)
+            elif card_number in inventory:
+                for column, (_, new) in event['changes'].items():
+                    inventory[card_number][column] = new
+        return [self.access.mask(dict(card, card_number=card_number)) for card_number, card in inventory.items()
+                if self.access.allows(card)]
+
+    def delete_card(self, card_number):
+        """Delete a card"""
+        if not self.access.can_delete:
+            return False, PERMISSION_DENIED
+        card = self.visible_card(card_number)
+        if card is not None:
+            self.unindex_card(card)
+            key = normalize_card_number(card_number)
+            del self.key_owners[key]
+            for entries, entry in ((self.number_keys, (key, card_number)), (self.number_rkeys, (key[::-1], card_number))):
+                del entries[bisect_left(entries, entry)]
+            del self.cards[card_number]
+            del self.rowids[card_number]
+            self.image_status.pop(card_number, None)
+            self.record_event(card_number, 'delete', {})
+        return True, "Card deleted successfully"
+
+    def check_card_exists(self, card_number):
+        """Check if a card number already exists"""
+        return card_number in self.cards
+
+    def find_similar_card_numbers(self, card_number, max_distance=MAX_DISTANCE, window=NEIGHBOUR_WINDOW):
+        """Get [(card_number, distance)] of cards whose number is within max_distance edits, closest first"""
+        key = normalize_card_number(card_number)
+        candidates = []
+        for entries, value, step in ((self.number_keys, key, 1), (self.number_rkeys, key[::-1], -1)):
+            position = bisect_left(entries, (value,))
+            candidates += [(number, found[::step])
+                           for found, number in entries[max(0, position - window):position + window]]
+        return closest_card_numbers(key, candidates, max_distance)
+
+    def get_card_number_keys(self, reverse=False, after=None, limit=PAGE_SIZE):
+        """Get (key, card_number), or (reversed key, card_number), pairs in order after the pair after"""
+        entries = self.number_rkeys if reverse else self.number_keys
+        start = 0 if after is None else bisect_right(entries, tuple(after))
+        return entries[start:start + limit]
+
+    def get_card_fields(self, card_number, fields):
+        """Get only the requested columns of a card"""
+        fields = [field for field in fields if field in CARD_COLUMNS]
+        if not fields:
+            return {}
+        card = self.visible_card(card_number)
+        if card is None:
+            return None
+        values = self.visible_values(card)
+        return {field: values[field] for field in fields}
+
+    def get_cards_fields(self, card_numbers, fields):
+        """Get {card_number: values of the requested columns, in order} of many cards"""
+        fields = [field for field in fields if field in CARD_COLUMNS]
+        found = {}
+        for card_number in card_numbers:
+            card = self.visible_card(card_number)
+            if card is not None:
+                values = self.visible_values(card)
+                found[card_number] = tuple(values[field] for field in fields)
+        return found
+
+    def get_card_by_number(self, card_number):
+        """Get a specific card by card number"""
+        card = self.visible_card(card_number)
+        if card is None:
+            return None
+        values = self.visible_values(card)
+        return {column: values[column] for column in CARD_COLUMNS if column not in ('image_size', 'days_held')}
+
+    def get_image_paths(self):
+        """Get (card_number, card_image_path) of every card with an image"""
+        return [(number, card['card_image_path']) for number, card in list(self.cards.items()) if card['card_image_path']]
+
+    def update_image_status(self, updates):
+        """Write (image_exists, image_size, card_number, card_image_path), skipping changed paths"""
+        for exists, size, card_number, path in updates:
+            card = self.cards.get(card_number)
+            if card is not None and card['card_image_path'] == path:
+                self.image_status[card_number] = (exists, size)
+        return True
+
+    def get_pins(self):
+        """Get the stored (possibly encrypted) PIN of every card that has one and the session may read"""
+        return {card['card_number']: card['pin'] for card in self.visible_cards()
+                if card['pin'] and self.access.pin_visible(card)}
+
+    def get_pins_to_rekey(self, active_prefix, after_rowid, limit):
+        """Get the next batch of PINs not encrypted under the active key, in rowid order"""
+        batch = []
+        for card_number, card in self.cards.items():
+            rowid = self.rowids[card_number]
+            if rowid > after_rowid and card['pin'] and not card['pin'].startswith(active_prefix):
+                batch.append((rowid, card_number, card['pin']))
+                if len(batch) == limit:
+                    break
+        return batch
+
+    def update_pins(self, updates):
+        """Write (pin, card_number, previous pin) triples, skipping PINs changed meanwhile"""
+        for pin, card_number, previous in updates:
+            card = self.cards.get(card_number)
+            if card is not None and card['pin'] == previous:
+                card['pin'] = pin
+        return True
+
+    def get_vault_settings(self):
+        """Get the PIN vault settings and wrapped keys, or None if no vault is set up"""
+        return copy.deepcopy(self.vault_settings)
+
+    def save_vault_settings(self, settings):
+        """Replace the PIN vault settings and wrapped keys"""
+        self.vault_settings = copy.deepcopy(settings)
+        return True
+
+    def set_user(self, name):
+        """Start a session as a user, or with full access for None"""
+        if name is None:
+            self.access = Access()
+            return True, "Full access"
+        user = self.users.get(name)
+        if user is None:
+            return False, f"Unknown user {name}"
+        self.access = Access(name, user['source'], self.roles[user['role']])
+        return True, f"Signed in as {name}"
+
+    def get_roles(self):
+        """Get every role as a dictionary of ROLE_COLUMNS"""
+        return [dict(self.roles[name]) for name in sorted(self.roles)]
+
+    def get_users(self):
+        """Get every user as a dictionary of USER_COLUMNS"""
+        return [dict(self.users[name]) for name in sorted(self.users)]
+
+    def save_user(self, name, role, source=""):
+        """Add a user or change an existing user's role and source"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        name = (name or "").strip()
+        if not name:
+            return False, "User name is required"
+        if role not in self.roles:
+            return False, f"Unknown role {role}"
+        self.users[name] = {'name': name, 'role': role, 'source': (source or "").strip()}
+        return True, f"User {name} saved"
+
+    def delete_user(self, name):
+        """Delete a user other than the session's own"""
+        if not self.access.administer:
+            return False, PERMISSION_DENIED
+        if name == self.access.user:
+            return False, "You cannot delete your own user"
+        self.users.pop(name, None)
+        return True, "User deleted"
+
+
+def open_storage(path="giftcards.db", tracer=None):
+    """Open the card store at path; MEMORY_PATH gives a fresh in-memory store
+
+    The SQL tracer only applies to SQLite stores.
+    """
+    if path == MEMORY_PATH:
+        return InMemoryStorage()
+    return DatabaseManager(path, tracer=tracer)
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication
+
+from database import DatabaseManager
+from storage import InMemoryStorage
+
+# Budgets are multiplied by this, for slower machines than the ones they were set on
+LATENCY_BUDGET_SCALE = float(os.environ.get("LATENCY_BUDGET_SCALE", "1"))
+
+# (test, operation, milliseconds, budget) of every operation timed by the latency fixture
+LATENCIES = []
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    app = QApplication.instance() or QApplication([])
+    yield app
+
+
+@pytest.fixture
+def window(qapp, tmp_path, monkeypatch):
+    """A main window working on an empty database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    from main_app import GiftCardApp
+    window = GiftCardApp()
+    yield window
+    window.close()
+    qapp.processEvents()
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def storage(request, tmp_path):
+    """An empty card store, once per storage engine"""
+    if request.param == "sqlite":
+        return DatabaseManager(str(tmp_path / "cards.db"))
+    return InMemoryStorage()
+
+
+@pytest.fixture
+def latency(request):
+    """Time a block as a named operation, failing the test if it takes longer than its budget in milliseconds"""
+    @contextmanager
+    def timed(operation, budget_ms):
+        start = time.perf_counter()
+        yield
+        elapsed = (time.perf_counter() - start) * 1000
+        budget = budget_ms * LATENCY_BUDGET_SCALE
+        LATENCIES.append((request.node.name, operation, elapsed, budget))
+        assert elapsed <= budget, f"{operation} took {elapsed:.0f} ms, over its {budget:.0f} ms budget"
+    return timed
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not LATENCIES:
+        return
+    terminalreporter.section("operation latency")
+    for test, operation, elapsed, budget in LATENCIES:
+        terminalreporter.write_line(f"{test:<40} {operation:<12} {elapsed:>9.1f} ms  (budget {budget:.0f} ms)")
@@ -0,0 +1,20 @@
+def make_card(number, **overrides):
+    card = {
+        'card_number': f"CARD{number:06d}", 'brand': "Amazon", 'pin': "", 'denomination': 50.0,
+        'purchase_price': 40.0, 'expected_price': 45.0, 'expected_percent': 112.5,
+        'source': "Gift", 'card_image_path': "", 'purchase_date': "2024-01-01",
+        'pending': "Yes" if number % 2 else "No", 'sold_date': "", 'payment_received': 0.0,
+        'payment_mode': "",
+    }
+    card.update(overrides)
+    return card
+
+
+def wait_until(qapp, condition, timeout=5.0):
+    """Process Qt events until condition() holds, for signals sent from worker threads"""
+    import time
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.01)
+    return condition()
@@ -0,0 +1,118 @@
+import sqlite3
+
+from factories import make_card
+from access import PERMISSION_DENIED
+from database import DatabaseManager
+
+
+def sign_up(storage):
+    for name, role, source in (("alice", "buyer", ""), ("bob", "buyer", ""), ("sam", "seller", "shop"),
+                               ("ann", "accountant", "")):
+        assert storage.save_user(name, role, source)[0]
+
+
+def test_buyers_see_and_change_only_their_own_cards(storage):
+    sign_up(storage)
+    assert storage.set_user("alice")[0]
+    storage.add_cards([make_card(1, pin="1111"), make_card(2)])
+    assert storage.set_user("bob")[0]
+    storage.add_card(make_card(3, pin="3333"))
+
+    assert [row[0] for row in storage.get_all_cards()] == ["CARD000003"]
+    assert storage.count_cards() == 1 and storage.get_card_totals()['count'] == 1
+    assert storage.get_card_by_number("CARD000001") is None
+    assert storage.get_card_by_number("CARD000003")['owner'] == "bob"
+    assert storage.get_cards_fields(["CARD000001", "CARD000003"], ['pin']) == {"CARD000003": ("3333",)}
+    assert storage.get_pins() == {"CARD000003": "3333"}
+    assert storage.get_card_history("CARD000001") == []
+    assert storage.update_card("CARD000001", {'brand': "Target"}) == (False, "Card not found")
+    assert storage.update_card("CARD000003", {'owner': "alice"}) == (False, PERMISSION_DENIED)
+    assert storage.delete_card("CARD000003") == (False, PERMISSION_DENIED)
+
+    # Administrators see everything, without a user or signed in as one
+    storage.set_user(None)
+    assert storage.count_cards() == 3
+    assert storage.save_user("root", "admin")[0] and storage.set_user("root")[0]
+    assert sorted(card['card_number'] for card in storage.get_inventory_at("9999-12-31 00:00:00")) == [
+        "CARD000001", "CARD000002", "CARD000003"]
+
+
+def test_sellers_see_their_source_without_costs(storage):
+    storage.add_cards([make_card(1, source="Shop", pin="1111"), make_card(2, source="Other")])
+    sign_up(storage)
+    storage.set_user("sam")
+
+    rows = storage.get_all_cards()
+    assert [row[0] for row in rows] == ["CARD000001"]
+    card = storage.get_card_by_number("CARD000001")
+    assert card['pin'] == "1111" and card['purchase_price'] is None and card['profit'] is None
+    assert card['expected_price'] == 45.0
+    totals = storage.get_card_totals()
+    assert totals['purchase_price'] is None and totals['denomination'] == 50.0
+    assert storage.get_aging_buckets("2024-06-01")[4][2] is None
+    assert storage.get_cards_page('purchase_price')[0][0][0] == "CARD000001"
+
+    assert storage.add_card(make_card(5)) == (False, PERMISSION_DENIED)
+    assert storage.update_card("CARD000001", {'purchase_price': 1.0}) == (False, PERMISSION_DENIED)
+    assert storage.update_cards([("CARD000001", {'purchase_price': 1.0}, None)]) == (False, PERMISSION_DENIED)
+    assert storage.update_card("CARD000001", {'pending': "No"})[0]
+    history = storage.get_card_history("CARD000001")
+    assert history[-1]['changes']['purchase_price'] == "***"
+    assert storage.apply_pricing_rules() == (False, PERMISSION_DENIED)
+    assert storage.save_user("eve", "admin") == (False, PERMISSION_DENIED)
+
+
+def test_accountants_never_read_pins(storage):
+    storage.add_card(make_card(1, pin="1111"))
+    sign_up(storage)
+    storage.set_user("ann")
+
+    assert storage.get_card_by_number("CARD000001")['pin'] is None
+    assert storage.get_card_fields("CARD000001", ['pin', 'profit'])['profit'] == 5.0
+    assert storage.get_pins() == {}
+    assert storage.update_card("CARD000001", {'pin': "0000"}) == (False, PERMISSION_DENIED)
+    assert storage.set_user("nobody") == (False, "Unknown user nobody")
+
+
+def test_owner_scope_reads_its_index(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    db.add_cards([make_card(i) for i in range(20)])
+    db.save_user("alice", "buyer")
+    db.set_user("alice")
+    statements = []
+    connect = db._connect
+
+    def traced():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    db._connect = traced
+    assert db.get_cards_page()[0] == []
+
+    conn = sqlite3.connect(db.db_path)
+    plan = " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statements[-1]))
+    assert "idx_cards_owner" in plan
+
+
+def test_window_offers_only_what_the_role_allows(qapp, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from main_app import GiftCardApp, sign_in
+    from card_model import COLUMNS
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    db.add_card(make_card(1, source="Shop"))
+    sign_up(db)
+    assert sign_in(db, "sam")
+
+    window = GiftCardApp(storage=db)
+    try:
+        assert window.windowTitle().endswith("sam (seller)")
+        assert not window.add_tab.add_button.isEnabled() and not window.view_tab.delete_button.isEnabled()
+        assert window.view_tab.save_button.isEnabled() and not window.users_action.isEnabled()
+        hidden = {field for column, (_, field, _) in enumerate(COLUMNS) if window.view_tab.table.isColumnHidden(column)}
+        assert hidden == {'purchase_price', 'discount_percent', 'profit', 'realized_profit'}
+        window.view_tab.model.load(db)
+        assert window.view_tab.model.card_numbers([0]) == ["CARD000001"]
+    finally:
+        window.close()
+        qapp.processEvents()
@@ -0,0 +1,89 @@
+import sqlite3
+
+from factories import make_card, wait_until
+from aging import check_aging, format_aging_report
+from database import DatabaseManager, aging_bucket_labels
+
+
+def unsold(number, purchase_date, **overrides):
+    return make_card(number, **dict({'pending': "Yes", 'purchase_date': purchase_date}, **overrides))
+
+
+def test_alerts_flag_expiring_and_old_unsold_cards(storage):
+    storage.add_cards([
+        unsold(1, "2024-05-20", expiry_date="2024-06-10"),
+        unsold(2, "2024-05-25", expiry_date="2024-05-30"),
+        unsold(3, "2024-05-25", expiry_date="2024-09-01"),
+        unsold(4, "2024-03-01"),
+        unsold(5, "2024-01-15"),
+        make_card(6, pending="No", purchase_date="2023-01-01", expiry_date="2024-06-01"),
+    ])
+
+    result = check_aging(storage, today="2024-06-01")
+    assert result['expiring'] == (2, [("CARD000002", "Amazon", 50.0, "2024-05-30"),
+                                      ("CARD000001", "Amazon", 50.0, "2024-06-10")])
+    assert [card[0] for card in result['aging'][1]] == ["CARD000005", "CARD000004"]
+
+    # Sold cards leave the alerts
+    storage.update_card("CARD000005", {'pending': "No", 'sold_date': "2024-06-01"}, 0)
+    assert check_aging(storage, today="2024-06-01")['aging'][0] == 1
+
+
+def test_buckets_total_the_unsold_cards_by_days_held(storage):
+    storage.add_cards([
+        unsold(1, "2024-05-20"),
+        unsold(2, "2024-04-20", denomination=100.0),
+        unsold(3, "2024-04-01"),
+        unsold(4, "2023-06-01"),
+        unsold(5, ""),
+        make_card(6, pending="No", purchase_date="2024-05-20"),
+    ])
+
+    buckets = storage.get_aging_buckets("2024-06-01")
+    assert len(buckets) == len(aging_bucket_labels())
+    assert [bucket[0] for bucket in buckets] == [1, 1, 1, 0, 1, 1]
+    assert buckets[1] == (1, 100.0, 40.0, 45.0)
+    report = format_aging_report(check_aging(storage, today="2024-06-01", report=True))
+    assert "31-60 days" in report and "Over 180 days" in report
+
+
+def test_aging_queries_read_only_the_partial_indexes(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    db.add_cards([unsold(i, f"2024-0{i % 5 + 1}-01", expiry_date="2024-07-01") for i in range(20)])
+    statements = []
+    connect = db._connect
+
+    def traced():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    db._connect = traced
+    check_aging(db, today="2024-06-01", report=True)
+
+    conn = sqlite3.connect(db.db_path)
+    plans = [" ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)) for sql in statements]
+    assert len(plans) == 5
+    for plan in plans:
+        assert "idx_cards_unsold_" in plan
+        assert "SCAN cards" not in plan.replace("SCAN cards USING COVERING INDEX", "")
+
+
+def test_expiry_date_is_entered_and_flagged_without_a_dialog(window, qapp):
+    window.add_tab.expiry_date_input.set_date_text("2024-06-10")
+    assert window.add_tab.get_form_data()['expiry_date'] == "2024-06-10"
+    window.add_tab.clear_form()
+    assert window.add_tab.get_form_data()['expiry_date'] == ""
+
+    window.db_manager.add_card(unsold(1, "2024-01-01", expiry_date="2024-01-31"))
+    window.aging_monitor.start()
+    assert wait_until(qapp, lambda: window.aging_label.text())
+    assert window.aging_label.text() == "1 card(s) expire within 30 days, 1 card(s) pending over 60 days"
+    assert "Aging Report" in window.statusBar().currentMessage()
+
+    # The same cards are not announced again
+    window.statusBar().clearMessage()
+    window.aging_monitor.start()
+    window.aging_monitor.wait()
+    qapp.processEvents()
+    assert window.statusBar().currentMessage() == ""
@@ -0,0 +1,66 @@
+import csv
+import io
+
+from PyQt6.QtCore import QItemSelectionModel
+from PyQt6.QtGui import QGuiApplication
+
+from factories import make_card
+from selection_copy import copy_columns, selection_mime_data
+
+
+def test_many_cards_are_fetched_in_one_call(storage):
+    storage.add_cards([make_card(i, brand=f"Brand\t{i}") for i in range(3000)])
+    numbers = [f"CARD{i:06d}" for i in range(2999, -1, -7)] + ["MISSING"]
+
+    found = storage.get_cards_fields(numbers, ['brand', 'profit', 'nonsense'])
+    assert len(found) == len(numbers) - 1
+    assert found["CARD000010"] == ("Brand\t10", 5.0)
+
+
+def test_raw_values_are_copied_in_three_formats(storage):
+    storage.add_cards([make_card(1, brand='Say "hi", <b>', pin="1234"), make_card(2, brand="Line\nbreak")])
+
+    mime, count = selection_mime_data(storage, ["CARD000002", "CARD000001"],
+                                      unsaved={"CARD000001": {'source': "Edited"}})
+    assert count == 2
+    headers = [header for header, _ in copy_columns()]
+    assert "PIN" not in headers
+
+    tsv = mime.text().splitlines()
+    assert tsv[0].split("\t") == headers
+    assert tsv[1].startswith("CARD000002\tLine break\t50.0\t40.0\t")
+
+    rows = list(csv.reader(io.StringIO(bytes(mime.data("text/csv")).decode('utf-8'))))
+    assert rows[2][:2] == ["CARD000001", 'Say "hi", <b>']
+    assert rows[2][headers.index("Source")] == "Edited"
+    assert rows[1][1] == "Line\nbreak"
+    assert "<td>Say &quot;hi&quot;, &lt;b&gt;</td>" in mime.html()
+
+    mime, _ = selection_mime_data(storage, ["CARD000001"], reveal_pin=lambda card_number, pin: pin[::-1])
+    assert mime.text().splitlines()[1].split("\t")[2] == "4321"
+
+
+def test_selected_rows_go_to_the_clipboard(window, qapp, monkeypatch):
+    import ui_components
+    window.db_manager.add_cards([make_card(i, pin=f"PIN{i}") for i in range(10)])
+    window.tabs.setCurrentIndex(1)
+    view = window.view_tab
+    selection = view.table.selectionModel()
+    for row in (4, 1, 2):
+        selection.select(view.model.index(row, 0),
+                         QItemSelectionModel.SelectionFlag.Select | QItemSelectionModel.SelectionFlag.Rows)
+
+    view.copy_selected_rows_to_clipboard()
+    lines = QGuiApplication.clipboard().text().splitlines()
+    assert [line.split("\t")[0] for line in lines[1:]] == view.model.card_numbers([1, 2, 4])
+    assert "PIN1" not in QGuiApplication.clipboard().text()
+
+    # PINs need a confirmation, and the clipboard is left alone without one
+    answers = [ui_components.QMessageBox.StandardButton.No, ui_components.QMessageBox.StandardButton.Yes]
+    monkeypatch.setattr(ui_components.QMessageBox, "question", lambda *args: answers.pop(0))
+    monkeypatch.setattr(window, "unlock_pin_vault", lambda: True)
+    view.copy_selected_rows_to_clipboard(include_pins=True)
+    assert "PIN" not in QGuiApplication.clipboard().text().splitlines()[0].split("\t")
+    view.copy_selected_rows_to_clipboard(include_pins=True)
+    first = QGuiApplication.clipboard().text().splitlines()[1].split("\t")
+    assert first[2] == f"PIN{int(first[0][4:])}"
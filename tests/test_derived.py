@@ -0,0 +1,66 @@
+import sqlite3
+from datetime import date, timedelta
+
+from PyQt6.QtCore import Qt
+
+from card_model import COLUMNS, CardTableModel
+from database import DERIVED_FIELDS, DatabaseManager
+from factories import make_card
+
+
+def test_derived_values_follow_the_stored_columns(storage):
+    storage.add_card(make_card(1, denomination=50.0, purchase_price=40.0, expected_price=45.0,
+                               payment_received=46.0, purchase_date="2024-01-01", sold_date="2024-01-31"))
+    assert storage.get_card_fields("CARD000001", DERIVED_FIELDS) == {
+        'profit': 5.0, 'realized_profit': 6.0, 'discount_percent': 20.0, 'days_held': 30
+    }
+
+    storage.update_card("CARD000001", {'purchase_price': 30.0, 'denomination': 0.0})
+    assert storage.get_card_fields("CARD000001", DERIVED_FIELDS) == {
+        'profit': 15.0, 'realized_profit': 16.0, 'discount_percent': None, 'days_held': 30
+    }
+
+
+def test_unsold_cards_are_held_until_today(storage):
+    bought = (date.today() - timedelta(days=10)).isoformat()
+    storage.add_card(make_card(1, purchase_date=bought, sold_date=""))
+    # date('now') is UTC, which may already be a day ahead of local time
+    assert storage.get_card_fields("CARD000001", ['days_held'])['days_held'] in (10, 11)
+
+
+def test_listing_rows_carry_derived_values(storage):
+    storage.add_card(make_card(1, purchase_price=35.0))
+    model = CardTableModel()
+    model.load(storage)
+    card = model.card_at(0)
+    assert (card['profit'], card['discount_percent']) == (10.0, 30.0)
+
+    editable = {field for column, (_, field, _) in enumerate(COLUMNS)
+                if model.flags(model.index(0, column)) & Qt.ItemFlag.ItemIsEditable}
+    assert 'purchase_price' in editable
+    assert not editable & set(DERIVED_FIELDS)
+
+
+def test_stored_profit_is_migrated_to_a_generated_column(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cards (id INTEGER PRIMARY KEY AUTOINCREMENT, card_number TEXT UNIQUE NOT NULL, "
+                 "balance REAL NOT NULL, expected_price REAL, purchase_price REAL, profit REAL, "
+                 "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    # A profit that went stale when the prices were edited
+    conn.execute("INSERT INTO cards (card_number, balance, expected_price, purchase_price, profit) "
+                 "VALUES ('CARD000001', 50, 45, 30, 5)")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(path)
+    assert db.get_card_fields("CARD000001", ['profit']) == {'profit': 15.0}
+    conn = sqlite3.connect(path)
+    hidden = {row[1]: row[6] for row in conn.execute("PRAGMA table_xinfo(cards)")}
+    plan = [row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT card_number FROM cards ORDER BY IFNULL(profit, 0), card_number")]
+    conn.close()
+    assert hidden['profit'] == hidden['realized_profit'] == hidden['discount_percent'] == 2
+    assert any("idx_cards_sort_profit" in step for step in plan), plan
+    # Reopening leaves the migrated table alone
+    DatabaseManager(path)
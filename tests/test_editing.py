@@ -0,0 +1,57 @@
+from PyQt6.QtWidgets import QMessageBox
+
+import main_app
+import ui_components
+from card_model import COLUMNS
+from factories import make_card
+from ui_components import values_differ
+
+
+def column_of(field):
+    return next(i for i, column in enumerate(COLUMNS) if column[1] == field)
+
+
+def test_null_numbers_match_the_form_default():
+    assert not values_differ(None, 0.0)
+    assert not values_differ(None, "")
+    assert not values_differ(None, None)
+    assert values_differ(None, 12.5)
+    assert values_differ(45.0, 0.0)
+
+
+def test_failed_merge_keeps_edits_and_reports_them(window, monkeypatch):
+    window.db_manager.add_cards([make_card(1), make_card(2)])
+    window.tabs.setCurrentIndex(1)
+    model = window.view_tab.model
+    for number in ("CARD000001", "CARD000002"):
+        model.setData(model.index(model.row_by_card[number], column_of('brand')), "Target")
+    # Someone else changes the same column of one card meanwhile
+    window.db_manager.update_card("CARD000001", {'brand': "Walmart"})
+
+    messages = []
+    monkeypatch.setattr(ui_components.QMessageBox, "question",
+                        lambda *args: QMessageBox.StandardButton.Cancel)
+    monkeypatch.setattr(main_app.QMessageBox, "warning", lambda *args: messages.append(("warning", args[2])))
+    monkeypatch.setattr(main_app.QMessageBox, "information", lambda *args: messages.append(("info", args[2])))
+    window.save_changes()
+
+    assert [kind for kind, _ in messages] == ["warning"]
+    assert "CARD000001" in messages[0][1] and "1 card(s) saved" in messages[0][1]
+    assert [number for number, _, _ in model.get_pending_updates()] == ["CARD000001"]
+    assert window.db_manager.get_card_fields("CARD000002", ['brand', 'version']) == {'brand': "Target", 'version': 1}
+    assert model.card_at(model.row_by_card["CARD000002"])['version'] == 1
+
+
+def test_edit_dialog_is_reused_for_another_card(qapp):
+    from ui_components import EditCardDialog
+    dialog = EditCardDialog(None, make_card(1, brand="Amazon", expected_price=45.0), None)
+    dialog.new_image_selected = True
+    dialog.history_list.addItem("old history")
+
+    dialog.load_card(make_card(2, brand="Target", expected_price=48.0, purchase_price=40.0))
+    data = dialog.get_form_data()
+    assert (data['card_number'], data['brand'], data['expected_price']) == ("CARD000002", "Target", 48.0)
+    assert not dialog.new_image_selected
+    assert dialog.history_list.count() == 0
+    qapp.processEvents()
+    assert dialog.profit_label.text() == "$8.00"
@@ -0,0 +1,68 @@
+import pytest
+from PyQt6.QtWidgets import QComboBox, QDoubleSpinBox, QLabel
+
+from form_state import AMOUNT_MODE, PERCENT_MODE, PriceFormState
+
+
+@pytest.fixture
+def form(qapp):
+    def spin_box():
+        box = QDoubleSpinBox()
+        box.setMaximum(999999.99)
+        return box
+
+    purchase, expected, percent = spin_box(), spin_box(), spin_box()
+    mode = QComboBox()
+    mode.addItems(["Amount ($)", "Percent (%)"])
+    profit = QLabel()
+    state = PriceFormState(purchase, expected, percent, mode, profit)
+    edits = []
+    state.expected_price_edited.connect(edits.append)
+    return state, edits
+
+
+def test_edits_in_one_tick_are_recomputed_once(form, qapp):
+    state, edits = form
+    state.purchase_price_input.setValue(40)
+    state.expected_price_input.setValue(50)
+    # Nothing is recomputed until the event loop runs
+    assert state.expected_percent_input.value() == 0
+    qapp.processEvents()
+
+    assert state.expected_percent_input.value() == 125
+    assert state.profit_label.text() == "$10.00"
+    assert state.profit_label.property("negative") is False
+    assert edits == [50.0]
+
+
+def test_percent_drives_the_price_in_percent_mode(form, qapp):
+    state, edits = form
+    state.purchase_price_input.setValue(40)
+    state.expected_price_mode.setCurrentIndex(PERCENT_MODE)
+    state.expected_percent_input.setValue(90)
+    qapp.processEvents()
+    assert state.expected_price_input.value() == 36
+    assert state.profit_label.text() == "$-4.00"
+    assert state.profit_label.property("negative") is True
+
+    # A new purchase price keeps the visible percent and moves the price
+    state.purchase_price_input.setValue(50)
+    qapp.processEvents()
+    assert state.expected_percent_input.value() == 90
+    assert state.expected_price_input.value() == 45
+    assert edits == [36.0, 45.0]
+
+
+def test_loaded_values_are_not_recomputed(form, qapp):
+    state, edits = form
+    state.expected_price_mode.setCurrentIndex(AMOUNT_MODE)
+    for box, value in ((state.purchase_price_input, 40), (state.expected_price_input, 44),
+                       (state.expected_percent_input, 112.5)):
+        box.blockSignals(True)
+        box.setValue(value)
+        box.blockSignals(False)
+    state.load()
+    qapp.processEvents()
+    assert state.expected_percent_input.value() == 112.5
+    assert state.profit_label.text() == "$4.00"
+    assert edits == []
@@ -0,0 +1,37 @@
+import sqlite3
+
+import database
+from database import DatabaseManager, SNAPSHOT_KEEP
+from factories import make_card
+
+
+def snapshot_events(db):
+    conn = sqlite3.connect(db.db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT last_event_id FROM card_snapshots ORDER BY last_event_id")]
+    finally:
+        conn.close()
+
+
+def test_snapshots_run_in_background_and_are_thinned(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SNAPSHOT_INTERVAL", 5)
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    for i in range(200):
+        db.add_card(make_card(i))
+        db.wait_for_snapshot()
+
+    events = snapshot_events(db)
+    assert events[0] == 0 and events[-1] >= 195
+    # The newest few, one per doubling of age and the baseline, not one per 5 events
+    assert len(events) <= SNAPSHOT_KEEP + (200 // 5).bit_length() + 1
+    assert [card['card_number'] for card in db.get_inventory_at("9999-12-31 23:59:59")] == [
+        f"CARD{i:06d}" for i in range(200)
+    ]
+
+
+def test_mutations_do_not_snapshot_below_the_interval(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    db.add_cards([make_card(i) for i in range(50)])
+    assert db.snapshot_thread is None
+    assert db.last_event_id == 50
+    assert snapshot_events(db) == [0]
@@ -0,0 +1,89 @@
+import os
+import time
+
+from card_model import IMAGE_COLUMN, ImagePathRole
+from factories import make_card, wait_until
+from image_reconciler import format_reconcile_report, reconcile_images
+
+
+def write_file(path, size=10, age=3600):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    past = time.time() - age
+    os.utime(path, (past, past))
+    return str(path)
+
+
+def fields(storage, number):
+    return storage.get_card_fields(f"CARD{number:06d}", ['image_exists', 'image_size'])
+
+
+def test_missing_and_orphaned_files_are_found(storage, tmp_path):
+    images = tmp_path / "card_images"
+    present = write_file(images / "CARD000001_a.jpg", size=123)
+    write_file(images / "thumbs" / "CARD000001_a.jpg")
+    orphan = write_file(images / "old.jpg")
+    orphan_thumb = write_file(images / "thumbs" / "old.jpg")
+    # Still being ingested, so not an orphan yet
+    write_file(images / "fresh.jpg", age=0)
+    storage.add_cards([
+        make_card(1, card_image_path=present),
+        make_card(2, card_image_path=str(images / "gone.jpg")),
+        make_card(3),
+    ])
+
+    result = reconcile_images(storage, str(images))
+
+    assert result['checked'] == 2
+    assert result['missing'] == [("CARD000002", str(images / "gone.jpg"))]
+    assert result['orphans'] == [orphan, orphan_thumb]
+    assert result['quarantined'] == []
+    assert fields(storage, 1) == {'image_exists': 1, 'image_size': 123}
+    assert fields(storage, 2) == {'image_exists': 0, 'image_size': None}
+    assert fields(storage, 3) == {'image_exists': None, 'image_size': None}
+    assert "1 missing" in format_reconcile_report(result)
+
+
+def test_orphans_are_quarantined(storage, tmp_path):
+    images = tmp_path / "card_images"
+    write_file(images / "old.jpg")
+    write_file(images / "thumbs" / "old.jpg")
+    write_file(images / "quarantine" / "old.jpg")
+
+    result = reconcile_images(storage, str(images), quarantine=True)
+
+    assert sorted(os.listdir(images)) == ["quarantine", "thumbs"]
+    assert os.listdir(images / "thumbs") == []
+    assert sorted(os.listdir(images / "quarantine")) == ["old.jpg", "old_1.jpg", "thumbs"]
+    assert len(result['quarantined']) == 2
+
+
+def test_changing_the_image_clears_the_cached_status(storage, tmp_path):
+    images = tmp_path / "card_images"
+    path = write_file(images / "a.jpg")
+    storage.add_card(make_card(1, card_image_path=path))
+    reconcile_images(storage, str(images))
+    version = storage.get_card_fields("CARD000001", ['version'])['version']
+    assert fields(storage, 1)['image_exists'] == 1
+
+    storage.update_card("CARD000001", {'card_image_path': str(images / "b.jpg")}, version)
+    assert fields(storage, 1) == {'image_exists': None, 'image_size': None}
+    # A status checked against the old path is not applied
+    storage.update_image_status([(1, 10, "CARD000001", path)])
+    assert fields(storage, 1)['image_exists'] is None
+
+
+def test_missing_images_are_not_decoded(window, qapp, tmp_path):
+    window.db_manager.add_card(make_card(1, card_image_path=str(tmp_path / "gone.jpg")))
+    window.tabs.setCurrentIndex(1)
+    model = window.view_tab.model
+    results = []
+    window.image_reconciler.finished.connect(lambda result, interactive: results.append(result))
+
+    window.image_reconciler.start()
+    assert wait_until(qapp, lambda: results)
+    qapp.processEvents()
+
+    image = model.index(0, IMAGE_COLUMN)
+    assert model.data(image) == "Missing"
+    assert model.data(image, ImagePathRole) == ""
@@ -0,0 +1,71 @@
+from PyQt6.QtCore import QBuffer, QIODevice, QSize
+from PyQt6.QtGui import QColor, QImage
+
+from factories import make_card, wait_until
+from image_handler import ImageHandler
+from thumbnails import ThumbnailLoader
+
+
+def write_png(path, truncate=False):
+    image = QImage(QSize(64, 48), QImage.Format.Format_RGB32)
+    image.fill(QColor("red"))
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    data = bytes(buffer.data())
+    path.write_bytes(data[:60] if truncate else data)
+    return str(path)
+
+
+def test_failed_ingestion_unlinks_the_card_image(window, qapp, tmp_path):
+    handler = window.image_handler
+    handler.selected_image_path = write_png(tmp_path / "broken.png", truncate=True)
+    window.db_manager.add_card(make_card(1))
+    path = handler.save_image("CARD000001")
+    window.db_manager.update_card("CARD000001", {'card_image_path': path})
+    window.tabs.setCurrentIndex(1)
+
+    warnings = []
+    import main_app
+    original = main_app.QMessageBox.warning
+    main_app.QMessageBox.warning = lambda *args: warnings.append(args[2])
+    try:
+        assert wait_until(qapp, lambda: warnings)
+    finally:
+        main_app.QMessageBox.warning = original
+
+    assert warnings and "CARD000001" in warnings[0]
+    assert window.db_manager.get_card_fields("CARD000001", ['card_image_path']) == {'card_image_path': ""}
+    assert window.view_tab.model.image_path(0) == ""
+
+
+def test_successful_ingestion_reports_no_error(qapp, tmp_path):
+    handler = ImageHandler(str(tmp_path / "images"))
+    finished = []
+    handler.ingest_finished.connect(lambda *args: finished.append(args))
+    handler.selected_image_path = write_png(tmp_path / "card.png")
+    try:
+        path = handler.save_image("CARD000001")
+        assert wait_until(qapp, lambda: finished)
+    finally:
+        handler.shutdown()
+    assert finished == [("CARD000001", path, "")]
+
+
+def test_missing_thumbnails_are_retried(qapp, tmp_path):
+    handler = ImageHandler(str(tmp_path / "images"))
+    loader = ThumbnailLoader(handler)
+    try:
+        path = str(tmp_path / "images" / "late.png")
+        loader.request([path])
+        assert wait_until(qapp, lambda: path not in loader.pending)
+        assert path not in loader.cache and path not in loader.pending
+
+        # The ingestion finished meanwhile, so the next request finds the file
+        write_png(tmp_path / "images" / "late.png")
+        loader.request([path])
+        assert wait_until(qapp, lambda: path in loader.cache)
+        assert not loader.pixmap(path).isNull()
+    finally:
+        loader.shutdown()
+        handler.shutdown()
@@ -0,0 +1,95 @@
+from factories import make_card, wait_until
+from intake_journal import IntakeJournal
+from rapid_entry import IntakeWriter
+from storage import InMemoryStorage
+
+
+class LockedStorage(InMemoryStorage):
+    """Reports the database as locked for the first few writes"""
+
+    def __init__(self, locked_writes):
+        super().__init__()
+        self.locked_writes = locked_writes
+
+    def add_cards(self, cards):
+        if self.locked_writes:
+            self.locked_writes -= 1
+            return [(card['card_number'], False, "database is locked") for card in cards]
+        return super().add_cards(cards)
+
+    def update_cards(self, updates):
+        if self.locked_writes:
+            self.locked_writes -= 1
+            return False, "database is locked"
+        return super().update_cards(updates)
+
+
+def test_unacknowledged_entries_survive_a_crash(tmp_path):
+    path = str(tmp_path / "intake.jsonl")
+    journal = IntakeJournal(path)
+    first = journal.append('add', make_card(1))
+    journal.append('add', make_card(2))
+    journal.acknowledge([first['seq']])
+    journal.sync()
+    journal.close()
+    with open(path, 'a') as torn:
+        torn.write('{"seq": 3, "op": "ad')
+
+    pending = IntakeJournal(path).pending
+    assert [(entry['seq'], entry['data']['card_number']) for entry in pending] == [(2, "CARD000002")]
+
+
+def test_writer_waits_out_a_locked_database(qapp, tmp_path):
+    storage = LockedStorage(locked_writes=2)
+    writer = IntakeWriter(storage, window=0.05, journal_path=str(tmp_path / "intake.jsonl"), backoff=(0.01,))
+    results = []
+    writer.batch_written.connect(results.extend)
+    writer.submit(make_card(1))
+    writer.submit(make_card(2))
+
+    assert wait_until(qapp, lambda: len(results) == 2)
+    writer.stop()
+    assert all(success for _, success, _ in results)
+    assert storage.count_cards() == 2
+    assert (tmp_path / "intake.jsonl").read_text() == ""
+
+
+def test_entries_locked_out_at_shutdown_are_replayed(qapp, tmp_path):
+    path = str(tmp_path / "intake.jsonl")
+    locked = LockedStorage(locked_writes=1000)
+    locked.add_card(make_card(5))
+    writer = IntakeWriter(locked, window=0.05, journal_path=path, backoff=(0.01,))
+    writer.submit(make_card(1))
+    writer.submit_update("CARD000005", {'brand': "Target"}, 0)
+    writer.stop()
+    assert locked.count_cards() == 1
+
+    storage = InMemoryStorage()
+    storage.add_card(make_card(5))
+    results, updates = [], []
+    writer = IntakeWriter(storage, window=0.05, journal_path=path)
+    writer.batch_written.connect(results.extend)
+    writer.updates_written.connect(updates.extend)
+    assert [entry['op'] for entry in writer.replayed] == ['add', 'update']
+
+    assert wait_until(qapp, lambda: results and updates)
+    writer.stop()
+    assert results == [("CARD000001", True, "Card added successfully")]
+    assert updates == [("CARD000005", True, "Card updated successfully")]
+    assert storage.get_card_fields("CARD000005", ['brand']) == {'brand': "Target"}
+    writer = IntakeWriter(storage, journal_path=path)
+    writer.stop()
+    assert writer.replayed == []
+
+
+def test_add_card_returns_before_the_card_is_written(window, qapp):
+    window.add_tab.card_number_input.setText("CARD000001")
+    window.add_tab.brand_input.setText("Amazon")
+    window.add_tab.denomination_input.setValue(50)
+    window.add_tab.purchase_price_input.setValue(40)
+    window.add_tab.expected_price_input.setValue(45)
+
+    window.add_card()
+    assert window.add_tab.card_number_input.text() == ""
+    assert wait_until(qapp, lambda: window.db_manager.count_cards() == 1)
+    assert wait_until(qapp, lambda: not window.form_pending)
@@ -0,0 +1,128 @@
+import csv
+import os
+
+import pytest
+from PyQt6.QtCore import QItemSelectionModel, Qt
+from PyQt6.QtWidgets import QDialog, QMessageBox
+
+import main_app
+import ui_components
+from card_model import COLUMNS
+from database import DatabaseManager, PAGE_SIZE
+from factories import make_card, wait_until
+
+# Inventory sizes the window is driven against; LOAD_TEST_SIZES=1000,100000 tries others
+SIZES = [int(size) for size in os.environ.get("LOAD_TEST_SIZES", "1000,20000").split(",")]
+
+BRANDS = ["Amazon", "Target", "Walmart", "Apple", "Best Buy", "Starbucks", "Home Depot"]
+SOURCES = ["Gift", "Raise", "CardCash", "Friend"]
+
+# Milliseconds per operation, the same at every size: the listing is paged and
+# every write touches only its own rows, so none of these may grow with the
+# inventory. Export reads every card, so it gets a budget per card on top
+BUDGETS = {
+    'open': 1000,
+    'load': 250,
+    'sort': 250,
+    # Includes the intake writer's batching window
+    'add': 1000,
+    'edit': 250,
+    'save': 500,
+    'delete': 500,
+}
+EXPORT_BUDGET = 3000
+EXPORT_BUDGET_PER_CARD = 0.1
+
+
+def column_of(field):
+    return next(i for i, column in enumerate(COLUMNS) if column[1] == field)
+
+
+def generated_card(i):
+    return make_card(i, card_number=f"LOAD{i:08d}", brand=BRANDS[i % len(BRANDS)], source=SOURCES[i % len(SOURCES)],
+                     denomination=float(25 + i % 8 * 25), purchase_price=float(20 + i % 8 * 20),
+                     purchase_date=f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}")
+
+
+@pytest.fixture(params=SIZES, ids=lambda size: f"{size}cards")
+def loaded_db(request, tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    db.add_cards([generated_card(i) for i in range(request.param)])
+    db.wait_for_snapshot()
+    return db, request.param
+
+
+def test_operations_stay_within_budget(loaded_db, qapp, tmp_path, monkeypatch, latency):
+    db, size = loaded_db
+    monkeypatch.chdir(tmp_path)
+    for module in (main_app, ui_components):
+        monkeypatch.setattr(module.QMessageBox, "information", lambda *args: None)
+        monkeypatch.setattr(module.QMessageBox, "warning", lambda *args: pytest.fail(f"Warning: {args[2]}"))
+        monkeypatch.setattr(module.QMessageBox, "question", lambda *args: QMessageBox.StandardButton.Yes)
+
+    with latency('open', BUDGETS['open']):
+        window = main_app.GiftCardApp(storage=db)
+    try:
+        view = window.view_tab
+        model = view.model
+
+        with latency('load', BUDGETS['load']):
+            window.tabs.setCurrentIndex(1)
+        assert model.rowCount() == min(size, PAGE_SIZE)
+        assert model.card_at(0)['card_number'] == f"LOAD{size - 1:08d}"
+
+        with latency('sort', BUDGETS['sort']):
+            model.sort(column_of('brand'), Qt.SortOrder.AscendingOrder)
+        assert model.card_at(0)['brand'] == min(BRANDS[:size], key=str.lower)
+
+        form = window.add_tab
+        form.card_number_input.setText("NEW-0001")
+        form.brand_input.setText("Costco")
+        form.denomination_input.setValue(100.0)
+        form.purchase_price_input.setValue(80.0)
+        form.expected_price_input.setValue(90.0)
+        with latency('add', BUDGETS['add']):
+            window.add_card()
+            assert wait_until(qapp, lambda: db.check_card_exists("NEW-0001"))
+        assert db.get_card_fields("NEW-0001", ['brand', 'expected_price']) == {'brand': "Costco", 'expected_price': 90.0}
+
+        def accept_with_new_brand(dialog):
+            dialog.brand_input.setText("Edited")
+            return QDialog.DialogCode.Accepted
+        monkeypatch.setattr(ui_components.EditCardDialog, "exec", accept_with_new_brand)
+        edited = model.card_at(3)['card_number']
+        with latency('edit', BUDGETS['edit']):
+            view.edit_card(3)
+        assert db.get_card_fields(edited, ['brand'])['brand'] == "Edited"
+        assert model.card_at(model.row_by_card[edited])['brand'] == "Edited"
+
+        saved = model.card_numbers(range(10, 30))
+        for card_number in saved:
+            model.setData(model.index(model.row_by_card[card_number], column_of('source')), "Saved")
+        with latency('save', BUDGETS['save']):
+            window.save_changes()
+        assert {card_number: ("Saved",) for card_number in saved} == db.get_cards_fields(saved, ['source'])
+        assert not model.get_pending_updates()
+
+        deleted = model.card_numbers(range(40, 50))
+        selection = view.table.selectionModel()
+        for card_number in deleted:
+            selection.select(model.index(model.row_by_card[card_number], 0),
+                             QItemSelectionModel.SelectionFlag.Select | QItemSelectionModel.SelectionFlag.Rows)
+        with latency('delete', BUDGETS['delete']):
+            window.delete_selected()
+        assert db.get_cards_fields(deleted, ['brand']) == {}
+        assert db.count_cards() == size + 1 - len(deleted)
+
+        export_path = str(tmp_path / "export.csv")
+        monkeypatch.setattr(main_app.QFileDialog, "getSaveFileName", lambda *args: (export_path, ""))
+        monkeypatch.setattr(main_app.QMessageBox, "question", lambda *args: QMessageBox.StandardButton.No)
+        with latency('export', EXPORT_BUDGET + EXPORT_BUDGET_PER_CARD * size):
+            window.export_to_excel()
+        with open(export_path, newline='', encoding='utf-8') as exported:
+            rows = list(csv.reader(exported))
+        assert len(rows) == 1 + db.count_cards()
+        assert {row[0] for row in rows[1:]} >= {"NEW-0001", edited} | set(saved)
+    finally:
+        window.close()
+        qapp.processEvents()
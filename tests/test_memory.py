@@ -0,0 +1,89 @@
+import gc
+
+from PyQt6.QtCore import QSize
+from PyQt6.QtGui import QImage
+
+from factories import make_card
+from memory_governor import MemoryGovernor, diff_counts, object_counts, rss_bytes
+from thumbnails import ThumbnailLoader, pixmap_bytes
+
+REFRESHES = 1000
+RSS_GROWTH_LIMIT = 16 * 1024 * 1024
+OBJECT_GROWTH_LIMIT = 2000
+
+
+def test_thumbnail_cache_respects_byte_budget(qapp):
+    image = QImage(QSize(56, 36), QImage.Format.Format_RGB32)
+    loader = ThumbnailLoader(None, max_bytes=10 * 56 * 36 * 4)
+    try:
+        for i in range(25):
+            loader.on_image_decoded(f"image{i}.jpg", image)
+        assert len(loader.cache) == 10
+        assert loader.memory_usage() == sum(pixmap_bytes(p) for p in loader.cache.values())
+        assert "image24.jpg" in loader.cache and "image0.jpg" not in loader.cache
+
+        loader.trim(loader.memory_usage() // 2)
+        assert len(loader.cache) == 5
+    finally:
+        loader.shutdown()
+
+
+def test_governor_trims_caches_over_budget(qapp):
+    image = QImage(QSize(56, 36), QImage.Format.Format_RGB32)
+    loader = ThumbnailLoader(None)
+    try:
+        for i in range(20):
+            loader.on_image_decoded(f"image{i}.jpg", image)
+        governor = MemoryGovernor(rss_budget=1)
+        governor.register("thumbnails", loader)
+        governor.check()
+        assert len(loader.cache) == 10
+    finally:
+        loader.shutdown()
+
+
+def test_refreshes_keep_memory_flat(window, qapp):
+    results = window.db_manager.add_cards([make_card(i) for i in range(200)])
+    assert all(success for _, success, _ in results)
+    window.show()
+    window.tabs.setCurrentIndex(1)
+
+    # Let caches, interned strings and Qt internals settle first
+    for _ in range(50):
+        window.view_cards()
+        qapp.processEvents()
+    gc.collect()
+    rss_before = rss_bytes()
+    counts_before = object_counts()
+
+    for _ in range(REFRESHES):
+        window.view_cards()
+        qapp.processEvents()
+    gc.collect()
+    rss_after = rss_bytes()
+    counts_after = object_counts()
+
+    growth = dict(diff_counts(counts_before, counts_after, limit=None))
+    assert not {name: n for name, n in growth.items() if name.startswith("widget:") and n > 0}
+    assert sum(growth.values()) < OBJECT_GROWTH_LIMIT, growth
+    if rss_before is not None:
+        assert rss_after - rss_before < RSS_GROWTH_LIMIT
+
+
+def test_allocation_tracing_stops_after_the_comparison(qapp):
+    import tracemalloc
+    governor = MemoryGovernor()
+    assert "tracing started" in governor.report()
+    assert tracemalloc.is_tracing()
+    growth = [bytearray(1024) for _ in range(1000)]
+    assert governor.allocation_growth()
+    assert not tracemalloc.is_tracing()
+    del growth
+
+
+def test_edit_dialog_survives_a_corrupt_image(qapp, tmp_path):
+    from ui_components import EditCardDialog
+    path = tmp_path / "bad.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xe0 not really a jpeg")
+    dialog = EditCardDialog(None, make_card(1, card_image_path=str(path)), None)
+    assert dialog.image_preview_label.property("state") == "empty"
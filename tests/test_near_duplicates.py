@@ -0,0 +1,91 @@
+import random
+import sqlite3
+
+from factories import make_card
+from database import DatabaseManager
+from near_duplicates import card_number_distance, find_duplicates, normalize_card_number
+
+
+def test_distance_counts_typos():
+    assert normalize_card_number(" 6040-1234 5678.9x ") == "604012345678 9X".replace(" ", "")
+    assert card_number_distance("6040123456789", "6040123456789") == 0
+    assert card_number_distance("6040123456789", "6040123956789") == 1
+    assert card_number_distance("6040123456789", "6040132456789") == 1
+    assert card_number_distance("6040123456789", "604012345678") == 1
+    assert card_number_distance("6040123456789", "5040123456780") == 2
+    assert card_number_distance("6040123456789", "5140123456780") is None
+
+
+def test_separators_do_not_make_a_new_card(storage):
+    assert storage.add_card(make_card(0, card_number="6040-1234-5678"))[0]
+    assert storage.add_card(make_card(1, card_number="6040 1234 5678")) == (
+        False, "Card number already exists as 6040-1234-5678")
+    assert storage.find_similar_card_numbers("604012345678") == [("6040-1234-5678", 0)]
+
+
+def test_typos_are_found_among_many_cards(storage):
+    rng = random.Random(7)
+    numbers = [f"6040{rng.randrange(10 ** 12):012d}" for _ in range(2000)]
+    storage.add_cards([make_card(i, card_number=number) for i, number in enumerate(numbers)])
+    target = numbers[123]
+
+    typo = target[:9] + str((int(target[9]) + 1) % 10) + target[10:]
+    assert storage.find_similar_card_numbers(typo)[0] == (target, 1)
+    assert storage.find_similar_card_numbers(target[:5] + target[6:])[0] == (target, 1)
+    assert storage.find_similar_card_numbers("9" * 16) == []
+
+
+def swap_digits(number):
+    i = next(i for i in range(6, len(number) - 1) if number[i] != number[i + 1])
+    return number[:i] + number[i + 1] + number[i] + number[i + 2:]
+
+
+def test_batch_scan_finds_injected_near_duplicates(storage):
+    rng = random.Random(11)
+    numbers = {f"6040{rng.randrange(10 ** 12):012d}" for _ in range(3000)}
+    originals = sorted(numbers)[:6]
+    copies = [
+        originals[0][:-1] + "x",                      # last digit
+        "7" + originals[1][1:],                       # first digit
+        originals[2][:7] + originals[2][8:],          # missing digit in the middle
+        swap_digits(originals[3]),                   # swapped neighbours
+        originals[4][:2] + "99" + originals[4][4:],   # two typos near the front
+    ]
+    storage.add_cards([make_card(i, card_number=number) for i, number in enumerate(sorted(numbers) + copies)])
+
+    found = {(first, second) for first, second, _ in find_duplicates(storage)}
+    for original, copy in zip(originals, copies):
+        assert tuple(sorted((original, copy))) in found
+
+
+def test_existing_duplicates_survive_the_migration(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cards (id INTEGER PRIMARY KEY AUTOINCREMENT, card_number TEXT UNIQUE NOT NULL, "
+                 "balance REAL NOT NULL, created_at TIMESTAMP)")
+    conn.executemany("INSERT INTO cards (card_number, balance) VALUES (?, 50)",
+                     [("1234-5678",), ("12345678",), ("5555",)])
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(path)
+    assert find_duplicates(db) == [("1234-5678", "12345678", 0)]
+    assert db.find_similar_card_numbers("1234 5678")[0][1] == 0
+
+
+def test_add_card_warns_about_near_duplicates(window, monkeypatch):
+    import main_app
+    window.db_manager.add_card(make_card(0, card_number="6040123456789"))
+    asked = []
+    monkeypatch.setattr(main_app.QMessageBox, "question",
+                        lambda *args, **kwargs: asked.append(args[2]) or main_app.QMessageBox.StandardButton.No)
+    window.add_tab.card_number_input.setText("6040123456788")
+    window.add_tab.brand_input.setText("Amazon")
+    window.add_tab.denomination_input.setValue(50)
+    window.add_tab.purchase_price_input.setValue(40)
+    window.add_tab.expected_price_input.setValue(45)
+
+    window.add_card()
+    assert "6040123456789 (1 character different)" in asked[0]
+    assert window.add_tab.card_number_input.text() == "6040123456788"
+    assert not window.form_pending
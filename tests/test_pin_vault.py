@@ -0,0 +1,83 @@
+import pytest
+from cryptography.exceptions import InvalidTag
+
+import ui_components
+from factories import make_card
+from pin_vault import PinVault, VaultLockedError, is_encrypted
+
+
+@pytest.fixture
+def vault(storage):
+    storage.add_cards([make_card(i, pin=f"{i:04d}" if i % 3 else "") for i in range(1, 8)])
+    vault = PinVault(storage)
+    assert vault.initialize("correct horse")
+    return vault
+
+
+def test_initialize_encrypts_legacy_pins(vault, storage):
+    pins = storage.get_pins()
+    assert len(pins) == 5 and all(pin.startswith("enc1:1:") for pin in pins.values())
+    assert {number: vault.decrypt(number, pin) for number, pin in pins.items()} == {
+        f"CARD{i:06d}": f"{i:04d}" for i in range(1, 8) if i % 3
+    }
+
+
+def test_pins_are_bound_to_their_card(vault):
+    encrypted = vault.encrypt("CARD000001", "9999")
+    assert vault.decrypt("CARD000001", encrypted) == "9999"
+    with pytest.raises(InvalidTag):
+        vault.decrypt("CARD000002", encrypted)
+
+
+def test_unlock_needs_the_passphrase(vault, storage):
+    vault.lock()
+    with pytest.raises(VaultLockedError):
+        vault.encrypt("CARD000001", "1234")
+    fresh = PinVault(storage)
+    assert not fresh.unlock("wrong")
+    assert fresh.unlock("correct horse")
+
+
+def test_rotation_and_passphrase_change_keep_every_pin(vault, storage):
+    assert vault.rotate_key("correct horse")
+    pins = storage.get_pins()
+    assert all(pin.startswith("enc1:2:") for pin in pins.values())
+    assert list(storage.get_vault_settings()['keys']) == [2]
+
+    assert vault.change_passphrase("new passphrase")
+    fresh = PinVault(storage)
+    assert fresh.unlock("new passphrase")
+    assert fresh.decrypt("CARD000001", pins["CARD000001"]) == "0001"
+
+
+def test_rekey_does_not_overwrite_a_pin_edited_meanwhile(vault, storage, monkeypatch):
+    assert vault.rotate_key("correct horse")
+    # A PIN still under the retired key, edited by someone else mid-batch
+    vault.active_key_id = 1
+    storage.add_card(make_card(100, pin=vault.encrypt("CARD000100", "4321")))
+    vault.active_key_id = 2
+    read_batch = storage.get_pins_to_rekey
+
+    def edited_after_read(*args):
+        batch = read_batch(*args)
+        for _, card_number, pin in batch:
+            storage.update_pins([("edited", card_number, pin)])
+        return batch
+
+    monkeypatch.setattr(storage, "get_pins_to_rekey", edited_after_read)
+    assert vault.rekey_pins()
+    assert storage.get_card_fields("CARD000100", ['pin']) == {'pin': "edited"}
+
+
+def test_edit_dialog_warns_about_undecryptable_pins(window, monkeypatch):
+    vault = window.pin_vault
+    vault.initialize("passphrase")
+    # A PIN encrypted for another card fails authentication
+    window.db_manager.add_card(make_card(1, pin=vault.encrypt("CARD000002", "1234")))
+    window.tabs.setCurrentIndex(1)
+    warnings = []
+    monkeypatch.setattr(ui_components.QMessageBox, "warning", lambda *args: warnings.append(args[2]))
+    window.view_tab.edit_card(0)
+    assert warnings and "CARD000001" in warnings[0]
+    assert window.view_tab.edit_dialog is None
+    assert is_encrypted(window.db_manager.get_card_fields("CARD000001", ['pin'])['pin'])
@@ -0,0 +1,97 @@
+import pytest
+
+from factories import make_card
+
+
+@pytest.fixture
+def storage(storage):
+    """Each engine with unsold Amazon and Target cards of two denominations, plus a sold one"""
+    storage.add_cards([
+        make_card(i, brand="Amazon" if i < 4 else "target", denomination=50.0 if i % 4 < 2 else 200.0,
+                  pending="Yes", source="Gift" if i != 5 else "Trade")
+        for i in range(8)
+    ])
+    storage.add_card(make_card(8, brand="Amazon", pending="No"))
+    return storage
+
+
+def prices(storage):
+    return {number: storage.get_card_fields(number, ['expected_price', 'expected_percent', 'profit'])
+            for number in (f"CARD{i:06d}" for i in range(9))}
+
+
+def test_most_specific_rule_wins(storage):
+    assert storage.add_pricing_rule({'percent': 110})[0]
+    assert storage.add_pricing_rule({'brand': "AMAZON", 'percent': 120})[0]
+    assert storage.add_pricing_rule({'brand': "amazon", 'min_denomination': 100, 'percent': 130})[0]
+    assert storage.add_pricing_rule({'source': "trade", 'percent': 90})[0]
+
+    preview = storage.preview_repricing()
+    assert preview['count'] == 8
+    assert storage.apply_pricing_rules() == (True, "Repriced 8 card(s)")
+
+    after = prices(storage)
+    assert [after[f"CARD{i:06d}"]['expected_percent'] for i in range(8)] == [120, 120, 130, 130, 110, 90, 110, 110]
+    assert after["CARD000002"] == {'expected_price': 52.0, 'expected_percent': 130, 'profit': 12.0}
+    # Sold cards keep the price they were sold against
+    assert after["CARD000008"]['expected_percent'] == 112.5
+    assert preview['rows'][0] == ("CARD000000", "Amazon", 40.0, 45.0, 48.0, 120.0)
+    assert preview['profit_change'] == pytest.approx(sum(
+        after[number]['expected_price'] - 45.0 for number, *_ in preview['rows']))
+
+
+def test_repricing_bumps_versions_and_records_history(storage):
+    storage.add_pricing_rule({'brand': "target", 'percent': 100})
+    storage.apply_pricing_rules()
+
+    assert storage.get_card_fields("CARD000004", ['version']) == {'version': 1}
+    assert storage.get_card_fields("CARD000000", ['version']) == {'version': 0}
+    changes = storage.get_card_history("CARD000004")[0]['changes']
+    assert changes['expected_price'] == [45.0, 40.0]
+    assert set(changes) == {'expected_price', 'expected_percent'}
+    assert storage.get_card_fields("CARD000004", ['profit']) == {'profit': 0.0}
+    # Nothing is left to change
+    assert storage.preview_repricing()['count'] == 0
+    assert storage.apply_pricing_rules() == (True, "Repriced 0 card(s)")
+
+
+@pytest.mark.parametrize("rule", [
+    {'percent': 0},
+    {'percent': 100, 'min_denomination': 200, 'max_denomination': 100},
+])
+def test_invalid_rules_are_rejected(storage, rule):
+    success, _ = storage.add_pricing_rule(rule)
+    assert not success
+    assert storage.get_pricing_rules() == []
+
+
+def test_deleted_rules_stop_applying(storage):
+    storage.add_pricing_rule({'percent': 150})
+    rule_id = storage.get_pricing_rules()[0]['id']
+    assert storage.delete_pricing_rule(rule_id)[0]
+    assert storage.preview_repricing()['count'] == 0
+
+
+def test_dialog_previews_and_applies(window, qapp):
+    from ui_components import PricingRulesDialog
+    window.db_manager.add_cards([make_card(i, pending="Yes") for i in range(3)])
+    dialog = PricingRulesDialog(window, window.db_manager)
+    assert not dialog.apply_button.isEnabled()
+
+    dialog.brand_input.setText("Amazon")
+    dialog.percent_input.setValue(125)
+    dialog.add_rule()
+    assert dialog.rule_table.rowCount() == 1
+    assert dialog.preview_table.rowCount() == 3
+    assert dialog.preview_table.item(0, 4).text() == "$50.00"
+
+    import ui_components
+    original = ui_components.QMessageBox.information
+    ui_components.QMessageBox.information = lambda *args: None
+    try:
+        dialog.apply_rules()
+    finally:
+        ui_components.QMessageBox.information = original
+    assert dialog.repriced
+    assert dialog.preview_table.rowCount() == 0
+    assert window.db_manager.get_card_fields("CARD000001", ['expected_price']) == {'expected_price': 50.0}
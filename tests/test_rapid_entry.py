@@ -0,0 +1,40 @@
+import pytest
+
+from factories import make_card, wait_until
+from rapid_entry import IntakeWriter, parse_scan
+from storage import InMemoryStorage
+
+
+@pytest.mark.parametrize("payload, expected", [
+    ("6006491234567890|1234", ("6006491234567890", "1234")),
+    ("  ABC-123 ; 99x ", ("ABC-123", "99x")),
+    ("ABC123\t", ("ABC123", "")),
+    ("ABC123,", ("ABC123", "")),
+    ("ABC123 4321", ("ABC123", "4321")),
+    ("ABC123", ("ABC123", "")),
+    ("ABC 123 456", None),
+    ("", None),
+    ("card#1", None),
+])
+def test_parse_scan(payload, expected):
+    assert parse_scan(payload) == expected
+
+
+def test_writer_batches_queued_cards(qapp):
+    storage = InMemoryStorage()
+    storage.add_card(make_card(3))
+    calls = []
+    add_cards = storage.add_cards
+    storage.add_cards = lambda cards: calls.append(len(cards)) or add_cards(cards)
+
+    writer = IntakeWriter(storage, batch_size=4, window=5.0)
+    results = []
+    writer.batch_written.connect(results.extend)
+    for i in range(6):
+        writer.submit(make_card(i))
+    writer.stop()
+
+    assert calls == [4, 2]
+    assert wait_until(qapp, lambda: len(results) == 6)
+    assert [number for number, success, _ in results if not success] == ["CARD000003"]
+    assert storage.count_cards() == 6
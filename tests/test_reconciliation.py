@@ -0,0 +1,81 @@
+import pytest
+
+from factories import make_card
+from reconciliation import (apply_payments, format_reconciliation_report, match_payments, parse_amount,
+                            read_statement, reconcile_statement)
+
+
+def sold(number, price, sold_date, **overrides):
+    return make_card(number, **dict({'pending': "No", 'expected_price': price, 'sold_date': sold_date,
+                                     'payment_received': 0.0}, **overrides))
+
+
+@pytest.fixture
+def storage(storage):
+    """Each engine with unpaid sold cards, one paid card and one unsold card"""
+    storage.add_cards([
+        sold(1, 45.0, "2024-03-01"),
+        sold(2, 45.0, "2024-03-10"),
+        sold(3, 90.0, "2024-03-02", payment_mode="Venmo"),
+        sold(4, 180.0, "2024-03-05"),
+        sold(5, 30.0, "2024-03-04"),
+        sold(6, 45.0, "2024-03-02", payment_received=45.0),
+        make_card(7, pending="Yes", expected_price=45.0),
+    ])
+    return storage
+
+
+def write_statement(tmp_path, text, name="paypal.csv"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+PAYPAL = """Account activity
+Date,Name,Gross,Transaction ID
+03/11/2024,Buyer B,"$45.00",TX2
+03/02/2024,Buyer A,"$45.00",TX1
+03/03/2024,Buyer C,$90.00,TX3
+03/06/2024,Buyer D,"$170.00",TX4
+03/04/2024,Refund,-$20.00,TX5
+03/20/2024,Someone,$12.00,TX6
+"""
+
+
+def test_statement_rows_are_parsed(tmp_path):
+    transactions, skipped = read_statement(write_statement(tmp_path, PAYPAL), "PayPal")
+    assert skipped == 1
+    assert [(t['date'], t['amount'], t['id']) for t in transactions][:2] == [
+        ("2024-03-11", 45.0, "TX2"), ("2024-03-02", 45.0, "TX1")]
+    assert parse_amount("+ $1,234.50") == 1234.5
+    assert parse_amount("(12.00)") == -12.0
+
+
+def test_payments_match_by_amount_date_and_mode(storage, tmp_path):
+    result = reconcile_statement(storage, write_statement(tmp_path, PAYPAL), "PayPal")
+
+    matched = {match['card_number']: match['transaction']['id'] for match in result['matches']}
+    # Each payment goes to the card sold closest to it; Venmo card 3 is not paid by PayPal
+    assert matched == {"CARD000001": "TX1", "CARD000002": "TX2", "CARD000004": "TX4"}
+    assert [match['difference'] for match in result['matches']] == [0.0, 0.0, -10.0]
+    assert [t['id'] for t in result['unmatched_transactions']] == ["TX3", "TX6"]
+    assert result['unmatched_cards'] == ["CARD000003", "CARD000005"]
+    assert "-$10.00" in format_reconciliation_report(result)
+
+
+def test_matches_are_applied_in_one_guarded_update(storage, tmp_path):
+    result = reconcile_statement(storage, write_statement(tmp_path, PAYPAL), "PayPal")
+    storage.update_card("CARD000004", {'brand': "Target"}, 0)
+
+    assert apply_payments(storage, result['matches']) == (True, ["CARD000004"])
+    assert storage.get_card_fields("CARD000001", ['payment_received', 'payment_mode', 'realized_profit']) == {
+        'payment_received': 45.0, 'payment_mode': "PayPal", 'realized_profit': 5.0}
+    assert storage.get_card_fields("CARD000004", ['payment_received']) == {'payment_received': 0.0}
+    assert [card[0] for card in storage.get_unpaid_sold_cards()] == ["CARD000003", "CARD000005", "CARD000004"]
+
+
+def test_matching_uses_only_the_date_window():
+    cards = [("CARD%06d" % i, 45.0, "2024-01-%02d" % (i % 28 + 1), "", 0) for i in range(2000)]
+    transactions = [{'line': 1, 'id': "", 'date': "2024-01-15", 'amount': 45.0, 'mode': None, 'description': ""}]
+    result = match_payments(transactions, cards, window_days=0)
+    assert [match['card_number'] for match in result['matches']] == ["CARD000014"]
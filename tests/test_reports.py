@@ -0,0 +1,60 @@
+from factories import make_card
+from database import DatabaseManager
+from pin_vault import PinVault
+from reports import brand_report, brand_totals_from_storage, export_cards, export_storage, rowid_ranges
+from storage import InMemoryStorage
+
+CARDS = 300
+
+
+def fill(storage):
+    storage.add_cards([
+        make_card(i, brand=["Amazon", "Target", "Walmart"][i % 3], payment_received=45.0 if i % 2 == 0 else 0.0)
+        for i in range(CARDS)
+    ])
+
+
+def test_rowid_ranges_cover_the_table_newest_first(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    fill(db)
+    ranges = rowid_ranges(db.db_path, 64)
+    assert ranges[0][1] == CARDS and ranges[-1][0] == 1
+    assert sum(high - low + 1 for low, high in ranges) == CARDS
+
+
+def test_parallel_export_matches_single_process_export(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    memory = InMemoryStorage()
+    fill(db)
+    fill(memory)
+
+    assert export_cards(db.db_path, str(tmp_path / "parallel.csv"), workers=2, chunk_rows=64) == CARDS
+    assert export_storage(memory, str(tmp_path / "serial.csv")) == CARDS
+    assert (tmp_path / "parallel.csv").read_text() == (tmp_path / "serial.csv").read_text()
+
+
+def test_export_decrypts_pins_only_with_keys(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    vault = PinVault(db)
+    vault.initialize("passphrase")
+    db.add_cards([make_card(i, pin=vault.encrypt(f"CARD{i:06d}", f"PIN{i}")) for i in range(100)])
+
+    export_cards(db.db_path, str(tmp_path / "with.csv"), vault.session_keys(), workers=2, chunk_rows=30)
+    export_cards(db.db_path, str(tmp_path / "without.csv"), workers=2, chunk_rows=30)
+    with_pins = (tmp_path / "with.csv").read_text().splitlines()
+    without_pins = (tmp_path / "without.csv").read_text().splitlines()
+    assert with_pins[1].split(",")[:3] == ["CARD000099", "Amazon", "PIN99"]
+    assert without_pins[1].split(",")[2] == ""
+    assert "enc1:" not in (tmp_path / "with.csv").read_text()
+
+
+def test_brand_report_merges_ranges(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    memory = InMemoryStorage()
+    fill(db)
+    fill(memory)
+
+    totals = brand_report(db.db_path, workers=2, chunk_rows=50)
+    assert totals == brand_totals_from_storage(memory)
+    assert totals["Amazon"][:2] == [100, 50]
+    assert totals["Amazon"][2] == 100 * 50.0
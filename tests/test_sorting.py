@@ -0,0 +1,150 @@
+import sqlite3
+
+import pytest
+from PyQt6.QtCore import Qt
+
+from card_model import COLUMNS, CardTableModel
+from factories import make_card
+from database import CARD_LIST_COLUMNS, SORT_KEYS, DatabaseManager, sort_value
+
+CARDS = 120
+BRANDS = ["amazon", "Target", None, "Walmart", "AMAZON", "best buy"]
+
+
+@pytest.fixture
+def storage(storage):
+    """Each engine, filled with cards that tie and have NULLs in the sort keys"""
+    storage.add_cards([
+        make_card(i, brand=BRANDS[i % len(BRANDS)], purchase_price=[40.0, None, 47.5, 33.0][i % 4],
+                  sold_date="" if i % 3 else f"2024-02-{i % 28 + 1:02d}", pin="1234" if i % 5 == 0 else "")
+        for i in range(CARDS)
+    ])
+    return storage
+
+
+def all_pages(storage, field, descending, limit):
+    rows, after = storage.get_cards_page(field, descending, None, limit)
+    while after is not None:
+        page, after = storage.get_cards_page(field, descending, after, limit)
+        rows.extend(page)
+    return rows
+
+
+def expected_order(rows, field, descending):
+    index = CARD_LIST_COLUMNS.index(field)
+    return sorted(rows, key=lambda row: (sort_value(field, row[index]), row[0]), reverse=descending)
+
+
+@pytest.mark.parametrize("field", ['brand', 'profit', 'discount_percent', 'sold_date', 'has_pin', 'card_number'])
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_follow_typed_sort_keys(storage, field, descending):
+    rows = all_pages(storage, field, descending, 7)
+    assert len(rows) == CARDS
+    assert rows == expected_order(rows, field, descending)
+
+
+def test_default_pages_are_newest_first(storage):
+    rows = all_pages(storage, None, True, 50)
+    assert [row[0] for row in rows] == [f"CARD{i:06d}" for i in reversed(range(CARDS))]
+
+
+def test_pages_stay_stable_while_cards_change(storage):
+    first, after = storage.get_cards_page('profit', True, None, 30)
+    # A card sorting before the cursor and the removal of a later one shift no rows
+    storage.add_card(make_card(999, expected_price=1040.0))
+    storage.delete_card(first[-1][0])
+    rest = all_pages_from(storage, 'profit', after)
+    numbers = [row[0] for row in first + rest]
+    assert len(numbers) == len(set(numbers)) == CARDS
+
+
+def all_pages_from(storage, field, after):
+    rows = []
+    while after is not None:
+        page, after = storage.get_cards_page(field, True, after, 30)
+        rows.extend(page)
+    return rows
+
+
+def test_unknown_sort_field_is_rejected(storage):
+    with pytest.raises(ValueError):
+        storage.get_cards_page('pin')
+
+
+@pytest.mark.parametrize("field", [field for field in SORT_KEYS if field != 'card_number'])
+def test_indexed_sorts_seek_without_sorting(tmp_path, field):
+    db = DatabaseManager(str(tmp_path / "cards.db"))
+    conn = sqlite3.connect(db.db_path)
+    key = SORT_KEYS[field][0]
+    plan = [row[-1] for row in conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT card_number FROM cards WHERE {key} <= ? AND ({key} < ? OR card_number < ?) "
+        f"ORDER BY {key} DESC, card_number DESC LIMIT 10", (1, 1, "x")
+    )]
+    conn.close()
+    assert any(step.startswith(f"SEARCH cards USING INDEX idx_cards_sort_{field}") for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def column_of(field):
+    return next(i for i, column in enumerate(COLUMNS) if column[1] == field)
+
+
+def numbers(model):
+    return [model.card_at(row)['card_number'] for row in range(model.rowCount())]
+
+
+def test_model_sorts_in_memory_like_the_database(qapp, storage):
+    model = CardTableModel()
+    model.load(storage, page_size=CARDS + 1)
+    assert model.next_page is None
+
+    model.sort(column_of('profit'), Qt.SortOrder.AscendingOrder)
+    assert model.storage is storage
+    expected = all_pages(storage, 'profit', False, CARDS)
+    assert numbers(model) == [row[0] for row in expected]
+    assert model.row_by_card[numbers(model)[5]] == 5
+
+
+def test_partially_loaded_model_sorts_with_one_query(qapp, storage):
+    model = CardTableModel()
+    model.load(storage, page_size=25)
+    model.sort(column_of('brand'), Qt.SortOrder.DescendingOrder)
+    assert model.rowCount() == 25
+    assert numbers(model) == [row[0] for row in storage.get_cards_page('brand', True, None, 25)[0]]
+
+    model.fetch_all()
+    assert numbers(model) == [row[0] for row in all_pages(storage, 'brand', True, CARDS)]
+
+    # The order outlives reloads
+    model.load(storage, page_size=25)
+    assert numbers(model) == [row[0] for row in storage.get_cards_page('brand', True, None, 25)[0]]
+
+
+def test_sort_keeps_unsaved_edits(qapp, storage):
+    model = CardTableModel()
+    model.load(storage, page_size=25)
+    row = model.row_by_card["CARD000119"]
+    model.setData(model.index(row, column_of('brand')), "Zzz")
+    model.sort(column_of('brand'), Qt.SortOrder.DescendingOrder)
+    assert model.rowCount() == CARDS
+    assert numbers(model)[0] == "CARD000119"
+    assert model.get_pending_updates()[0][:2] == ("CARD000119", {'brand': "Zzz"})
+
+
+def test_header_click_sorts_the_view(window, qapp):
+    window.db_manager.add_cards([make_card(i, denomination=float(100 - i)) for i in range(10)])
+    window.tabs.setCurrentIndex(1)
+    view = window.view_tab
+    view.table.selectRow(0)
+    selected = view.model.card_at(0)['card_number']
+
+    view.table.sortByColumn(column_of('denomination'), Qt.SortOrder.AscendingOrder)
+    assert numbers(view.model)[0] == "CARD000009"
+    assert [view.model.card_at(row)['card_number'] for row in view.get_selected_rows()] == [selected]
+
+    window.view_cards()
+    assert numbers(view.model)[0] == "CARD000009"
+
+    view.table.sortByColumn(len(COLUMNS) - 1, Qt.SortOrder.AscendingOrder)
+    assert view.table.horizontalHeader().sortIndicatorSection() == column_of('denomination')
+    assert numbers(view.model)[0] == "CARD000009"
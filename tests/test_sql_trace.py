@@ -0,0 +1,51 @@
+import json
+
+from factories import make_card
+from database import DatabaseManager
+from sql_trace import SqlTracer, is_full_scan, load_slow_queries
+
+
+def test_slow_statements_are_logged_with_plans(tmp_path):
+    log_path = tmp_path / "slow.json"
+    tracer = SqlTracer(threshold_ms=0, log_path=str(log_path))
+    db = DatabaseManager(str(tmp_path / "cards.db"), tracer=tracer)
+    db.add_cards([make_card(i) for i in range(20)])
+
+    tracer.clear()
+    db.get_all_cards()
+    db.get_card_fields("CARD000003", ['pin'])
+
+    listing, lookup = [entry for entry in tracer.slow_queries if entry['sql'].startswith("SELECT")][:2]
+    assert listing['rows'] == 20
+    assert listing['full_scan']
+    assert lookup['rows'] == 1
+    assert not lookup['full_scan']
+    assert any("USING INDEX" in step for step in lookup['plan'])
+    # Written in batches, not per statement
+    assert load_slow_queries(str(log_path)) == []
+    tracer.flush()
+    assert load_slow_queries(str(log_path)) == json.loads(json.dumps(list(tracer.slow_queries)))
+
+
+def test_log_is_bounded_and_never_records_parameters(tmp_path):
+    tracer = SqlTracer(threshold_ms=0, capacity=5, log_path=None)
+    db = DatabaseManager(str(tmp_path / "cards.db"), tracer=tracer)
+    db.add_card(make_card(1, pin="secret-pin"))
+    db.get_card_by_number("CARD000001")
+
+    assert len(tracer.slow_queries) == 5
+    assert "secret-pin" not in json.dumps(list(tracer.slow_queries))
+
+
+def test_fast_statements_are_not_kept(tmp_path):
+    tracer = SqlTracer(threshold_ms=10_000, log_path=None)
+    db = DatabaseManager(str(tmp_path / "cards.db"), tracer=tracer)
+    db.add_card(make_card(1))
+    assert db.get_all_cards()
+    assert not tracer.slow_queries
+
+
+def test_full_scan_detection():
+    assert is_full_scan(["SCAN cards", "USE TEMP B-TREE FOR ORDER BY"])
+    assert not is_full_scan(["SCAN cards USING COVERING INDEX idx_cards_brand"])
+    assert not is_full_scan(["SEARCH cards USING INDEX sqlite_autoindex_cards_1 (card_number=?)"])
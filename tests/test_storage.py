@@ -0,0 +1,179 @@
+import pytest
+
+from factories import make_card
+from database import CARD_LIST_COLUMNS, MASKED_VALUE, VERSION_CONFLICT
+from storage import CardStorage, InMemoryStorage
+
+
+def listing(storage):
+    return [dict(zip(CARD_LIST_COLUMNS, row)) for row in storage.get_all_cards()]
+
+
+def test_implements_protocol(storage):
+    assert isinstance(storage, CardStorage)
+
+
+def test_add_and_list_newest_first(storage):
+    assert storage.add_card(make_card(1, pin="1234")) == (True, "Card added successfully")
+    assert storage.add_card(make_card(2)) == (True, "Card added successfully")
+    assert storage.add_card(make_card(1)) == (False, "Card number already exists")
+
+    cards = listing(storage)
+    assert [card['card_number'] for card in cards] == ["CARD000002", "CARD000001"]
+    assert [bool(card['has_pin']) for card in cards] == [False, True]
+    assert cards[1]['version'] == 0
+    assert storage.check_card_exists("CARD000001")
+    assert not storage.check_card_exists("CARD999999")
+
+
+def test_add_cards_reports_each_card(storage):
+    storage.add_card(make_card(2))
+    results = storage.add_cards([make_card(1), make_card(2), make_card(3)])
+    assert [(number, success) for number, success, _ in results] == [
+        ("CARD000001", True), ("CARD000002", False), ("CARD000003", True)
+    ]
+    assert len(storage.get_all_cards()) == 3
+    assert storage.count_cards() == 3
+
+
+def test_query_cards(storage):
+    storage.add_cards([
+        make_card(1, brand="Amazon", purchase_date="2024-01-05"),
+        make_card(2, brand="Target", purchase_date="2024-02-10"),
+        make_card(3, brand="Amazon", purchase_date="2024-03-15"),
+        make_card(4, brand="Amazon", purchase_date="2024-02-01"),
+    ])
+
+    def numbers(**filters):
+        return [row[0] for row in storage.query_cards(**filters)]
+
+    assert numbers(brand="Amazon") == ["CARD000004", "CARD000003", "CARD000001"]
+    assert numbers(pending="Yes") == ["CARD000003", "CARD000001"]
+    assert numbers(purchased_from="2024-02-01", purchased_to="2024-02-28") == ["CARD000004", "CARD000002"]
+    assert numbers(brand="Amazon", purchased_to="2024-02-01") == ["CARD000004", "CARD000001"]
+    assert numbers(brand="Walmart") == []
+    assert numbers() == ["CARD000004", "CARD000003", "CARD000002", "CARD000001"]
+
+
+def test_query_follows_updates_and_deletes(storage):
+    storage.add_cards([make_card(1, brand="Amazon"), make_card(2, brand="Amazon")])
+    storage.update_card("CARD000001", {'brand': "Target", 'purchase_date': "2025-06-01"})
+    storage.delete_card("CARD000002")
+    assert storage.query_cards(brand="Amazon") == []
+    assert [row[0] for row in storage.query_cards(brand="Target", purchased_from="2025-01-01")] == ["CARD000001"]
+
+
+def test_update_card_compare_and_swap(storage):
+    storage.add_card(make_card(1))
+    assert storage.update_card("CARD000001", {'brand': "Target"}, 0) == (True, "Card updated successfully")
+    assert storage.update_card("CARD000001", {'brand': "Walmart"}, 0) == (False, VERSION_CONFLICT)
+    assert storage.update_card("CARD999999", {'brand': "Walmart"}) == (False, "Card not found")
+    assert storage.update_card("CARD000001", {'unknown': 1}) == (True, "No changes to save")
+
+    card = storage.get_card_by_number("CARD000001")
+    assert card['brand'] == "Target"
+    assert card['version'] == 1
+
+
+def test_update_cards_returns_conflicts(storage):
+    storage.add_cards([make_card(1), make_card(2)])
+    storage.update_card("CARD000002", {'source': "Trade"})
+    success, conflicts = storage.update_cards([
+        ("CARD000001", {'expected_price': 48.0}, 0),
+        ("CARD000002", {'expected_price': 48.0}, 0),
+    ])
+    assert success
+    assert conflicts == ["CARD000002"]
+    assert storage.get_card_fields("CARD000001", ['expected_price', 'version']) == {'expected_price': 48.0, 'version': 1}
+    assert storage.get_card_fields("CARD000002", ['expected_price']) == {'expected_price': 45.0}
+
+
+def test_get_card_fields(storage):
+    storage.add_card(make_card(1, pin="enc1:1:abc"))
+    assert storage.get_card_fields("CARD000001", ['pin', 'card_image_path']) == {'pin': "enc1:1:abc", 'card_image_path': ""}
+    assert storage.get_card_fields("CARD000001", ['not_a_column']) == {}
+    assert storage.get_card_fields("CARD999999", ['pin']) is None
+
+
+def test_history_is_masked_and_newest_first(storage):
+    storage.add_card(make_card(1, pin="1234"))
+    storage.update_card("CARD000001", {'pin': "5678", 'brand': "Target"})
+    storage.update_card("CARD000001", {'brand': "Target"})
+    storage.delete_card("CARD000001")
+
+    history = storage.get_card_history("CARD000001")
+    assert [event['event_type'] for event in history] == ['delete', 'update', 'create']
+    assert history[1]['changes'] == {'brand': ["Amazon", "Target"], 'pin': [MASKED_VALUE, MASKED_VALUE]}
+    assert history[2]['changes']['pin'] == MASKED_VALUE
+    assert history[0]['id'] > history[1]['id'] > history[2]['id']
+    assert storage.get_card_history("CARD999999") == []
+
+
+def test_inventory_at(storage):
+    storage.add_cards([make_card(1, pin="1234"), make_card(2)])
+    storage.update_card("CARD000001", {'brand': "Target"})
+    storage.delete_card("CARD000002")
+
+    assert storage.get_inventory_at("2000-01-01 00:00:00") is None
+    inventory = storage.get_inventory_at("9999-12-31 23:59:59")
+    assert [card['card_number'] for card in inventory] == ["CARD000001"]
+    assert inventory[0]['brand'] == "Target"
+    assert inventory[0]['pin'] == MASKED_VALUE
+
+
+def test_delete_card(storage):
+    storage.add_card(make_card(1))
+    assert storage.delete_card("CARD000001") == (True, "Card deleted successfully")
+    assert storage.get_card_by_number("CARD000001") is None
+    assert storage.get_all_cards() == []
+    assert storage.delete_card("CARD000001")[0]
+
+
+def test_pins_and_rekey_batches(storage):
+    storage.add_cards([make_card(i, pin=f"{i:04d}" if i != 3 else "") for i in range(1, 6)])
+    storage.update_pins([("enc1:2:xyz", "CARD000002", "0002"), ("enc1:2:abc", "CARD000004", "stale")])
+    assert storage.get_pins() == {
+        "CARD000001": "0001", "CARD000002": "enc1:2:xyz", "CARD000004": "0004", "CARD000005": "0005"
+    }
+
+    first = storage.get_pins_to_rekey("enc1:2:", 0, 2)
+    assert [card_number for _, card_number, _ in first] == ["CARD000001", "CARD000004"]
+    rest = storage.get_pins_to_rekey("enc1:2:", first[-1][0], 2)
+    assert [card_number for _, card_number, _ in rest] == ["CARD000005"]
+
+
+def test_vault_settings_roundtrip(storage):
+    assert storage.get_vault_settings() is None
+    settings = {
+        'salt': b"0123456789abcdef", 'scrypt_n': 16384, 'scrypt_r': 8, 'scrypt_p': 1,
+        'active_key_id': 2, 'keys': {1: "wrapped-1", 2: "wrapped-2"}
+    }
+    assert storage.save_vault_settings(settings)
+    settings['keys'][3] = "not saved"
+    loaded = storage.get_vault_settings()
+    assert loaded['keys'] == {1: "wrapped-1", 2: "wrapped-2"}
+    assert loaded['active_key_id'] == 2
+    assert loaded['salt'] == b"0123456789abcdef"
+
+
+def test_app_runs_on_in_memory_storage(qapp, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from main_app import GiftCardApp
+    storage = InMemoryStorage()
+    storage.add_cards([make_card(i) for i in range(10)])
+    window = GiftCardApp(storage=storage)
+    try:
+        window.view_cards()
+        assert window.view_tab.model.rowCount() == 10
+        assert not (tmp_path / "giftcards.db").exists()
+    finally:
+        window.close()
+
+
+def test_command_line_selects_the_storage(tmp_path):
+    from main_app import parse_args
+    from storage import MEMORY_PATH, open_storage
+    assert parse_args(["app"]).db == "giftcards.db"
+    assert isinstance(open_storage(parse_args(["app", "--db", MEMORY_PATH]).db), InMemoryStorage)
+    db = open_storage(str(tmp_path / "other.db"))
+    assert db.db_path == str(tmp_path / "other.db") and db.count_cards() == 0
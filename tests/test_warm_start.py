@@ -0,0 +1,82 @@
+from PyQt6.QtCore import Qt
+
+from factories import make_card, wait_until
+from warm_start import load_warm_cache, save_warm_cache, warm_cache_path_for
+
+
+def open_window():
+    from main_app import GiftCardApp
+    return GiftCardApp()
+
+
+def test_cache_round_trip_and_damaged_files(tmp_path):
+    path = str(tmp_path / "cards.db-warm.bin")
+    state = {'data_version': 3, 'rows': [["CARD000001", 50.0, None]], 'next_page': None}
+    save_warm_cache(path, state)
+    assert load_warm_cache(path) == state
+
+    data = (tmp_path / "cards.db-warm.bin").read_bytes()
+    (tmp_path / "cards.db-warm.bin").write_bytes(data[:-5])
+    assert load_warm_cache(path) is None
+    (tmp_path / "cards.db-warm.bin").write_bytes(b"XXXX" + data[4:])
+    assert load_warm_cache(path) is None
+    assert load_warm_cache(str(tmp_path / "missing.bin")) is None
+
+
+def test_data_version_and_totals(storage):
+    start = storage.get_data_version()
+    storage.add_cards([make_card(1), make_card(2, pending="Yes"), make_card(3, pending="No", payment_received=48.0)])
+    assert storage.get_data_version() > start
+
+    version = storage.get_data_version()
+    storage.update_card("CARD000001", {'brand': "Target"}, 0)
+    assert storage.get_data_version() > version
+
+    assert storage.get_card_totals() == {
+        'count': 3, 'unsold': 2, 'denomination': 150.0, 'purchase_price': 120.0,
+        'profit': 10.0, 'realized_profit': 8.0,
+    }
+
+
+def test_session_is_restored_from_the_cache(window, qapp):
+    window.db_manager.add_cards([make_card(i, brand=f"Brand{i % 7}") for i in range(20)])
+    window.tabs.setCurrentIndex(1)
+    window.view_tab.table.sortByColumn(1, Qt.SortOrder.AscendingOrder)
+    window.view_tab.table.selectRow(3)
+    window.view_tab.table.setColumnWidth(1, 140)
+    assert wait_until(qapp, lambda: window.view_tab.totals is not None)
+    rows = [list(row) for row in window.view_tab.model.rows]
+    selected = window.view_tab.model.card_at(3)['card_number']
+    window.close()
+
+    restored = open_window()
+    try:
+        model = restored.view_tab.model
+        # Shown before any page query, then confirmed by the background refresh
+        assert model.warm
+        assert restored.tabs.currentIndex() == 1
+        assert model.rows == rows
+        assert model.sort_field() == 'brand' and not model.descending()
+        assert restored.view_tab.table.columnWidth(1) == 140
+        assert restored.view_tab.totals_label.text().startswith("20 cards")
+        assert wait_until(qapp, lambda: not model.warm)
+        qapp.processEvents()
+        assert restored.view_tab.position()[1] == [selected]
+        assert model.rows == rows
+    finally:
+        restored.close()
+
+
+def test_cache_is_ignored_after_the_data_changed(window, qapp):
+    window.db_manager.add_cards([make_card(i) for i in range(5)])
+    window.tabs.setCurrentIndex(1)
+    window.close()
+    assert load_warm_cache(warm_cache_path_for(window.db_manager))['rows']
+
+    window.db_manager.delete_card("CARD000001")
+    restored = open_window()
+    try:
+        assert not restored.view_tab.model.warm
+        assert restored.view_tab.model.rowCount() == 4
+    finally:
+        restored.close()
@@ -0,0 +1,111 @@
+from PyQt6.QtGui import QColor
+
+# The whole application is styled by this one sheet, parsed once when it is
+# applied. Widgets opt in through their object name or a "role" property, and
+# state changes only switch dynamic properties instead of replacing sheets.
+APP_STYLESHEET = """
+QPushButton[role="success"] {
+    background-color: #28a745;
+    color: white;
+    padding: 8px 15px;
+    border-radius: 5px;
+    font-weight: bold;
+}
+QPushButton[role="success"]:hover { background-color: #218838; }
+QPushButton[role="primary"] {
+    background-color: #4CAF50;
+    color: white;
+    padding: 10px;
+    font-size: 14px;
+}
+QPushButton[role="secondary"] {
+    background-color: #6c757d;
+    color: white;
+    padding: 8px 15px;
+    border-radius: 5px;
+}
+QPushButton[role="danger"] { background-color: #f44336; color: white; }
+
+QLineEdit[readOnly="true"] { background-color: #f8f9fa; color: #6c757d; }
+
+QLabel#profitLabel { font-weight: bold; color: green; font-size: 14px; }
+QLabel#profitLabel[negative="true"] { color: red; }
+
+QLabel#hintLabel { color: #6c757d; font-style: italic; }
+
+QLabel#previewTitle {
+    font-size: 16px;
+    font-weight: bold;
+    color: #2c3e50;
+    padding: 10px;
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #ecf0f1, stop:1 #bdc3c7);
+    border-radius: 8px;
+    margin-bottom: 10px;
+}
+QLabel#previewHint { color: #6c757d; font-size: 12px; font-style: italic; padding: 3px; }
+
+QLabel#imagePreview, QLabel#dialogImagePreview {
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 #ffffff, stop:0.5 #f8f9fa, stop:1 #e9ecef);
+    border: 3px dashed #6c757d;
+    border-radius: 15px;
+    padding: 10px;
+    margin: 5px;
+    font-size: 12px;
+    color: #6c757d;
+    font-weight: bold;
+}
+QLabel#dialogImagePreview {
+    border-width: 2px;
+    border-radius: 10px;
+    padding: 5px;
+    margin: 3px;
+    font-size: 10px;
+}
+QLabel#imagePreview[state="image"], QLabel#dialogImagePreview[state="image"] {
+    border-style: solid;
+    border-color: #28a745;
+}
+
+QTableView#cardTable {
+    gridline-color: #d0d0d0;
+    background-color: #232323;
+    selection-background-color: #007bff;
+    selection-color: white;
+    color: #222;
+}
+QTableView#cardTable::item { padding: 5px; border: none; }
+QTableView#cardTable::item:selected { background-color: #007bff; color: white; }
+QTableView#cardTable QHeaderView::section {
+    background-color: #232323;
+    padding: 8px;
+    border: 1px solid #444;
+    font-weight: bold;
+    color: #fff;
+}
+"""
+
+# Row colors, served through the model's Background/Foreground roles
+SOLD_BACKGROUND = QColor('#2e4736')
+SOLD_FOREGROUND = QColor('#7CFC98')
+PENDING_FOREGROUND = QColor('#fff')
+
+# Painted edit button in the table's Actions column
+EDIT_BUTTON_COLOR = QColor('#007bff')
+EDIT_BUTTON_HOVER_COLOR = QColor('#0056b3')
+EDIT_BUTTON_TEXT_COLOR = QColor('white')
+
+
+def apply_theme(app):
+    """Install the application stylesheet, once per application"""
+    if app.styleSheet() != APP_STYLESHEET:
+        app.setStyleSheet(APP_STYLESHEET)
+
+
+def set_style_state(widget, name, value):
+    """Set a dynamic property used by a stylesheet selector, re-polishing only on change"""
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    widget.style().unpolish(widget)
+    widget.style().polish(widget)
@@ -0,0 +1,145 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtWidgets import QStyledItemDelegate, QStyle, QApplication
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import Qt, QObject, QSize, pyqtSignal
+
+from card_model import ImagePathRole
+from image_handler import read_image
+
+# Upper bound on decoded thumbnail memory, on top of the entry limit
+THUMBNAIL_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def pixmap_bytes(pixmap):
+    """Approximate memory held by a pixmap"""
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class ThumbnailLoader(QObject):
+    """Decodes table thumbnails in a worker pool and keeps a bounded pixmap cache"""
+
+    thumbnail_ready = pyqtSignal(str)
+    # Emitted from worker threads, delivered on the GUI thread
+    image_decoded = pyqtSignal(str, object)
+
+    def __init__(self, image_handler, display_size=QSize(56, 36), cache_size=1000,
+                 max_bytes=THUMBNAIL_CACHE_BYTES, max_workers=2):
+        super().__init__()
+        self.image_handler = image_handler
+        self.display_size = display_size
+        self.cache_size = cache_size
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+        self.image_decoded.connect(self.on_image_decoded)
+
+    def pixmap(self, image_path):
+        """Get a cached thumbnail, or None if it has not been decoded yet"""
+        pixmap = self.cache.get(image_path)
+        if pixmap is not None:
+            self.cache.move_to_end(image_path)
+        return pixmap
+
+    def request(self, image_paths):
+        """Load the given paths in priority order and cancel requests no longer wanted"""
+        wanted = set(image_paths)
+        for path, future in list(self.pending.items()):
+            if path not in wanted and future.cancel():
+                del self.pending[path]
+
+        for path in image_paths:
+            if path in self.cache:
+                self.cache.move_to_end(path)
+            elif path not in self.pending:
+                self.pending[path] = self.executor.submit(self.decode, path)
+
+    def decode(self, image_path):
+        """Decode a thumbnail image (runs in the worker pool)"""
+        try:
+            source = self.resolve_path(image_path)
+            image = None
+            if source:
+                image = read_image(source, max(self.display_size.width(), self.display_size.height()) * 2)
+                image = image.scaled(
+                    self.display_size,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation
+                )
+        except Exception:
+            image = None
+        self.image_decoded.emit(image_path, image)
+
+    def resolve_path(self, image_path):
+        """Find the best file to decode: the stored thumbnail, then the full image"""
+        for candidate in (image_path, os.path.join(self.image_handler.image_dir, image_path)):
+            thumbnail = self.image_handler.thumbnail_path(candidate)
+            if os.path.exists(thumbnail):
+                return thumbnail
+            if os.path.exists(candidate):
+                return candidate
+        return ""
+
+    def on_image_decoded(self, image_path, image):
+        """Convert a decoded image to a pixmap on the GUI thread and cache it"""
+        self.pending.pop(image_path, None)
+        if image is None or image.isNull():
+            # Not cached, so the next viewport request retries: the file may
+            # still be in the middle of being ingested
+            return
+        pixmap = QPixmap.fromImage(image)
+        previous = self.cache.pop(image_path, None)
+        if previous is not None:
+            self.cache_bytes -= pixmap_bytes(previous)
+        self.cache[image_path] = pixmap
+        self.cache_bytes += pixmap_bytes(pixmap)
+        self.trim(self.max_bytes)
+        self.thumbnail_ready.emit(image_path)
+
+    def trim(self, max_bytes):
+        """Evict least recently used thumbnails until the cache fits both limits"""
+        while self.cache and (len(self.cache) > self.cache_size or self.cache_bytes > max_bytes):
+            _, pixmap = self.cache.popitem(last=False)
+            self.cache_bytes -= pixmap_bytes(pixmap)
+
+    def memory_usage(self):
+        """Bytes held by cached thumbnails"""
+        return self.cache_bytes
+
+    def shutdown(self):
+        """Cancel queued decodes and stop the worker pool"""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.executor.shutdown(wait=True)
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Paints cached thumbnails in the image column, falling back to Yes/No text"""
+
+    def __init__(self, loader, parent=None):
+        super().__init__(parent)
+        self.loader = loader
+
+    def paint(self, painter, option, index):
+        image_path = index.data(ImagePathRole)
+        pixmap = self.loader.pixmap(image_path) if image_path else None
+        if pixmap is None or pixmap.isNull():
+            super().paint(painter, option, index)
+            return
+
+        # Draw background/selection without the text, then the thumbnail centered
+        self.initStyleOption(option, index)
+        option.text = ""
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.ControlElement.CE_ItemViewItem, option, painter, option.widget)
+        x = option.rect.x() + (option.rect.width() - pixmap.width()) // 2
+        y = option.rect.y() + (option.rect.height() - pixmap.height()) // 2
+        painter.drawPixmap(x, y, pixmap)
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        return size.expandedTo(self.loader.display_size + QSize(4, 4))
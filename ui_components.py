@@ -1,12 +1,68 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-    QTableWidget, QTableWidgetItem, QTabWidget, QFormLayout, QDateEdit, 
-    QComboBox, QDoubleSpinBox, QMessageBox, QDialog
+    QTableView, QTabWidget, QFormLayout, QDateEdit, 
+    QComboBox, QDoubleSpinBox, QMessageBox, QDialog, QListWidget,
+    QStyledItemDelegate, QStyle, QApplication, QTableWidget, QTableWidgetItem,
+    QPlainTextEdit, QHeaderView, QCheckBox
 )
-from PyQt6.QtCore import Qt, QDate
-from PyQt6.QtGui import QPixmap, QColor, QGuiApplication
+from PyQt6.QtCore import Qt, QDate, QTimer, QEvent, QRectF, QItemSelection, QItemSelectionModel, pyqtSignal
+from PyQt6.QtGui import QPixmap, QGuiApplication, QPainter
+from cryptography.exceptions import InvalidTag
 import os
 
+from form_state import PriceFormState
+from image_handler import read_image, resolve_image_path
+from card_model import CardTableModel, IMAGE_COLUMN, ACTIONS_COLUMN
+from database import DERIVED_FIELDS, UPDATABLE_COLUMNS, VERSION_CONFLICT
+from pin_vault import is_encrypted, VaultLockedError
+from rapid_entry import RapidEntryPanel
+from selection_copy import selection_mime_data
+from intake_journal import is_locked_error
+from theme import set_style_state, EDIT_BUTTON_COLOR, EDIT_BUTTON_HOVER_COLOR, EDIT_BUTTON_TEXT_COLOR
+from thumbnails import ThumbnailLoader, ThumbnailDelegate
+
+# Rows to prefetch beyond the viewport, as a multiple of the visible row count
+THUMBNAIL_PREFETCH_PAGES = 2
+
+def values_differ(a, b):
+    """Compare stored and edited values, treating None like the other side's empty value
+    
+    A NULL number (e.g. expected_percent of cards added before that column
+    existed) matches the 0.0 the form shows for it.
+    """
+    def normalized(value, other):
+        if value is None:
+            return 0.0 if isinstance(other, (int, float)) else ''
+        return value
+    return normalized(a, b) != normalized(b, a)
+
+class OptionalDateEdit(QWidget):
+    """Date input that may be left empty, for dates like the expiry many cards don't have"""
+    
+    def __init__(self, label, parent=None):
+        super().__init__(parent)
+        self.enabled_input = QCheckBox(label)
+        self.date_input = QDateEdit()
+        self.date_input.setCalendarPopup(True)
+        self.enabled_input.toggled.connect(self.date_input.setEnabled)
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.enabled_input)
+        layout.addWidget(self.date_input, 1)
+        self.setLayout(layout)
+        self.set_date_text("")
+    
+    def date_text(self):
+        """The date as 'YYYY-MM-DD', or an empty string if unset"""
+        return self.date_input.date().toString("yyyy-MM-dd") if self.enabled_input.isChecked() else ""
+    
+    def set_date_text(self, text):
+        """Show a 'YYYY-MM-DD' date, or no date for an empty or unreadable one"""
+        date = QDate.fromString(text or "", "yyyy-MM-dd")
+        self.enabled_input.setChecked(date.isValid())
+        self.date_input.setEnabled(date.isValid())
+        self.date_input.setDate(date if date.isValid() else QDate.currentDate().addYears(1))
+
 class AddCardTab:
     def __init__(self, parent):
         self.parent = parent
@@ -35,7 +91,6 @@ class AddCardTab:
         self.expected_price_mode = QComboBox()
         self.expected_price_mode.addItems(["Amount ($)", "Percent (%)"])
         self.expected_price_mode.setCurrentIndex(0)
-        self.expected_price_mode.currentIndexChanged.connect(self.on_expected_price_mode_changed)
         # Add both widgets to the form
         expected_price_row = QHBoxLayout()
         expected_price_row.addWidget(self.expected_price_input)
@@ -43,16 +98,20 @@ class AddCardTab:
         form_layout.addRow("Expected Price:", expected_price_row)
         # Add percent input (hidden by default)
         self.expected_percent_input = QDoubleSpinBox()
-        self.expected_percent_input.setRange(0, 100)
+        self.expected_percent_input.setRange(0, 1000)
         self.expected_percent_input.setSuffix("%")
         self.expected_percent_input.setDecimals(2)
         self.expected_percent_input.setVisible(False)
         expected_price_row.addWidget(self.expected_percent_input)
-        self.expected_percent_input.valueChanged.connect(self.on_expected_percent_changed)
-        self.expected_price_input.valueChanged.connect(self.on_expected_price_changed)
+        # Keeps price, percent and profit in sync
+        self.form_state = PriceFormState(
+            self.purchase_price_input, self.expected_price_input, self.expected_percent_input,
+            self.expected_price_mode, self.profit_label
+        )
         form_layout.addRow("Profit:", self.profit_label)
         form_layout.addRow("Source:", self.source_input)
         form_layout.addRow("Purchase Date:", self.purchase_date_input)
+        form_layout.addRow("Expiry Date:", self.expiry_date_input)
         form_layout.addRow("Pending:", self.pending_input)
         form_layout.addRow("Sold Date:", self.sold_date_input)
         form_layout.addRow("Payment Received:", self.payment_received_input)
@@ -60,8 +119,12 @@ class AddCardTab:
         form_layout.addRow("Card Image:", self.upload_button)
         form_layout.addRow("", self.image_path_label)
         form_layout.addRow(self.add_button)
+        form_layout.addRow(self.rapid_entry_button)
         
-
+        # Scanner intake, shown while rapid entry mode is on
+        self.rapid_entry_panel = RapidEntryPanel(self.parent, self)
+        self.rapid_entry_panel.setVisible(False)
+        form_layout.addRow(self.rapid_entry_panel)
         
         form_layout.setContentsMargins(20, 10, 20, 10)
         form_layout.setSpacing(10)
@@ -105,7 +168,6 @@ class AddCardTab:
         self.expected_price_input.setDecimals(2)
         
         self.profit_label = QLabel("$0.00")
-        self.profit_label.setStyleSheet("font-weight: bold; color: green; font-size: 14px;")
         
         self.source_input = QComboBox()
         self.source_input.addItems(["Online Purchase", "Physical Store", "Gift", "Trade", "Other"])
@@ -115,6 +177,9 @@ class AddCardTab:
         self.purchase_date_input.setDate(QDate.currentDate())
         self.purchase_date_input.setCalendarPopup(True)
         
+        # Expiry date, for brands whose cards expire or charge inactivity fees
+        self.expiry_date_input = OptionalDateEdit("Expires")
+        
         # Pending status
         self.pending_input = QComboBox()
         self.pending_input.addItems(["Yes", "No"])
@@ -146,7 +211,11 @@ class AddCardTab:
         
         # Add Button
         self.add_button = QPushButton("Add Card")
-        self.add_button.setStyleSheet("background-color: #4CAF50; color: white; padding: 10px; font-size: 14px;")
+        self.add_button.setProperty("role", "primary")
+        
+        # Rapid entry mode for barcode scanners
+        self.rapid_entry_button = QPushButton("Rapid Entry Mode")
+        self.rapid_entry_button.setCheckable(True)
     
     def create_preview_widget(self):
         """Create the image preview widget"""
@@ -156,34 +225,14 @@ class AddCardTab:
         # Title with better styling
         title_label = QLabel("📷 Card Image Preview")
         title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        title_label.setStyleSheet("""
-            QLabel {
-                font-size: 16px;
-                font-weight: bold;
-                color: #2c3e50;
-                padding: 10px;
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ecf0f1, stop:1 #bdc3c7);
-                border-radius: 8px;
-                margin-bottom: 10px;
-            }
-        """)
+        title_label.setObjectName("previewTitle")
         
         # Enhanced image preview label
         self.image_preview_label = QLabel()
         self.image_preview_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.image_preview_label.setMinimumSize(150, 200)
         self.image_preview_label.setMaximumSize(250, 300)
-        self.image_preview_label.setStyleSheet("""
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:0.5 #f8f9fa, stop:1 #e9ecef);
-                border: 3px dashed #6c757d;
-                border-radius: 15px;
-                padding: 10px;
-                margin: 5px;
-            }
-        """)
+        self.image_preview_label.setObjectName("imagePreview")
         
         # Set default preview content
         self.set_default_preview()
@@ -191,14 +240,7 @@ class AddCardTab:
         # Info text
         info_label = QLabel("Click 'Upload Card Image' to add a photo")
         info_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        info_label.setStyleSheet("""
-            QLabel {
-                color: #6c757d;
-                font-size: 12px;
-                font-style: italic;
-                padding: 3px;
-            }
-        """)
+        info_label.setObjectName("previewHint")
         
         preview_layout.addWidget(title_label)
         preview_layout.addWidget(self.image_preview_label, 1)  # Give it stretch priority
@@ -211,19 +253,7 @@ class AddCardTab:
     def set_default_preview(self):
         """Set the default preview content with icon and text"""
         self.image_preview_label.setText("📱\n\nNo Image\n\nClick to Upload")
-        self.image_preview_label.setStyleSheet("""
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:0.5 #f8f9fa, stop:1 #e9ecef);
-                border: 3px dashed #6c757d;
-                border-radius: 15px;
-                padding: 10px;
-                margin: 5px;
-                font-size: 12px;
-                color: #6c757d;
-                font-weight: bold;
-            }
-        """)
+        set_style_state(self.image_preview_label, "state", "empty")
     
     def get_form_data(self):
         """Get all form data as a dictionary"""
@@ -241,7 +271,8 @@ class AddCardTab:
             'sold_date': self.sold_date_input.date().toString("yyyy-MM-dd") if self.pending_input.currentText() == "No" else "",
             'payment_received': self.payment_received_input.value() if self.pending_input.currentText() == "No" else 0.0,
             'payment_mode': self.payment_mode_input.currentText() if self.pending_input.currentText() == "No" else "",
-            'card_image_path': self.image_path_label.text() if self.image_path_label.text() != "No image selected" else ""
+            'card_image_path': self.image_path_label.text() if self.image_path_label.text() != "No image selected" else "",
+            'expiry_date': self.expiry_date_input.date_text()
         }
         return data
     
@@ -255,6 +286,7 @@ class AddCardTab:
         self.expected_price_input.setValue(0)
         self.source_input.setCurrentIndex(0)
         self.purchase_date_input.setDate(QDate.currentDate())
+        self.expiry_date_input.set_date_text("")
         self.pending_input.setCurrentText("Yes")
         self.on_pending_changed("Yes")
         self.sold_date_input.setDate(QDate.currentDate())
@@ -262,6 +294,18 @@ class AddCardTab:
         self.payment_mode_input.setCurrentIndex(0)
         self.image_path_label.setText("No image selected")
         self.set_default_preview()
+        self.form_state.load()
+    
+    def set_rapid_entry(self, enabled):
+        """Switch between the single-card form and scanner intake"""
+        # The remaining form fields stay editable as the sticky defaults
+        self.card_number_input.setEnabled(not enabled)
+        self.pin_input.setEnabled(not enabled)
+        self.upload_button.setEnabled(not enabled)
+        self.add_button.setEnabled(not enabled)
+        self.rapid_entry_panel.setVisible(enabled)
+        if enabled:
+            self.rapid_entry_panel.scan_input.setFocus()
     
     def on_pending_changed(self, value):
         """Handle pending status change - show/hide sold fields"""
@@ -275,55 +319,26 @@ class AddCardTab:
             self.sold_date_input.setVisible(False)
             self.payment_received_input.setVisible(False)
             self.payment_mode_input.setVisible(False)
-    
-    def update_profit(self):
-        """Update the profit calculation"""
-        purchase_price = self.purchase_price_input.value()
-        expected_price = self.expected_price_input.value()
-        profit = expected_price - purchase_price
-        self.profit_label.setText(f"${profit:.2f}")
-        if profit >= 0:
-            self.profit_label.setStyleSheet("font-weight: bold; color: green; font-size: 14px;")
-        else:
-            self.profit_label.setStyleSheet("font-weight: bold; color: red; font-size: 14px;")
-
-    def on_expected_price_mode_changed(self, idx):
-        if idx == 0:  # Amount
-            self.expected_price_input.setVisible(True)
-            self.expected_percent_input.setVisible(False)
-            # Update expected price from percent if needed
-            if self.expected_percent_input.value() > 0:
-                purchase_price = self.purchase_price_input.value()
-                percent = self.expected_percent_input.value()
-                self.expected_price_input.setValue(purchase_price * percent / 100)
-        else:  # Percent
-            self.expected_price_input.setVisible(False)
-            self.expected_percent_input.setVisible(True)
-            # Update percent from expected price if needed
-            if self.expected_price_input.value() > 0 and self.purchase_price_input.value() > 0:
-                percent = (self.expected_price_input.value() / self.purchase_price_input.value()) * 100
-                self.expected_percent_input.setValue(percent)
-    def on_expected_percent_changed(self, value):
-        if self.expected_price_mode.currentIndex() == 1:  # Percent mode
-            purchase_price = self.purchase_price_input.value()
-            self.expected_price_input.setValue(purchase_price * value / 100)
-            self.update_profit()
-    def on_expected_price_changed(self, value):
-        if self.expected_price_mode.currentIndex() == 0 and self.purchase_price_input.value() > 0:
-            percent = (value / self.purchase_price_input.value()) * 100
-            self.expected_percent_input.setValue(percent)
-            self.update_profit()
 
 class EditCardDialog(QDialog):
     """Dialog for editing an existing card"""
     
-    def __init__(self, parent, card_data, image_handler):
+    def __init__(self, parent, card_data, image_handler, db_manager=None):
         super().__init__(parent)
-        self.card_data = card_data
         self.image_handler = image_handler
+        self.db_manager = db_manager
         self.setup_ui()
-        self.populate_form()
         self.setup_connections()
+        self.load_card(card_data)
+    
+    def load_card(self, card_data):
+        """Show another card in this dialog, so one instance can be reused"""
+        self.card_data = card_data
+        self.new_image_selected = False
+        self.history_list.clear()
+        self.history_list.setVisible(False)
+        self.history_button.setText("Show History")
+        self.populate_form()
     
     def setup_ui(self):
         """Setup the edit dialog UI"""
@@ -339,7 +354,6 @@ class EditCardDialog(QDialog):
         # Card Number (read-only)
         self.card_number_input = QLineEdit()
         self.card_number_input.setReadOnly(True)
-        self.card_number_input.setStyleSheet("background-color: #f8f9fa; color: #6c757d;")
         form_layout.addRow("Card Number:", self.card_number_input)
         
         # Brand
@@ -371,7 +385,6 @@ class EditCardDialog(QDialog):
         self.expected_price_mode = QComboBox()
         self.expected_price_mode.addItems(["Amount ($)", "Percent (%)"])
         self.expected_price_mode.setCurrentIndex(0)
-        self.expected_price_mode.currentIndexChanged.connect(self.on_expected_price_mode_changed)
         # Add both widgets to the form
         expected_price_row = QHBoxLayout()
         expected_price_row.addWidget(self.expected_price_input)
@@ -379,13 +392,18 @@ class EditCardDialog(QDialog):
         form_layout.addRow("Expected Price:", expected_price_row)
         # Add percent input (hidden by default)
         self.expected_percent_input = QDoubleSpinBox()
-        self.expected_percent_input.setRange(0, 100)
+        self.expected_percent_input.setRange(0, 1000)
         self.expected_percent_input.setSuffix("%")
         self.expected_percent_input.setDecimals(2)
         self.expected_percent_input.setVisible(False)
         expected_price_row.addWidget(self.expected_percent_input)
-        self.expected_percent_input.valueChanged.connect(self.on_expected_percent_changed)
-        self.expected_price_input.valueChanged.connect(self.on_expected_price_changed)
+        self.profit_label = QLabel("$0.00")
+        # Same price/percent/profit engine as the Add Card form
+        self.form_state = PriceFormState(
+            self.purchase_price_input, self.expected_price_input, self.expected_percent_input,
+            self.expected_price_mode, self.profit_label, self
+        )
+        self.form_state.expected_price_edited.connect(self.on_expected_price_changed)
         form_layout.addRow("Profit:", self.profit_label)
         
         # Source
@@ -399,6 +417,10 @@ class EditCardDialog(QDialog):
         self.purchase_date_input.setCalendarPopup(True)
         form_layout.addRow("Purchase Date:", self.purchase_date_input)
         
+        # Expiry Date
+        self.expiry_date_input = OptionalDateEdit("Expires")
+        form_layout.addRow("Expiry Date:", self.expiry_date_input)
+        
         # Pending Status
         self.pending_input = QComboBox()
         self.pending_input.addItems(["No", "Yes"])
@@ -429,7 +451,7 @@ class EditCardDialog(QDialog):
         
         # Image path label
         self.image_path_label = QLabel("No image selected")
-        self.image_path_label.setStyleSheet("color: #6c757d; font-style: italic;")
+        self.image_path_label.setObjectName("hintLabel")
         
         # Upload button
         self.upload_button = QPushButton("Upload Image")
@@ -443,25 +465,24 @@ class EditCardDialog(QDialog):
         self.image_preview_label = QLabel()
         self.image_preview_label.setFixedSize(120, 80)
         self.image_preview_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.image_preview_label.setStyleSheet("""
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:0.5 #f8f9fa, stop:1 #e9ecef);
-                border: 2px dashed #6c757d;
-                border-radius: 10px;
-                padding: 5px;
-                margin: 3px;
-            }
-        """)
+        self.image_preview_label.setObjectName("dialogImagePreview")
         self.set_default_preview()
         
+        # Change history, only queried when shown
+        self.history_button = QPushButton("Show History")
+        self.history_button.setVisible(self.db_manager is not None)
+        self.history_button.clicked.connect(self.toggle_history)
+        self.history_list = QListWidget()
+        self.history_list.setVisible(False)
+        
         # Buttons
         button_layout = QHBoxLayout()
         self.save_button = QPushButton("Save Changes")
-        self.save_button.setStyleSheet("background-color: #28a745; color: white; padding: 8px 15px; border-radius: 5px; font-weight: bold;")
+        self.save_button.setProperty("role", "success")
         self.cancel_button = QPushButton("Cancel")
-        self.cancel_button.setStyleSheet("background-color: #6c757d; color: white; padding: 8px 15px; border-radius: 5px;")
+        self.cancel_button.setProperty("role", "secondary")
         
+        button_layout.addWidget(self.history_button)
         button_layout.addStretch()
         button_layout.addWidget(self.cancel_button)
         button_layout.addWidget(self.save_button)
@@ -470,6 +491,7 @@ class EditCardDialog(QDialog):
         layout.addLayout(form_layout)
         layout.addLayout(image_layout)
         layout.addWidget(self.image_preview_label, alignment=Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.history_list)
         layout.addStretch()
         layout.addLayout(button_layout)
         
@@ -477,10 +499,7 @@ class EditCardDialog(QDialog):
     
     def setup_connections(self):
         """Setup signal connections"""
-        self.purchase_price_input.valueChanged.connect(self.update_profit)
-        self.expected_price_input.valueChanged.connect(self.update_profit)
         self.pending_input.currentTextChanged.connect(self.on_pending_changed)
-        self.expected_price_input.valueChanged.connect(self.on_expected_price_changed)
         
         self.save_button.clicked.connect(self.accept)
         self.cancel_button.clicked.connect(self.reject)
@@ -493,6 +512,7 @@ class EditCardDialog(QDialog):
         self.denomination_input.setValue(float(self.card_data.get('denomination', 0)))
         self.purchase_price_input.setValue(float(self.card_data.get('purchase_price', 0)))
         self.expected_price_input.setValue(float(self.card_data.get('expected_price', 0)))
+        self.expected_percent_input.setValue(float(self.card_data.get('expected_percent') or 0))
         
         # Set source
         source = self.card_data.get('source', '')
@@ -513,8 +533,11 @@ class EditCardDialog(QDialog):
         else:
             self.purchase_date_input.setDate(QDate.currentDate())
         
+        # Set expiry date
+        self.expiry_date_input.set_date_text(self.card_data.get('expiry_date') or '')
+        
         # Set pending status
-        pending = self.card_data.get('is_pending', 'No')
+        pending = self.card_data.get('pending', 'No')
         index = self.pending_input.findText(pending)
         if index >= 0:
             self.pending_input.setCurrentIndex(index)
@@ -543,48 +566,68 @@ class EditCardDialog(QDialog):
         
         # Set image
         image_path = self.card_data.get('card_image_path', '')
-        if image_path:
-            # Check if it's a full path or just filename
-            if os.path.exists(image_path):
-                self.image_path_label.setText(os.path.basename(image_path))
-                self.load_image_preview(image_path)
-            elif os.path.exists(os.path.join("card_images", image_path)):
-                full_path = os.path.join("card_images", image_path)
-                self.image_path_label.setText(image_path)
-                self.load_image_preview(full_path)
-            else:
-                self.image_path_label.setText("No image selected")
-                self.set_default_preview()
+        if image_path and self.card_data.get('image_exists') == 0:
+            # Known missing from the last image check, so nothing is decoded
+            self.image_path_label.setText(f"Missing: {os.path.basename(image_path)}")
+            self.set_default_preview()
+        elif image_path:
+            self.image_path_label.setText(os.path.basename(image_path))
+            self.load_image_preview(resolve_image_path(image_path))
         else:
             self.image_path_label.setText("No image selected")
             self.set_default_preview()
         
         # Update profit and pending fields visibility
-        self.update_profit()
+        self.form_state.load()
         self.on_pending_changed(pending)
     
+    def toggle_history(self):
+        """Show or hide the card's change history, loading it on first show"""
+        if self.history_list.isVisible():
+            self.history_list.setVisible(False)
+            self.history_button.setText("Show History")
+            return
+        
+        if self.history_list.count() == 0:
+            for event in self.db_manager.get_card_history(self.card_data.get('card_number', '')):
+                self.history_list.addItem(f"{event['created_at']}  {self.describe_event(event)}")
+            if self.history_list.count() == 0:
+                self.history_list.addItem("No recorded changes")
+        self.history_list.setVisible(True)
+        self.history_button.setText("Hide History")
+    
+    @staticmethod
+    def describe_event(event):
+        """One-line description of an audit event"""
+        if event['event_type'] == 'create':
+            return "Card added"
+        if event['event_type'] == 'delete':
+            return "Card deleted"
+        return "; ".join(
+            f"{column.replace('_', ' ').title()}: {old if old not in (None, '') else '-'} → {new if new not in (None, '') else '-'}"
+            for column, (old, new) in event['changes'].items()
+        )
+    
     def upload_image(self):
         """Upload a new image for the card"""
         success, filename = self.image_handler.upload_image(self)
         if success:
+            self.new_image_selected = True
             self.image_path_label.setText(filename)
             self.load_image_preview(self.image_handler.get_image_path())
     
     def load_image_preview(self, image_path):
         """Load and display image preview"""
-        if image_path and os.path.exists(image_path):
-            pixmap = QPixmap(image_path)
+        if image_path:
+            # Decoded at preview size so a large photo never sits in memory at full resolution
+            try:
+                pixmap = QPixmap.fromImage(read_image(image_path, 240))
+            except Exception:
+                pixmap = QPixmap()
             if not pixmap.isNull():
                 scaled_pixmap = pixmap.scaled(120, 80, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
                 self.image_preview_label.setPixmap(scaled_pixmap)
-                self.image_preview_label.setStyleSheet("""
-                    QLabel {
-                        border: 2px solid #28a745;
-                        border-radius: 10px;
-                        padding: 2px;
-                        margin: 3px;
-                    }
-                """)
+                set_style_state(self.image_preview_label, "state", "image")
                 return
         
         self.set_default_preview()
@@ -592,19 +635,7 @@ class EditCardDialog(QDialog):
     def set_default_preview(self):
         """Set the default preview content"""
         self.image_preview_label.setText("📱\n\nNo Image")
-        self.image_preview_label.setStyleSheet("""
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:0.5 #f8f9fa, stop:1 #e9ecef);
-                border: 2px dashed #6c757d;
-                border-radius: 10px;
-                padding: 5px;
-                margin: 3px;
-                font-size: 10px;
-                color: #6c757d;
-                font-weight: bold;
-            }
-        """)
+        set_style_state(self.image_preview_label, "state", "empty")
     
     def get_form_data(self):
         """Get all form data as a dictionary"""
@@ -622,7 +653,9 @@ class EditCardDialog(QDialog):
             'sold_date': self.sold_date_input.date().toString("yyyy-MM-dd") if self.pending_input.currentText() == "No" else "",
             'payment_received': self.payment_received_input.value() if self.pending_input.currentText() == "No" else 0.0,
             'payment_mode': self.payment_mode_input.currentText() if self.pending_input.currentText() == "No" else "",
-            'card_image_path': self.image_path_label.text() if self.image_path_label.text() != "No image selected" else self.card_data.get('card_image_path', '')
+            # A newly uploaded image is ingested by the caller after the dialog is accepted
+            'card_image_path': self.card_data.get('card_image_path', ''),
+            'expiry_date': self.expiry_date_input.date_text()
         }
         return data
     
@@ -641,22 +674,335 @@ class EditCardDialog(QDialog):
         """Update payment received when expected price changes"""
         if self.pending_input.currentText() == "No":  # Only update if card is sold
             self.payment_received_input.setValue(value)
+
+class SlowQueryDialog(QDialog):
+    """Shows the slow query log of a SqlTracer, newest first"""
     
-    def update_profit(self):
-        """Update the profit calculation"""
-        purchase_price = self.purchase_price_input.value()
-        expected_price = self.expected_price_input.value()
-        profit = expected_price - purchase_price
-        self.profit_label.setText(f"${profit:.2f}")
-        if profit >= 0:
-            self.profit_label.setStyleSheet("font-weight: bold; color: green; font-size: 14px;")
-        else:
-            self.profit_label.setStyleSheet("font-weight: bold; color: red; font-size: 14px;")
+    def __init__(self, parent, tracer):
+        super().__init__(parent)
+        self.tracer = tracer
+        self.entries = []
+        self.setup_ui()
+        self.refresh()
+    
+    def setup_ui(self):
+        """Setup the query list, plan view and buttons"""
+        self.setWindowTitle("Slow Queries")
+        self.resize(900, 600)
+        layout = QVBoxLayout()
+        
+        self.query_table = QTableWidget(0, 5)
+        self.query_table.setHorizontalHeaderLabels(["Time", "Duration (ms)", "Rows", "Full Scan", "Statement"])
+        self.query_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
+        self.query_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.query_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.query_table.currentCellChanged.connect(self.show_plan)
+        
+        self.plan_view = QPlainTextEdit()
+        self.plan_view.setReadOnly(True)
+        self.plan_view.setMaximumHeight(160)
+        
+        button_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.clear_button = QPushButton("Clear")
+        self.clear_button.clicked.connect(self.clear)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.accept)
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addWidget(self.clear_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        
+        layout.addWidget(QLabel(f"Statements slower than {self.tracer.threshold_ms:g} ms"))
+        layout.addWidget(self.query_table, 1)
+        layout.addWidget(QLabel("Query plan:"))
+        layout.addWidget(self.plan_view)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+    
+    def refresh(self):
+        """Reload the log from the tracer"""
+        self.entries = list(reversed(self.tracer.slow_queries))
+        self.query_table.setRowCount(len(self.entries))
+        for row, entry in enumerate(self.entries):
+            values = [entry['time'], f"{entry['duration_ms']:.1f}", str(entry['rows']),
+                      "Yes" if entry['full_scan'] else "", entry['sql']]
+            for column, value in enumerate(values):
+                self.query_table.setItem(row, column, QTableWidgetItem(value))
+        self.plan_view.clear()
+    
+    def clear(self):
+        """Empty the slow query log"""
+        self.tracer.clear()
+        self.refresh()
+    
+    def show_plan(self, row, *_):
+        """Show the statement and plan of the selected entry"""
+        if not 0 <= row < len(self.entries):
+            self.plan_view.clear()
+            return
+        entry = self.entries[row]
+        lines = [entry['sql'], ""] + (entry['plan'] or ["(no plan captured)"])
+        if entry.get('error'):
+            lines += ["", f"Error: {entry['error']}"]
+        self.plan_view.setPlainText("\n".join(lines))
+
+class PricingRulesDialog(QDialog):
+    """Edits the pricing rules and reprices unsold cards after previewing the changes"""
+    
+    def __init__(self, parent, db_manager):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.rules = []
+        self.repriced = False
+        self.setup_ui()
+        self.refresh()
+    
+    def setup_ui(self):
+        """Setup the rule list, rule form, preview and buttons"""
+        self.setWindowTitle("Pricing Rules")
+        self.resize(800, 650)
+        layout = QVBoxLayout()
+        
+        self.rule_table = QTableWidget(0, 4)
+        self.rule_table.setHorizontalHeaderLabels(["Brand", "Source", "Denomination", "Expected %"])
+        self.rule_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.rule_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.rule_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        
+        # New rule; empty fields and zero limits match any card
+        rule_layout = QHBoxLayout()
+        self.brand_input = QLineEdit()
+        self.brand_input.setPlaceholderText("Any brand")
+        self.source_input = QLineEdit()
+        self.source_input.setPlaceholderText("Any source")
+        self.min_denomination_input = QDoubleSpinBox()
+        self.min_denomination_input.setRange(0, 999999.99)
+        self.min_denomination_input.setPrefix("from $")
+        self.max_denomination_input = QDoubleSpinBox()
+        self.max_denomination_input.setRange(0, 999999.99)
+        self.max_denomination_input.setPrefix("below $")
+        self.max_denomination_input.setSpecialValueText("no limit")
+        self.percent_input = QDoubleSpinBox()
+        self.percent_input.setRange(0, 1000)
+        self.percent_input.setDecimals(2)
+        self.percent_input.setSuffix("%")
+        self.add_button = QPushButton("Add Rule")
+        self.add_button.clicked.connect(self.add_rule)
+        self.delete_button = QPushButton("Delete Rule")
+        self.delete_button.clicked.connect(self.delete_rule)
+        for widget in (self.brand_input, self.source_input, self.min_denomination_input,
+                       self.max_denomination_input, self.percent_input, self.add_button, self.delete_button):
+            rule_layout.addWidget(widget)
+        
+        self.summary_label = QLabel()
+        self.preview_table = QTableWidget(0, 5)
+        self.preview_table.setHorizontalHeaderLabels(["Card Number", "Brand", "Purchase Price", "Expected Price", "New Expected Price"])
+        self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.preview_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        
+        button_layout = QHBoxLayout()
+        self.apply_button = QPushButton("Reprice Cards")
+        self.apply_button.clicked.connect(self.apply_rules)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(self.apply_button)
+        button_layout.addWidget(self.close_button)
+        
+        layout.addWidget(QLabel("The most specific matching rule sets the expected price of each unsold card:"))
+        layout.addWidget(self.rule_table, 1)
+        layout.addLayout(rule_layout)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.preview_table, 2)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+    
+    def refresh(self):
+        """Reload the rules and the preview of what repricing would change"""
+        self.rules = self.db_manager.get_pricing_rules()
+        self.rule_table.setRowCount(len(self.rules))
+        for row, rule in enumerate(self.rules):
+            band = "Any"
+            if rule['min_denomination'] is not None or rule['max_denomination'] is not None:
+                band = f"${rule['min_denomination'] or 0:.2f} – " + (
+                    f"${rule['max_denomination']:.2f}" if rule['max_denomination'] is not None else "")
+            values = [rule['brand'] or "Any", rule['source'] or "Any", band, f"{rule['percent']:g}%"]
+            for column, value in enumerate(values):
+                self.rule_table.setItem(row, column, QTableWidgetItem(value))
+        
+        preview = self.db_manager.preview_repricing()
+        self.summary_label.setText(
+            f"{preview['count']} card(s) would be repriced, changing expected revenue by ${preview['profit_change']:+.2f}"
+            + (f" (first {len(preview['rows'])} shown)" if len(preview['rows']) < preview['count'] else "")
+        )
+        self.preview_table.setRowCount(len(preview['rows']))
+        for row, (card_number, brand, purchase_price, old_price, new_price, _) in enumerate(preview['rows']):
+            values = [card_number, brand or "", f"${purchase_price or 0:.2f}", f"${old_price or 0:.2f}", f"${new_price:.2f}"]
+            for column, value in enumerate(values):
+                self.preview_table.setItem(row, column, QTableWidgetItem(value))
+        self.apply_button.setEnabled(preview['count'] > 0)
+    
+    def add_rule(self):
+        """Add the rule in the form"""
+        success, message = self.db_manager.add_pricing_rule({
+            'brand': self.brand_input.text(),
+            'source': self.source_input.text(),
+            'min_denomination': self.min_denomination_input.value(),
+            'max_denomination': self.max_denomination_input.value(),
+            'percent': self.percent_input.value(),
+        })
+        if not success:
+            QMessageBox.warning(self, "Pricing Rules", message)
+            return
+        self.brand_input.clear()
+        self.source_input.clear()
+        self.refresh()
+    
+    def delete_rule(self):
+        """Delete the selected rules"""
+        rows = sorted({index.row() for index in self.rule_table.selectedIndexes()})
+        for row in rows:
+            self.db_manager.delete_pricing_rule(self.rules[row]['id'])
+        if rows:
+            self.refresh()
+    
+    def apply_rules(self):
+        """Reprice the previewed cards in one transaction"""
+        success, message = self.db_manager.apply_pricing_rules()
+        if not success:
+            QMessageBox.warning(self, "Pricing Rules", f"Repricing failed: {message}")
+            return
+        self.repriced = True
+        QMessageBox.information(self, "Pricing Rules", message)
+        self.refresh()
+
+class UsersDialog(QDialog):
+    """Adds, changes and deletes the users and their roles"""
+    
+    def __init__(self, parent, db_manager):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.users = []
+        self.setup_ui()
+        self.refresh()
+    
+    def setup_ui(self):
+        """Setup the user list, user form and buttons"""
+        self.setWindowTitle("Users")
+        self.resize(600, 450)
+        layout = QVBoxLayout()
+        
+        self.user_table = QTableWidget(0, 3)
+        self.user_table.setHorizontalHeaderLabels(["Name", "Role", "Source"])
+        self.user_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.user_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.user_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.user_table.itemSelectionChanged.connect(self.on_user_selected)
+        
+        # Saving an existing name changes that user
+        user_layout = QHBoxLayout()
+        self.name_input = QLineEdit()
+        self.name_input.setPlaceholderText("Name")
+        self.role_input = QComboBox()
+        self.role_input.addItems([role['name'] for role in self.db_manager.get_roles()])
+        self.source_input = QLineEdit()
+        self.source_input.setPlaceholderText("Source (sellers see its cards)")
+        self.save_button = QPushButton("Save User")
+        self.save_button.clicked.connect(self.save_user)
+        self.delete_button = QPushButton("Delete User")
+        self.delete_button.clicked.connect(self.delete_user)
+        for widget in (self.name_input, self.role_input, self.source_input, self.save_button, self.delete_button):
+            user_layout.addWidget(widget)
+        
+        button_layout = QHBoxLayout()
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        
+        layout.addWidget(QLabel("Users sign in with --user or when the app starts; their role decides what they see:"))
+        layout.addWidget(self.user_table, 1)
+        layout.addLayout(user_layout)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+    
+    def refresh(self):
+        """Reload the users"""
+        self.users = self.db_manager.get_users()
+        self.user_table.setRowCount(len(self.users))
+        for row, user in enumerate(self.users):
+            for column, value in enumerate([user['name'], user['role'], user['source'] or ""]):
+                self.user_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def on_user_selected(self):
+        """Load the selected user into the form"""
+        rows = sorted({index.row() for index in self.user_table.selectedIndexes()})
+        if not rows:
+            return
+        user = self.users[rows[0]]
+        self.name_input.setText(user['name'])
+        self.role_input.setCurrentText(user['role'])
+        self.source_input.setText(user['source'] or "")
+    
+    def save_user(self):
+        """Add the user in the form, or change it if the name exists"""
+        success, message = self.db_manager.save_user(
+            self.name_input.text(), self.role_input.currentText(), self.source_input.text())
+        if not success:
+            QMessageBox.warning(self, "Users", message)
+            return
+        self.name_input.clear()
+        self.source_input.clear()
+        self.refresh()
+    
+    def delete_user(self):
+        """Delete the selected users"""
+        rows = sorted({index.row() for index in self.user_table.selectedIndexes()})
+        for row in rows:
+            success, message = self.db_manager.delete_user(self.users[row]['name'])
+            if not success:
+                QMessageBox.warning(self, "Users", message)
+        if rows:
+            self.refresh()
+
+class EditButtonDelegate(QStyledItemDelegate):
+    """Paints an edit button in each Actions cell and reports clicks by row"""
+    
+    clicked = pyqtSignal(int)
+    
+    def paint(self, painter, option, index):
+        self.initStyleOption(option, index)
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.ControlElement.CE_ItemViewItem, option, painter, option.widget)
+        
+        hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+        rect = QRectF(option.rect.adjusted(6, 6, -6, -6))
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(EDIT_BUTTON_HOVER_COLOR if hovered else EDIT_BUTTON_COLOR)
+        painter.drawRoundedRect(rect, 3, 3)
+        painter.setPen(EDIT_BUTTON_TEXT_COLOR)
+        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, "✏️ Edit")
+        painter.restore()
+    
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.Type.MouseButtonRelease
+                and event.button() == Qt.MouseButton.LeftButton
+                and option.rect.contains(event.position().toPoint())):
+            self.clicked.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
 
 class ViewCardsTab(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
+        self.last_scroll_value = 0
+        self.scroll_direction = 1
+        self.edit_dialog = None
         self.setup_ui()
         self.table.installEventFilter(self)
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
@@ -671,22 +1017,11 @@ class ViewCardsTab(QWidget):
         self.view_button = QPushButton("Refresh Cards")
         self.save_button = QPushButton("Save Changes")
         self.delete_button = QPushButton("Delete Selected")
-        self.delete_button.setStyleSheet("background-color: #f44336; color: white;")
+        self.delete_button.setProperty("role", "danger")
         
         # Export to Excel button
         self.export_button = QPushButton("📊 Export to Excel")
-        self.export_button.setStyleSheet("""
-            QPushButton {
-                background-color: #28a745;
-                color: white;
-                padding: 8px 15px;
-                border-radius: 5px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #218838;
-            }
-        """)
+        self.export_button.setProperty("role", "success")
         
         button_layout.addWidget(self.view_button)
         button_layout.addWidget(self.save_button)
@@ -695,13 +1030,26 @@ class ViewCardsTab(QWidget):
         button_layout.addWidget(self.export_button)
         
         # Table
-        self.table = QTableWidget()
-        self.table.setColumnCount(15)  # Reduced by one column
-        self.table.setHorizontalHeaderLabels([
-            "Card Number", "Brand", "PIN", "Denomination", 
-            "Purchase Price", "Expected Price", "Profit", "Source", "Purchase Date", 
-            "Pending", "Sold Date", "Payment Received", "Payment Mode", "Image", "Actions"
-        ])
+        self.model = CardTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        
+        # Inline thumbnails, decoded in the background for the visible rows
+        self.thumbnail_loader = ThumbnailLoader(self.parent.image_handler)
+        self.thumbnail_loader.thumbnail_ready.connect(lambda _: self.table.viewport().update())
+        self.table.setItemDelegateForColumn(IMAGE_COLUMN, ThumbnailDelegate(self.thumbnail_loader, self.table))
+        self.table.verticalHeader().setDefaultSectionSize(self.thumbnail_loader.display_size.height() + 4)
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(30)
+        self.thumbnail_timer.timeout.connect(self.request_visible_thumbnails)
+        self.table.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+        
+        # Edit buttons are painted by a delegate instead of one widget per row
+        self.edit_delegate = EditButtonDelegate(self.table)
+        self.edit_delegate.clicked.connect(self.edit_card)
+        self.table.setItemDelegateForColumn(ACTIONS_COLUMN, self.edit_delegate)
+        self.table.setMouseTracking(True)
         
         # Set column widths for better display
         column_widths = [
@@ -718,7 +1066,7 @@ class ViewCardsTab(QWidget):
             100,  # Sold Date
             120,  # Payment Received
             100,  # Payment Mode
-            60,   # Image
+            70,   # Image
             80    # Actions
         ]
         
@@ -726,199 +1074,268 @@ class ViewCardsTab(QWidget):
             self.table.setColumnWidth(i, width)
         
         # Enable horizontal scrolling
-        self.table.setHorizontalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
+        self.table.setHorizontalScrollMode(QTableView.ScrollMode.ScrollPerPixel)
         self.table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         
+        # Header clicks sort through the model, which keeps the order across refreshes
+        header = self.table.horizontalHeader()
+        header.setSortIndicator(-1, Qt.SortOrder.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        header.sortIndicatorChanged.connect(self.on_sort_indicator_changed)
+        
         # Additional table improvements
         self.table.setAlternatingRowColors(False)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
         self.table.setWordWrap(False)  # Prevent text wrapping in cells
         
-        # Set table style
-        self.table.setStyleSheet("""
-            QTableWidget {
-                gridline-color: #d0d0d0;
-                background-color: #232323;
-                alternate-background-color: #2c2c2c;
-                selection-background-color: #007bff;
-                selection-color: white;
-                color: #222;
-            }
-            QTableWidget::viewport {
-                background: #232323;
-            }
-            QTableWidget::item {
-                padding: 5px;
-                border: none;
-            }
-            QTableWidget::item:selected {
-                background-color: #007bff;
-                color: white;
-            }
-            QHeaderView::section {
-                background-color: #232323;
-                padding: 8px;
-                border: 1px solid #444;
-                font-weight: bold;
-                color: #fff;
-            }
-        """)
+        # Styled by the application stylesheet; row colors come from the model
+        self.table.setObjectName("cardTable")
+        
+        # Inventory totals, summed in the background after each load
+        self.totals = None
+        self.totals_version = None
+        self.totals_label = QLabel("")
+        title_layout = QHBoxLayout()
+        title_layout.addWidget(QLabel("All Gift Cards"))
+        title_layout.addStretch()
+        title_layout.addWidget(self.totals_label)
         
         layout.addLayout(button_layout)
-        layout.addWidget(QLabel("All Gift Cards"))
+        layout.addLayout(title_layout)
         layout.addWidget(self.table)
         
         self.layout = layout
     
-    def populate_table(self, cards_data):
-        """Populate the table with card data"""
-        self.table.setRowCount(0)
-        
-        if not cards_data:
+    def load_cards(self, storage):
+        """Show the cards of a storage, fetching further pages as the table scrolls"""
+        self.model.load(storage)
+        self.thumbnail_timer.start()
+    
+    def restore_cards(self, storage, snapshot):
+        """Show the first page and totals saved by the last session while they are refreshed"""
+        self.model.restore(storage, snapshot)
+        if snapshot.get('totals'):
+            self.show_totals(snapshot['totals'], snapshot['data_version'])
+        self.thumbnail_timer.start()
+    
+    def show_totals(self, totals, data_version):
+        """Show the inventory totals as of a storage data version"""
+        self.totals = totals
+        self.totals_version = data_version
+        if not totals:
+            self.totals_label.setText("")
             return
-        
-        for row_number, row_data in enumerate(cards_data):
-            self.table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                try:
-                    if column_number == 2:  # PIN column (was 3)
-                        display_text = "*" * len(str(data)) if data else ""
-                        item = QTableWidgetItem(display_text)
-                    elif column_number in [3, 4, 5, 6, 11]:  # Money columns (shifted indices)
-                        if data is not None:
-                            item = QTableWidgetItem(f"${float(data):.2f}")
-                        else:
-                            item = QTableWidgetItem("$0.00")
-                    elif column_number == 13:  # Image column (was 14)
-                        item = QTableWidgetItem("Yes" if data else "No")
-                    else:
-                        item = QTableWidgetItem(str(data) if data is not None else "")
-                    
-                    # Make Card Number non-editable, others editable
-                    if column_number == 0:
-                        item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
-                    else:
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-                    
-                    self.table.setItem(row_number, column_number, item)
-                except Exception as e:
-                    item = QTableWidgetItem(str(data) if data is not None else "")
-                    self.table.setItem(row_number, column_number, item)
-            
-            # Highlight row if Pending == 'No', else set text color to white
-            pending_col_index = 10
-            pending_value = str(row_data[pending_col_index]).strip().lower()
-            if pending_value.startswith('no'):
-                for col in range(self.table.columnCount()):
-                    cell_item = self.table.item(row_number, col)
-                    if cell_item:
-                        cell_item.setBackground(QColor('#2e4736'))
-                        cell_item.setData(Qt.ItemDataRole.BackgroundRole, QColor('#2e4736'))
-                        cell_item.setForeground(QColor('#7CFC98'))  # Light green font for No
-            else:
-                for col in range(self.table.columnCount()):
-                    cell_item = self.table.item(row_number, col)
-                    if cell_item:
-                        cell_item.setForeground(QColor('#fff'))
-            
-            # Add edit button in the last column
-            edit_button = QPushButton("✏️ Edit")
-            edit_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #007bff;
-                    color: white;
-                    border: none;
-                    padding: 5px 10px;
-                    border-radius: 3px;
-                    font-size: 11px;
-                }
-                QPushButton:hover {
-                    background-color: #0056b3;
-                }
-            """)
-            edit_button.clicked.connect(lambda checked, row=row_number: self.edit_card(row))
-            self.table.setCellWidget(row_number, 14, edit_button) # Adjusted column index
-    
-    def get_table_data(self):
-        """Get all data from the table"""
-        data = []
-        for row in range(self.table.rowCount()):
-            row_data = []
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    text = item.text()
-                    if col in [4, 5, 6, 7, 12]:  # Money columns (including Payment Received)
-                        text = text.replace("$", "")
-                    row_data.append(text)
-                else:
-                    row_data.append("")
-            data.append(row_data)
-        return data
+        parts = [f"{totals['count']:,} cards ({totals['unsold']:,} unsold)"]
+        # Totals the session's role may not see are None
+        for label, key in (("Face value", 'denomination'), ("Cost", 'purchase_price'),
+                           ("Expected profit", 'profit'), ("Realized profit", 'realized_profit')):
+            if totals[key] is not None:
+                parts.append(f"{label} ${totals[key]:,.2f}")
+        self.totals_label.setText(" · ".join(parts))
+    
+    def on_sort_indicator_changed(self, section, order):
+        """Keep the sort indicator off columns without a sort key, such as Actions"""
+        if not self.model.is_sortable(section):
+            header = self.table.horizontalHeader()
+            header.blockSignals(True)
+            header.setSortIndicator(self.model.sort_column, self.model.sort_order)
+            header.blockSignals(False)
+        self.thumbnail_timer.start()
+    
+    def on_scrolled(self, value):
+        """Track scroll direction and schedule thumbnail loading for the new viewport"""
+        self.scroll_direction = 1 if value >= self.last_scroll_value else -1
+        self.last_scroll_value = value
+        self.thumbnail_timer.start()
+    
+    def request_visible_thumbnails(self):
+        """Request thumbnails for the visible rows plus a prefetch margin in scroll direction"""
+        row_count = self.model.rowCount()
+        if row_count == 0:
+            self.thumbnail_loader.request([])
+            return
+        first = self.table.rowAt(0)
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        first = first if first >= 0 else 0
+        last = last if last >= 0 else row_count - 1
+        
+        margin = (last - first + 1) * THUMBNAIL_PREFETCH_PAGES
+        if self.scroll_direction > 0:
+            ahead = range(last + 1, min(row_count, last + 1 + margin))
+        else:
+            ahead = range(first - 1, max(-1, first - 1 - margin), -1)
+        
+        paths = []
+        for row in list(range(first, last + 1)) + list(ahead):
+            path = self.model.image_path(row)
+            if path:
+                paths.append(path)
+        self.thumbnail_loader.request(paths)
     
     def get_selected_rows(self):
         """Get selected row indices"""
-        return set(item.row() for item in self.table.selectedItems())
+        return set(index.row() for index in self.table.selectionModel().selectedRows())
+    
+    def position(self):
+        """(card number at the top of the table, selected card numbers) for restoring later"""
+        top = self.table.rowAt(0)
+        top_card = self.model.card_at(top)['card_number'] if top >= 0 else ""
+        return top_card, [self.model.card_at(row)['card_number'] for row in sorted(self.get_selected_rows())]
+    
+    def restore_position(self, top_card, selected_cards):
+        """Scroll a card to the top and select cards again, as far as they are loaded"""
+        selection = QItemSelection()
+        for card_number in selected_cards:
+            row = self.model.row_by_card.get(card_number)
+            if row is not None:
+                selection.select(self.model.index(row, 0), self.model.index(row, self.model.columnCount() - 1))
+        if not selection.isEmpty():
+            self.table.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        row = self.model.row_by_card.get(top_card)
+        if row is not None:
+            self.table.scrollTo(self.model.index(row, 0), QTableView.ScrollHint.PositionAtTop)
     
     def edit_card(self, row):
         """Open edit dialog for the specified row"""
-        def safe_float(item):
-            text = item.text() if item else ''
-            text = text.replace('$', '').strip()
-            return float(text) if text else 0.0
-        # Get card data from the row
-        card_data = {}
-        card_data['card_number'] = self.table.item(row, 0).text()
-        card_data['brand'] = self.table.item(row, 1).text()
-        card_data['pin'] = self.table.item(row, 2).text()  # This will be masked, need to get from database
-        card_data['denomination'] = safe_float(self.table.item(row, 3))
-        card_data['purchase_price'] = safe_float(self.table.item(row, 4))
-        card_data['expected_price'] = safe_float(self.table.item(row, 5))
-        card_data['profit'] = card_data['expected_price'] - card_data['purchase_price']
-        card_data['source'] = self.table.item(row, 7).text()
-        card_data['purchase_date'] = self.table.item(row, 8).text()
-        card_data['pending'] = self.table.item(row, 9).text()
-        card_data['sold_date'] = self.table.item(row, 10).text()
-        card_data['payment_received'] = safe_float(self.table.item(row, 11))
-        card_data['payment_mode'] = self.table.item(row, 12).text()
-        card_data['card_image_path'] = self.table.item(row, 13).text()  # This will be "Yes" or "No", need to get actual path
-        
-        # Get the actual card data from database (including PIN and image path)
+        # Everything shown in the table comes from the model's row cache
+        card_data = self.model.card_at(row)
+        card_number = card_data['card_number']
+        
+        # Only the fields the table doesn't show reliably are fetched
         if hasattr(self.parent, 'db_manager'):
-            full_card_data = self.parent.db_manager.get_card_by_number(card_data['card_number'])
-            if full_card_data:
-                card_data.update(full_card_data)
+            details = self.parent.db_manager.get_card_fields(card_number, ['pin', 'card_image_path'])
+            if details is None:
+                QMessageBox.warning(self.parent, "Error", f"Card {card_number} no longer exists.")
+                return
+            card_data.update(details)
         
-        # Create and show edit dialog
+        # The stored PIN is decrypted only here, for the dialog
+        dialog_data = dict(card_data)
+        if is_encrypted(card_data.get('pin')):
+            if not self.parent.unlock_pin_vault():
+                return
+            try:
+                dialog_data['pin'] = self.parent.pin_vault.decrypt(card_number, card_data['pin'])
+            except (InvalidTag, VaultLockedError, ValueError) as e:
+                QMessageBox.warning(self.parent, "PIN Error", f"The PIN of card {card_number} cannot be decrypted: {e}")
+                return
+        
+        # Reuse one dialog instance instead of rebuilding its widgets per click
         if hasattr(self.parent, 'image_handler'):
-            dialog = EditCardDialog(self.parent, card_data, self.parent.image_handler)
+            if self.edit_dialog is None:
+                self.edit_dialog = EditCardDialog(self.parent, dialog_data, self.parent.image_handler,
+                                                  getattr(self.parent, 'db_manager', None))
+            else:
+                self.edit_dialog.load_card(dialog_data)
+            dialog = self.edit_dialog
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 # Get updated data from dialog
                 updated_data = dialog.get_form_data()
-                # Ensure profit is recalculated
-                updated_data['profit'] = updated_data['expected_price'] - updated_data['purchase_price']
-                # Ensure all required fields are present
-                for key in ['brand','pin','denomination','purchase_price','expected_price','profit','source','purchase_date','pending','sold_date','payment_received','payment_mode','card_image_path']:
-                    if key not in updated_data:
-                        updated_data[key] = ''
-                # Update the card in database
+                # Ingest a newly chosen image instead of storing the picked file name
+                if dialog.new_image_selected:
+                    try:
+                        updated_data['card_image_path'] = self.parent.image_handler.save_image(card_number)
+                    except Exception as e:
+                        QMessageBox.warning(self.parent, "Image Error", str(e))
+                        updated_data['card_image_path'] = card_data.get('card_image_path', '')
+                    self.parent.image_handler.reset()
+                # Only send the columns that actually changed, leaving those the role cannot read alone
+                masked = self.parent.db_manager.access.masked_columns() if hasattr(self.parent, 'db_manager') else set()
+                changes = {field: value for field, value in updated_data.items()
+                           if field in UPDATABLE_COLUMNS and field not in masked
+                           and values_differ(dialog_data.get(field), value)}
+                if changes.get('pin'):
+                    if not self.parent.unlock_pin_vault():
+                        QMessageBox.warning(self.parent, "PIN Error", "The PIN passphrase is required to store a PIN.")
+                        return
+                    changes['pin'] = self.parent.pin_vault.encrypt(card_number, changes['pin'])
+                # Update the card in database, unless someone else changed it meanwhile
                 if hasattr(self.parent, 'db_manager'):
-                    success = self.parent.db_manager.update_card(card_data['card_number'], updated_data)
+                    success, message = self.parent.db_manager.update_card(card_number, changes, card_data['version'])
+                    queued = not success and is_locked_error(message) and hasattr(self.parent, 'intake_writer')
+                    if queued:
+                        # Saved in the background once the database is free again
+                        self.parent.intake_writer.submit_update(card_number, changes, card_data['version'])
+                        success = True
                     if success:
-                        # Refresh the table
-                        if hasattr(self.parent, 'refresh_cards'):
-                            self.parent.refresh_cards()
-                        QMessageBox.information(self.parent, "Success", "Card updated successfully!")
+                        card_data.update(changes)
+                        if changes:
+                            card_data['version'] += 1
+                    elif message == VERSION_CONFLICT:
+                        success, result = self.merge_conflict(card_number, card_data, changes)
+                        if success:
+                            card_data = result
+                        else:
+                            message = result
+                    if success:
+                        if not queued:
+                            # Profit and the other derived values come from the database
+                            card_data.update(self.parent.db_manager.get_card_fields(card_number, DERIVED_FIELDS) or {})
+                        # Update just this row instead of reloading the table
+                        self.model.update_card(card_number, card_data)
+                        self.thumbnail_timer.start()
+                        if queued:
+                            self.parent.statusBar().showMessage(
+                                f"Database busy - changes to {card_number} queued and will be saved automatically", 10000)
+                        else:
+                            QMessageBox.information(self.parent, "Success", "Card updated successfully!")
                     else:
-                        QMessageBox.warning(self.parent, "Error", "Failed to update card!") 
+                        QMessageBox.warning(self.parent, "Error", f"Failed to update card: {message}")
+    
+    def merge_conflict(self, card_number, base, changes):
+        """Merge our changes onto a card someone else updated since it was loaded
+        
+        Changes to columns the other user didn't touch are applied silently;
+        overlapping columns are resolved by asking the user.
+        """
+        db_manager = self.parent.db_manager
+        for _ in range(3):
+            current = db_manager.get_card_by_number(card_number)
+            if current is None:
+                return False, "Card was deleted by someone else"
+            
+            overlap = [field for field in changes
+                       if values_differ(current.get(field), base.get(field))
+                       and values_differ(current.get(field), changes[field])]
+            if overlap:
+                lines = "\n".join(
+                    f"{field}: theirs {'(hidden)' if field == 'pin' else current.get(field)}, "
+                    f"yours {'(hidden)' if field == 'pin' else changes[field]}"
+                    for field in overlap
+                )
+                reply = QMessageBox.question(
+                    self.parent, "Edit Conflict",
+                    f"Card {card_number} was changed by someone else while you were editing it.\n\n"
+                    f"{lines}\n\nYes keeps your values, No keeps theirs for these fields.",
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel
+                )
+                if reply == QMessageBox.StandardButton.Cancel:
+                    return False, "Update cancelled"
+                if reply == QMessageBox.StandardButton.No:
+                    changes = {field: value for field, value in changes.items() if field not in overlap}
+            
+            if not changes:
+                return True, current
+            success, message = db_manager.update_card(card_number, changes, current['version'])
+            if success:
+                current.update(changes)
+                current['version'] += 1
+                return True, current
+            if message != VERSION_CONFLICT:
+                return False, message
+            base = current
+        return False, VERSION_CONFLICT
 
     def show_context_menu(self, pos):
         from PyQt6.QtWidgets import QMenu
         menu = QMenu()
         copy_action = menu.addAction("Copy Selected Row(s)")
+        copy_pins_action = menu.addAction("Copy Selected Row(s) with PINs...")
         action = menu.exec(self.table.viewport().mapToGlobal(pos))
         if action == copy_action:
             self.copy_selected_rows_to_clipboard()
+        elif action == copy_pins_action:
+            self.copy_selected_rows_to_clipboard(include_pins=True)
 
     def eventFilter(self, source, event):
         from PyQt6.QtCore import QEvent
@@ -931,24 +1348,41 @@ class ViewCardsTab(QWidget):
                 self.copy_selected_rows_to_clipboard()
                 return True
         return super().eventFilter(source, event)
-    def copy_selected_rows_to_clipboard(self):
-        selected_ranges = self.table.selectedRanges()
-        if not selected_ranges:
-            return
+    
+    def selected_card_numbers(self):
+        """Card numbers of the selected rows in table order, from the selection ranges"""
         rows = set()
-        for rng in selected_ranges:
-            for row in range(rng.topRow(), rng.bottomRow() + 1):
-                rows.add(row)
-        rows = sorted(rows)
-        data = []
-        for row in rows:
-            row_data = []
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    row_data.append(item.text())
-                else:
-                    row_data.append("")
-            data.append("\t".join(row_data))
-        clipboard = QGuiApplication.clipboard()
-        clipboard.setText("\n".join(data)) 
\ No newline at end of file
+        for selection_range in self.table.selectionModel().selection():
+            rows.update(range(selection_range.top(), selection_range.bottom() + 1))
+        return self.model.card_numbers(sorted(rows))
+    
+    def copy_selected_rows_to_clipboard(self, include_pins=False):
+        """Copy the raw values of the selected cards as TSV, CSV and an HTML table
+        
+        PINs are only copied, in clear text, after confirmation and with the
+        PIN vault unlocked.
+        """
+        card_numbers = self.selected_card_numbers()
+        if not card_numbers or self.model.storage is None:
+            return
+        reveal_pin = None
+        if include_pins:
+            answer = QMessageBox.question(
+                self.parent, "Copy PINs",
+                f"Copy the PINs of {len(card_numbers)} card(s) to the clipboard in clear text?\n\n"
+                "Any application can read the clipboard until something else is copied.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No
+            )
+            if answer != QMessageBox.StandardButton.Yes or not self.parent.unlock_pin_vault():
+                return
+            def reveal_pin(card_number, pin):
+                return self.parent.pin_vault.decrypt(card_number, pin) if is_encrypted(pin) else pin
+        unsaved = {card_number: changes for card_number, changes, _ in self.model.get_pending_updates()}
+        try:
+            mime, count = selection_mime_data(self.model.storage, card_numbers, unsaved, reveal_pin)
+        except (InvalidTag, VaultLockedError, ValueError) as e:
+            QMessageBox.warning(self.parent, "PIN Error", f"The PINs cannot be decrypted: {e}")
+            return
+        QGuiApplication.clipboard().setMimeData(mime)
+        if hasattr(self.parent, 'statusBar'):
+            self.parent.statusBar().showMessage(f"Copied {count} card(s)", 5000)
@@ -0,0 +1,107 @@
+import json
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+from PyQt6.QtCore import QObject, QSettings, pyqtSignal
+
+from database import PAGE_SIZE
+
+# Cache file header: magic and format version, followed by zlib-compressed JSON.
+# The format changes with the columns of the cached listing rows
+WARM_CACHE_MAGIC = b"GCWS"
+WARM_CACHE_FORMAT = 2
+WARM_CACHE_HEADER = struct.Struct(">4sH")
+
+
+def warm_cache_path_for(storage):
+    """Warm-start cache file next to a storage's database, or None for storages without a file"""
+    db_path = getattr(storage, 'db_path', None)
+    return f"{db_path}-warm.bin" if db_path else None
+
+
+def session_settings_for(storage):
+    """QSettings with the window and table state of the last session on a database, or None"""
+    db_path = getattr(storage, 'db_path', None)
+    return QSettings(f"{db_path}-session.ini", QSettings.Format.IniFormat) if db_path else None
+
+
+def save_warm_cache(path, state):
+    """Atomically write a state dictionary to a warm-start cache file
+
+    Not fsynced: a cache lost in a crash only costs one ordinary startup.
+    """
+    payload = zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(suffix=".bin", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as cache:
+            cache.write(WARM_CACHE_HEADER.pack(WARM_CACHE_MAGIC, WARM_CACHE_FORMAT))
+            cache.write(payload)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_warm_cache(path):
+    """Read a warm-start cache file, or None if it is missing, damaged or of another format"""
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as cache:
+            data = cache.read()
+        magic, version = WARM_CACHE_HEADER.unpack_from(data)
+        if magic != WARM_CACHE_MAGIC or version != WARM_CACHE_FORMAT:
+            return None
+        state = json.loads(zlib.decompress(data[WARM_CACHE_HEADER.size:]))
+    except (OSError, ValueError, struct.error, zlib.error):
+        return None
+    return state if isinstance(state, dict) else None
+
+
+class ListingRefresher(QObject):
+    """Loads the first page of the listing and the inventory totals on a background thread
+
+    Each start supersedes the earlier ones; results carry the generation
+    they were started as, so the receiver can drop outdated ones.
+    """
+
+    # {'generation', 'data_version', 'totals'[, 'rows', 'next_page']} or {'generation', 'error'};
+    # emitted from the worker thread, delivered on the GUI thread
+    finished = pyqtSignal(object)
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+        self.generation = 0
+        self.threads = []
+
+    def start(self, sort_field=None, descending=True, page_size=PAGE_SIZE, page=True):
+        """Start a refresh, of the totals only unless page is set, and return its generation"""
+        self.generation += 1
+        thread = threading.Thread(target=self.run, args=(self.generation, sort_field, descending, page_size, page),
+                                  name="listing-refresh", daemon=True)
+        self.threads = [running for running in self.threads if running.is_alive()] + [thread]
+        thread.start()
+        return self.generation
+
+    def run(self, generation, sort_field, descending, page_size, page):
+        try:
+            # Read first: a change committed meanwhile makes the result look older, never newer
+            result = {'generation': generation, 'data_version': self.storage.get_data_version()}
+            if page:
+                result['rows'], result['next_page'] = self.storage.get_cards_page(
+                    sort_field, descending, None, page_size)
+            result['totals'] = self.storage.get_card_totals()
+        except Exception as e:
+            result = {'generation': generation, 'error': str(e)}
+        self.finished.emit(result)
+
+    def wait(self, timeout=None):
+        """Block until every started refresh has finished"""
+        for thread in self.threads:
+            thread.join(timeout)